@@ -0,0 +1,58 @@
+class AdaptiveInterval:
+    """Pick each site's check interval from how often it changes and fails
+
+    The time between observed changes is tracked as an exponential moving
+    average, and a site is checked checks_per_change times per expected
+    change, within [min_interval, max_interval]; a site configured with a
+    shorter interval than min_interval keeps its own interval as the
+    floor. A quiet spell longer than
+    the average counts as evidence that the site changes less often; until
+    two changes have been seen the configured interval is the floor.
+    Consecutive failed fetches back off exponentially from that interval,
+    up to max_interval.
+
+    The state is a small JSON-friendly dict kept with the site:
+    since, last_change (epoch seconds), change_ewma (seconds), interval
+    (the last interval chosen for a successful check) and failures.
+    """
+
+    def __init__(self, min_interval=60, max_interval=86400, alpha=0.3,
+                 checks_per_change=2.0, backoff_factor=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self.checks_per_change = checks_per_change
+        self.backoff_factor = backoff_factor
+
+    def clamp(self, interval, base_interval):
+        floor = min(self.min_interval, base_interval)
+        return max(floor, min(self.max_interval, interval))
+
+    def update(self, state, now, changed=False, failed=False, base_interval=300):
+        """Fold one check into the state; returns (new_state, next_interval)"""
+        state = dict(state or {})
+        state.setdefault('since', now)
+
+        if failed:
+            state['failures'] = state.get('failures', 0) + 1
+            interval = state.get('interval') or self.clamp(base_interval, base_interval)
+            return state, min(self.max_interval, interval * self.backoff_factor ** state['failures'])
+
+        state['failures'] = 0
+        if changed:
+            last_change = state.get('last_change')
+            if last_change is not None:
+                observed = now - last_change
+                ewma = state.get('change_ewma')
+                state['change_ewma'] = observed if ewma is None \
+                    else self.alpha * observed + (1 - self.alpha) * ewma
+            state['last_change'] = now
+
+        quiet = now - (state.get('last_change') or state['since'])
+        ewma = state.get('change_ewma')
+        if ewma is None:
+            expected = max(quiet, base_interval * self.checks_per_change)
+        else:
+            expected = max(ewma, quiet)
+        state['interval'] = self.clamp(expected / self.checks_per_change, base_interval)
+        return state, state['interval']
@@ -1,160 +1,502 @@
 import requests
-from flask import Flask, request, jsonify
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, Response, request, jsonify, stream_with_context
 from datetime import datetime
-from bs4 import BeautifulSoup
+import csv
+import hashlib
+from html import escape
+import io
 import json
+import logging
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import urlencode, urlsplit
+
+import download
+import parsers
+import fingerprint
+import metrics
+import textdiff
+from adaptive import AdaptiveInterval
+from async_fetcher import AsyncFetcher
+from bulk_jobs import BulkJobStore, read_rows
+from classifier import KeywordClassifier, load_categories
+from events import EventBroker
+from job_queue import open_queue
+from parse_pool import ParsePool
+from politeness import Politeness, deferred_page
+from scheduler import CheckScheduler
+from single_flight import KeyedLocks, SingleFlight
+from site_index import SiteIndex
+from tor_circuits import TorCircuitPool
+from url_table import UrlTable
+from storage import SiteStore, side_path
+from logs import configure_logging
+
+# MONITOR_LOG_LEVEL=DEBUG shows every fetch; MONITOR_LOG_FORMAT=json for log shippers
+configure_logging(os.environ.get('MONITOR_LOG_LEVEL', 'INFO'),
+                  os.environ.get('MONITOR_LOG_FORMAT', 'text'))
+logger = logging.getLogger('monitor')
 
 app = Flask(__name__)
 
-# Store monitored sites in a dictionary
-monitored_sites = {}
+# Monitored sites, their latest snapshots and check history live in SQLite
+store = SiteStore(
+    os.environ.get('MONITOR_DB', 'monitor.db'),
+    batch_size=int(os.environ.get('MONITOR_DB_BATCH_SIZE', 100)),
+    flush_interval=float(os.environ.get('MONITOR_DB_FLUSH_INTERVAL', 1.0)),
+    keep_snapshots=int(os.environ.get('MONITOR_KEEP_SNAPSHOTS', 100)),
+    max_age_days=float(os.environ['MONITOR_SNAPSHOT_MAX_AGE_DAYS'])
+    if os.environ.get('MONITOR_SNAPSHOT_MAX_AGE_DAYS') else None
+)
+
+def side_db(name):
+    """Path of a database file kept next to the site database (see storage.side_path)"""
+    return side_path(store.path, name)
+
+def history_info(info):
+    """Info to keep in a history record: the link and image lists live in the snapshot"""
+    summary = {key: value for key, value in info.items() if key not in ('links', 'images')}
+    summary['link_count'] = len(info.get('links', []))
+    summary['image_count'] = len(info.get('images', []))
+    return summary
+
+
+def site_summary(data):
+    """What /api/get_sites shows of a stored site (without the live next_check_in)"""
+    return {
+        'status': data.get('status'),
+        'last_checked': data.get('last_checked'),
+        'first_checked': data.get('first_checked'),
+        'info': data.get('info'),
+        'history_count': data.get('history_count', 0),
+        'use_tor': data.get('use_tor', False),
+        'check_interval': data.get('check_interval'),
+        'base_interval': data.get('base_interval'),
+        'consecutive_failures': (data.get('adaptive') or {}).get('failures', 0),
+    }
+
+
+def light_summary(summary):
+    """A site summary with link and image counts in place of the lists"""
+    light = dict(summary)
+    if light.get('info'):
+        light['info'] = history_info(light['info'])
+    return light
+
+# Site summaries for /api/get_sites, updated as sites are added, checked and removed
+site_index = SiteIndex(store, site_summary, light_summary)
+
+# Site and check events pushed to dashboards over /api/events
+events = EventBroker(
+    history=int(os.environ.get('MONITOR_EVENT_HISTORY', 1000)),
+    heartbeat=float(os.environ.get('MONITOR_EVENT_HEARTBEAT', 15)),
+    max_subscribers=int(os.environ.get('MONITOR_EVENT_SUBSCRIBERS', 100))
+)
+
+def publish_site(url, summary):
+    """Push a site's new light summary, or its removal"""
+    if summary is None:
+        events.publish('removed', {'url': url})
+    else:
+        events.publish('site', {'url': url, 'site': summary})
+
+site_index.listeners.append(publish_site)
+
+
+# Default seconds between automatic checks of a site
+DEFAULT_CHECK_INTERVAL = int(os.environ.get('MONITOR_CHECK_INTERVAL', 300))
+
+# Learn each site's change rate and adapt its interval within these bounds;
+# a site added with a check_interval below the minimum keeps it as its floor
+# (MONITOR_ADAPTIVE_INTERVALS=0 keeps every site on its configured interval)
+ADAPTIVE_INTERVALS = os.environ.get('MONITOR_ADAPTIVE_INTERVALS', '1') != '0'
+adaptive_intervals = AdaptiveInterval(
+    min_interval=float(os.environ.get('MONITOR_MIN_INTERVAL', 60)),
+    max_interval=float(os.environ.get('MONITOR_MAX_INTERVAL', 86400)),
+    alpha=float(os.environ.get('MONITOR_CHANGE_EWMA_ALPHA', 0.3)),
+    checks_per_change=float(os.environ.get('MONITOR_CHECKS_PER_CHANGE', 2)),
+    backoff_factor=float(os.environ.get('MONITOR_FAILURE_BACKOFF', 2))
+)
+
+# Largest page body read per check (bytes); bigger pages are truncated and flagged.
+# Sites can set their own max_bytes.
+MAX_PAGE_BYTES = int(os.environ.get('MONITOR_MAX_PAGE_BYTES', 5 * 1024 * 1024))
+
+# SOCKS endpoint used for sites monitored over Tor
+TOR_PROXY = os.environ.get('MONITOR_TOR_PROXY', 'socks5h://127.0.0.1:5678')
+
+# Fingerprint fast path default for new sites (MONITOR_FINGERPRINT=1 enables it)
+FINGERPRINT_BY_DEFAULT = os.environ.get('MONITOR_FINGERPRINT', '0') != '0'
+
+# Tor SOCKS endpoints (comma-separated) to spread onion checks over; each can
+# be split into MONITOR_TOR_ISOLATION circuits with SOCKS auth isolation
+TOR_PROXIES = [proxy.strip() for proxy in os.environ.get('MONITOR_TOR_PROXIES', TOR_PROXY).split(',')
+               if proxy.strip()]
+tor_circuits = TorCircuitPool(
+    TOR_PROXIES,
+    isolation=int(os.environ.get('MONITOR_TOR_ISOLATION', 0)),
+    max_concurrent=int(os.environ.get('MONITOR_TOR_CIRCUIT_CONCURRENCY', 8)),
+    max_failures=int(os.environ.get('MONITOR_TOR_MAX_FAILURES', 3)),
+    slow_factor=float(os.environ.get('MONITOR_TOR_SLOW_FACTOR', 3.0)),
+    cooldown=float(os.environ.get('MONITOR_TOR_COOLDOWN', 60)),
+    control_port=os.environ.get('MONITOR_TOR_CONTROL_PORT'),
+    control_password=os.environ.get('MONITOR_TOR_CONTROL_PASSWORD')
+)
+
+# Per-host politeness under every fetch: MONITOR_HOST_RATE requests per second
+# (bursts of MONITOR_HOST_BURST, 0 = unlimited) and MONITOR_HOST_CONCURRENCY
+# requests at once per registrable domain (MONITOR_HOST_KEY=host for exact
+# hosts). 429/503 responses pause a host for their Retry-After; a fetch that
+# would wait longer than MONITOR_HOST_MAX_WAIT seconds for that fails instead.
+# MONITOR_ROBOTS=1 also honors robots.txt Crawl-delay
+ROBOTS_MAX_BYTES = 512 * 1024
+politeness = Politeness(
+    rate=float(os.environ.get('MONITOR_HOST_RATE', 2)),
+    burst=int(os.environ.get('MONITOR_HOST_BURST', 10)),
+    max_per_host=int(os.environ.get('MONITOR_HOST_CONCURRENCY', 4)),
+    by_domain=os.environ.get('MONITOR_HOST_KEY', 'domain') != 'host',
+    base_backoff=float(os.environ.get('MONITOR_HOST_BACKOFF', 5)),
+    max_backoff=float(os.environ.get('MONITOR_HOST_MAX_BACKOFF', 600)),
+    max_wait=float(os.environ.get('MONITOR_HOST_MAX_WAIT', 60)),
+    robots_fetch=(lambda url, use_tor: scrapers.get(use_tor).fetch_robots(url))
+    if os.environ.get('MONITOR_ROBOTS', '0') != '0' else None,
+    robots_ttl=float(os.environ.get('MONITOR_ROBOTS_TTL', 3600))
+)
+
+# Every link and image URL seen, interned as an integer id, in a file shared
+# by all processes so that they agree on the ids (MONITOR_URL_DB, by default
+# next to the site database); MONITOR_URL_CACHE URLs are cached in memory
+default_url_table = UrlTable(
+    os.environ.get('MONITOR_URL_DB') or side_db('urls'),
+    cache_size=int(os.environ.get('MONITOR_URL_CACHE', 200000))
+)
+
+# Website type classifier; MONITOR_KEYWORDS_FILE points to a JSON file of
+# {type: [keywords]} or {type: {keyword: weight}} replacing the defaults
+default_classifier = KeywordClassifier(
+    load_categories(os.environ['MONITOR_KEYWORDS_FILE'])
+    if os.environ.get('MONITOR_KEYWORDS_FILE') else None
+)
 
 class WebScraper:
-    def __init__(self, use_tor=False):
+    def __init__(self, use_tor=False, pool_connections=10, pool_maxsize=10,
+                 max_retries=0, backoff_factor=0.5, parser=parsers.DEFAULT_ENGINE,
+                 classifier=None, parse_pool=None, tor_circuits=None, politeness=None,
+                 url_table=None):
+        if parser not in parsers.available_engines():
+            raise ValueError(f"Parser engine {parser!r} is not available "
+                             f"(choose from {', '.join(parsers.available_engines())})")
+        # HTML parser engine: 'html.parser', 'lxml' or the tree-less 'stream' extractor
+        self.parser = parser
+        self.classifier = classifier or default_classifier
+        # Optional ParsePool: parsing then runs in worker processes
+        self.parse_pool = parse_pool
+        # Snapshots keep links and images as ids into this UrlTable
+        self.url_table = url_table if url_table is not None else default_url_table
+        # Label for fetch metrics: 'tor' or 'direct'
+        self.use_tor = use_tor
+        self.route = metrics.route(use_tor)
+        # Optional Politeness: per-host rate limits every fetch waits for
+        self.politeness = politeness
         self.session = requests.Session()
-        if use_tor:
+        
+        # Keep-alive connection pool, with optional retries on transient errors.
+        # With politeness a 429 or 503 pauses the whole host instead of being
+        # retried here, where a retry would not wait for a permit (urllib3
+        # otherwise retries them after their Retry-After)
+        retries = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 504) if politeness is not None else (500, 502, 503, 504),
+            respect_retry_after_header=politeness is None,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize,
+                              max_retries=retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Optional TorCircuitPool: each Tor request then picks a circuit
+        self.tor_circuits = tor_circuits if use_tor else None
+        if self.tor_circuits is not None:
+            self.tor_circuits.on_rotate.append(self._forget_proxy)
+            logger.debug("Tor circuits configured: %d", len(self.tor_circuits.circuits))
+        elif use_tor:
             # Configure for Tor if requested
             self.session.proxies.update({
-                'http': 'socks5h://127.0.0.1:5678',  # Use port 9150 for Tor Browser
-                'https': 'socks5h://127.0.0.1:5678'
+                'http': TOR_PROXY,  # Use port 9150 for Tor Browser
+                'https': TOR_PROXY
             })
-            print("Tor proxy configured:", self.session.proxies)  # Debugging
+            logger.debug("Tor proxy configured: %s", self.session.proxies)
+    
+    def _forget_proxy(self, circuit, old_proxy):
+        """Drop the pooled connections of a rotated circuit's old credentials"""
+        for adapter in set(self.session.adapters.values()):
+            manager = adapter.proxy_manager.pop(old_proxy, None)
+            if manager is not None:
+                manager.clear()
     
     def fetch_website_content(self, url, timeout=30):  # Increased timeout
         """Fetch content from a website"""
+        page = self.fetch_page(url, timeout=timeout)
+        return page['content'] if page else None
+    
+    def fetch_page(self, url, etag=None, last_modified=None, timeout=30, max_bytes=None):
+        """Fetch a page, revalidating with ETag/Last-Modified when they are known
+        
+        The body is streamed: at most max_bytes are read (truncated pages
+        are flagged), and non-HTML Content-Types are not read at all.
+        Returns a dict with the HTTP status, content (None on 304), the new
+        validators, a hash of the body, its size and a truncated flag, a
+        politeness.deferred_page if the host asked for a long pause, or
+        None if the request failed.
+        """
+        max_bytes = max_bytes or MAX_PAGE_BYTES
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        # Wait for the host's rate limit before taking a circuit
+        permit = None
+        if self.politeness is not None:
+            permit = self.politeness.acquire(url, self.use_tor)
+            if permit is None:
+                metrics.FETCHES.inc(route=self.route, result='deferred')
+                return deferred_page(self.politeness.paused_for(url))
+        # Connection errors and timeouts, including while reading the body,
+        # count against the Tor circuit
+        circuit_use = self.tor_circuits.use() if self.tor_circuits is not None else nullcontext()
+        start = time.perf_counter()
+        page = None
+        response = None
         try:
-            print(f"Fetching URL: {url}")  # Debugging
-            print(f"Using Tor: {self.session.proxies}")  # Debugging
-            response = self.session.get(url, timeout=timeout)
-            response.raise_for_status()
-            return response.text
+            with circuit_use as circuit:
+                logger.debug("Fetching URL: %s", url, extra={
+                    'url': url, 'route': self.route,
+                    'circuit': circuit.name if circuit is not None else None})
+                response = self.session.get(url, headers=headers, timeout=timeout, stream=True,
+                                            proxies=circuit.proxies if circuit is not None else None)
+                with response:
+                    page = self._read_page(url, response, etag, last_modified, timeout, max_bytes)
+                    return page
         except requests.RequestException as e:
-            print(f"Error fetching {url}: {e}")
+            logger.warning("Error fetching %s: %s", url, e, extra={'url': url, 'route': self.route})
             return None
+        finally:
+            metrics.observe_fetch(self.route, time.perf_counter() - start, page)
+            if permit is not None:
+                self.politeness.release(permit, response.status_code if response is not None else None,
+                                        response.headers.get('Retry-After') if response is not None else None)
     
-    def extract_website_info(self, html_content):
-        """Extract detailed information from website HTML"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+    def fetch_robots(self, url, timeout=10):
+        """Text of a robots.txt ('' if the site has none), or None if it could
+        not be fetched; not rate limited, as politeness itself asks for it"""
+        circuit_use = self.tor_circuits.use() if self.tor_circuits is not None else nullcontext()
+        try:
+            with circuit_use as circuit:
+                response = self.session.get(url, timeout=timeout, stream=True,
+                                            proxies=circuit.proxies if circuit is not None else None)
+                with response:
+                    if response.status_code >= 400:
+                        return ''
+                    reader = download.BodyReader(ROBOTS_MAX_BYTES, response.headers.get('Content-Type'),
+                                                 'utf-8')
+                    for chunk in response.iter_content(download.CHUNK_SIZE):
+                        if not reader.feed(chunk):
+                            break
+                    return reader.finish()['content']
+        except requests.RequestException as e:
+            logger.debug("Error fetching %s: %s", url, e, extra={'url': url, 'route': self.route})
+            return None
+    
+    def _read_page(self, url, response, etag, last_modified, timeout, max_bytes):
+        """Turn a streamed response into a page dict, reading at most max_bytes of body"""
+        if not response.ok:
+            logger.warning("Error fetching %s: HTTP %s %s", url, response.status_code, response.reason,
+                           extra={'url': url, 'status': response.status_code})
+            return None
         
-        # Extract basic info
-        title = soup.title.string if soup.title else 'No Title'
-        meta_description = soup.find('meta', attrs={'name': 'description'})['content'] \
-            if soup.find('meta', attrs={'name': 'description'}) else 'No Description'
-        links = [a['href'] for a in soup.find_all('a', href=True)]
-        images = [img['src'] for img in soup.find_all('img', src=True)]
-        text_length = len(soup.get_text())
+        if response.status_code == 304:
+            return {
+                'status': 304,
+                'content': None,
+                'etag': response.headers.get('ETag', etag),
+                'last_modified': response.headers.get('Last-Modified', last_modified),
+                'content_hash': None
+            }
         
-        # Identify website type
-        website_type = self.identify_website_type(soup)
+        content_type = response.headers.get('Content-Type')
+        if not download.content_type_allowed(content_type):
+            logger.warning("Error fetching %s: unsupported Content-Type %s", url, content_type,
+                           extra={'url': url, 'content_type': content_type})
+            return None
         
-        # Extract payment methods (if applicable)
-        payment_methods = self.extract_payment_methods(soup)
+        # Stop at max_bytes, or once the whole download has taken longer than
+        # the timeout (endless or trickling responses)
+        reader = download.BodyReader(max_bytes, content_type, response.encoding)
+        deadline = time.monotonic() + timeout
+        for chunk in response.iter_content(download.CHUNK_SIZE):
+            if not reader.feed(chunk):
+                break
+            if time.monotonic() > deadline:
+                reader.truncated = True
+                break
+        body = reader.finish()
         
-        # Extract transactions (if applicable)
-        transactions = self.extract_transactions(soup)
+        if body['truncated']:
+            logger.info("Truncated %s after %d bytes", url, body['size'],
+                        extra={'url': url, 'size': body['size']})
+        return {
+            'status': response.status_code,
+            'content': body['content'],
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': body['content_hash'],
+            'size': body['size'],
+            'truncated': body['truncated']
+        }
+    
+    def parse_snapshot(self, html_content, base_url=None):
+        """Parse HTML once and keep everything extraction and diffing need
+        
+        Links and images are resolved against base_url (the page's URL),
+        stripped of fragments and kept as ids into the URL table.
+        """
+        with metrics.PARSE_SECONDS.time(engine=self.parser):
+            if self.parse_pool is not None:
+                snapshot = self.parse_pool.parse(html_content, self.parser)
+            else:
+                snapshot = parsers.parse_snapshot(html_content, self.parser)
+        return self.url_table.intern_snapshot(snapshot, base_url)
+    
+    def extract_website_info(self, html_content, base_url=None):
+        """Extract detailed information from website HTML"""
+        return self.extract_info_from_snapshot(self.parse_snapshot(html_content, base_url))
+    
+    def extract_info_from_snapshot(self, snapshot):
+        """Build the website info dict from a snapshot returned by parse_snapshot"""
+        # Score every website type in one pass over the text
+        website_type, type_scores = self.classifier.classify(snapshot['text'])
+        
+        # Extract basic info
+        title = snapshot['title'] if snapshot['has_title'] else 'No Title'
+        meta_description = snapshot['meta_description'] \
+            if snapshot['meta_description'] is not None else 'No Description'
         
         info = {
             'title': title,
             'meta_description': meta_description,
-            'links': links,
-            'images': images,
-            'text_length': text_length,
+            'links': self.url_table.lookup_many(snapshot['links']),
+            'images': self.url_table.lookup_many(snapshot['images']),
+            'text_length': len(snapshot['text']),
             'website_type': website_type,
-            'payment_methods': payment_methods,
-            'transactions': transactions
+            'website_type_scores': {category: round(score, 2) for category, score in type_scores.items()},
+            'payment_methods': snapshot['payment_methods'],
+            'transactions': snapshot['transactions']
         }
         return info
     
-    def identify_website_type(self, soup):
-        """Identify the type of website based on content and meta tags"""
-        # Common keywords for different types of websites
-        ecommerce_keywords = ['shop', 'cart', 'buy', 'product', 'store']
-        blog_keywords = ['blog', 'post', 'article', 'comment']
-        news_keywords = ['news', 'headline', 'breaking', 'article']
-        social_media_keywords = ['login', 'signup', 'profile', 'share']
-        payment_keywords = ['payment', 'checkout', 'credit card', 'paypal']
-        
-        # Get all text content
-        text_content = soup.get_text().lower()
-        
-        # Check for e-commerce
-        if any(keyword in text_content for keyword in ecommerce_keywords):
-            return 'E-commerce'
-        
-        # Check for blog
-        if any(keyword in text_content for keyword in blog_keywords):
-            return 'Blog'
-        
-        # Check for news
-        if any(keyword in text_content for keyword in news_keywords):
-            return 'News'
-        
-        # Check for social media
-        if any(keyword in text_content for keyword in social_media_keywords):
-            return 'Social Media'
-        
-        # Check for payment-related sites
-        if any(keyword in text_content for keyword in payment_keywords):
-            return 'Payment Gateway'
-        
-        # Default to 'Unknown' if no type is identified
-        return 'Unknown'
-    
-    def extract_payment_methods(self, soup):
-        """Extract payment methods from the website (if applicable)"""
-        # Example: Look for payment-related elements
-        payment_methods = []
-        for element in soup.find_all(class_='payment-method'):  # Adjust class name as needed
-            payment_methods.append(element.get_text())
-        return payment_methods
-    
-    def extract_transactions(self, soup):
-        """Extract transactions from the website (if applicable)"""
-        # Example: Look for transaction-related elements
-        transactions = []
-        for element in soup.find_all(class_='transaction'):  # Adjust class name as needed
-            transactions.append(element.get_text())
-        return transactions
+    def identify_website_type(self, text_content):
+        """Identify the type of website based on its text content"""
+        return self.classifier.classify(text_content)[0]
     
     def compare_content(self, old_content, new_content):
         """Compare two versions of website content and return detailed differences"""
         if not old_content or not new_content:
             return {"error": "Missing content for comparison"}
-            
-        old_soup = BeautifulSoup(old_content, 'html.parser')
-        new_soup = BeautifulSoup(new_content, 'html.parser')
-        
-        # Compare text length
-        old_text = old_soup.get_text()
-        new_text = new_soup.get_text()
+        if self.parse_pool is not None:
+            # Parse both versions in parallel
+            old_future = self.parse_pool.submit(old_content, self.parser)
+            new_future = self.parse_pool.submit(new_content, self.parser)
+            return self.compare_snapshots(self.url_table.intern_snapshot(old_future.result()),
+                                          self.url_table.intern_snapshot(new_future.result()))
+        return self.compare_snapshots(self.parse_snapshot(old_content),
+                                      self.parse_snapshot(new_content))
+    
+    def compare_snapshots(self, old_snapshot, new_snapshot):
+        """Compare two snapshots with interned URL lists (from parse_snapshot) and return detailed differences"""
+        if not old_snapshot or not new_snapshot:
+            return {"error": "Missing content for comparison"}
         
-        # Compare links
-        old_links = set(a['href'] for a in old_soup.find_all('a', href=True))
-        new_links = set(a['href'] for a in new_soup.find_all('a', href=True))
+        old_text = old_snapshot['text']
+        new_text = new_snapshot['text']
         
-        # Compare images
-        old_images = set(img['src'] for img in old_soup.find_all('img', src=True))
-        new_images = set(img['src'] for img in new_soup.find_all('img', src=True))
+        # Link and image changes are set differences of URL ids, resolved
+        # back to URLs only for what changed
+        added_links, removed_links = self.url_table.diff(old_snapshot['links'], new_snapshot['links'])
+        added_images, removed_images = self.url_table.diff(old_snapshot['images'], new_snapshot['images'])
         
-        added_links = list(new_links - old_links)
-        removed_links = list(old_links - new_links)
-        added_images = list(new_images - old_images)
-        removed_images = list(old_images - new_images)
+        # Block-level diff: similarity ratio plus the changed text regions
+        text_diff = textdiff.diff_text(old_text, new_text)
         
         return {
             "text_changed": old_text != new_text,
             "old_text_length": len(old_text),
             "new_text_length": len(new_text),
+            "similarity": text_diff['similarity'],
+            "changed_regions": text_diff['changed_regions'],
+            "regions_truncated": text_diff['regions_truncated'],
             "added_links": added_links,
             "removed_links": removed_links,
             "added_images": added_images,
             "removed_images": removed_images,
-            "title_changed": old_soup.title != new_soup.title
+            "title_changed": (old_snapshot['has_title'], old_snapshot['title']) !=
+                             (new_snapshot['has_title'], new_snapshot['title'])
         }
 
-# Initialize WebScraper instance
-web_scraper = WebScraper()
+class ScraperRegistry:
+    """Share one pooled WebScraper per proxy configuration across requests and threads"""
+    
+    def __init__(self, **scraper_options):
+        self.scraper_options = scraper_options
+        self._scrapers = {}
+        self._lock = threading.Lock()
+    
+    def get(self, use_tor=False):
+        """Return the shared scraper for a proxy configuration, creating it on first use"""
+        key = TOR_PROXY if use_tor else None
+        with self._lock:
+            scraper = self._scrapers.get(key)
+            if scraper is None:
+                scraper = WebScraper(use_tor=use_tor, **self.scraper_options)
+                self._scrapers[key] = scraper
+        return scraper
+    
+    def close(self):
+        with self._lock:
+            for scraper in self._scrapers.values():
+                scraper.session.close()
+            self._scrapers.clear()
+
+# Worker processes for HTML parsing (MONITOR_PARSE_WORKERS=0 parses in-process);
+# at most MONITOR_PARSE_QUEUE pages wait for or are in a worker at once
+PARSE_WORKERS = int(os.environ.get('MONITOR_PARSE_WORKERS', 0))
+parse_pool = ParsePool(
+    PARSE_WORKERS,
+    max_pending=int(os.environ.get('MONITOR_PARSE_QUEUE', 0)) or None
+) if PARSE_WORKERS > 0 else None
+
+# Shared scrapers; the pool should be at least as large as the number of concurrent checks
+scrapers = ScraperRegistry(
+    pool_connections=int(os.environ.get('MONITOR_POOL_CONNECTIONS', 10)),
+    pool_maxsize=int(os.environ.get('MONITOR_POOL_MAXSIZE', 32)),
+    max_retries=int(os.environ.get('MONITOR_MAX_RETRIES', 2)),
+    backoff_factor=float(os.environ.get('MONITOR_RETRY_BACKOFF', 0.5)),
+    parser=os.environ.get('MONITOR_PARSER', parsers.DEFAULT_ENGINE),
+    parse_pool=parse_pool,
+    tor_circuits=tor_circuits,
+    politeness=politeness,
+    url_table=default_url_table
+)
 
 @app.route('/')
 def home():
@@ -173,100 +515,943 @@ def add_site():
     if not url:
         return jsonify({'error': 'URL is required'}), 400
     
+    check_interval, error = parse_check_interval(data.get('check_interval'))
+    if error:
+        return jsonify({'error': error}), 400
+    
+    options, error = site_options(data, {'fingerprint': FINGERPRINT_BY_DEFAULT})
+    if error:
+        return jsonify({'error': error}), 400
+    
     # Check if site already exists
-    if url in monitored_sites:
+    if store.has_site(url):
         return jsonify({'error': 'Site is already being monitored'}), 400
     
-    # Create appropriate scraper based on URL type
-    scraper = WebScraper(use_tor=use_tor)
+    # Use the shared scraper for this proxy configuration
+    scraper = scrapers.get(use_tor)
     
     # Fetch initial content
-    content = scraper.fetch_website_content(url)
+    page = scraper.fetch_page(url, max_bytes=options.get('max_bytes'))
+    if page is not None and page.get('deferred'):
+        return jsonify({'error': "The site's host asked for a pause; try again later",
+                        'retry_in': round(page['retry_in'], 1)}), 503
+    content = page['content'] if page else None
     if not content:
         return jsonify({'error': 'Failed to fetch website content'}), 500
     
-    # Extract website info
-    website_info = scraper.extract_website_info(content)
+    # Parse once and extract website info
+    snapshot = scraper.parse_snapshot(content, url)
+    website_info = scraper.extract_info_from_snapshot(snapshot)
     
     # Add to monitored sites
-    monitored_sites[url] = {
+    added = store.add_site(url, {
         'status': 'active',
         'last_checked': datetime.now().isoformat(),
         'first_checked': datetime.now().isoformat(),
         'info': website_info,
-        'content': content,
-        'history': [],
-        'use_tor': use_tor
-    }
+        'use_tor': use_tor,
+        'check_interval': check_interval,
+        'base_interval': check_interval,
+        'etag': page['etag'],
+        'last_modified': page['last_modified'],
+        'content_hash': page['content_hash'],
+        'truncated': page['truncated'],
+        'page_fingerprint': fingerprint.fingerprint(content, options.get('ignore_patterns') or ())
+        if options['fingerprint'] else None,
+        **options
+    }, snapshot=snapshot)
+    if not added:
+        return jsonify({'error': 'Site is already being monitored'}), 400
+    schedule_site(url, check_interval)
     
     return jsonify({
         'message': 'Monitoring started', 
         'info': website_info,
-        'url': url
+        'url': url,
+        'truncated': page['truncated']
     })
 
-@app.route('/api/check_site', methods=['POST'])
-def check_site():
+def parse_check_interval(value):
+    """Validate a requested check interval (default DEFAULT_CHECK_INTERVAL); returns (seconds, error)"""
+    try:
+        check_interval = float(value or DEFAULT_CHECK_INTERVAL)
+    except (TypeError, ValueError):
+        return None, 'check_interval must be a number of seconds'
+    if check_interval <= 0:
+        return None, 'check_interval must be positive'
+    return check_interval, None
+
+def site_options(data, defaults=None):
+    """Validate the per-site settings in a request; returns (options, error)"""
+    options = dict(defaults or {})
+    if 'fingerprint' in data:
+        options['fingerprint'] = bool(data['fingerprint'])
+    if 'ignore_patterns' in data:
+        error = fingerprint.validate_patterns(data['ignore_patterns'])
+        if error:
+            return None, error
+        options['ignore_patterns'] = data['ignore_patterns']
+    if 'simhash_threshold' in data:
+        # None turns off near-duplicate matching: only identical bodies skip parsing
+        threshold = data['simhash_threshold']
+        if threshold is not None and (not isinstance(threshold, int) or isinstance(threshold, bool)
+                                      or not 0 <= threshold <= 64):
+            return None, 'simhash_threshold must be null or an integer number of bits from 0 to 64'
+        options['simhash_threshold'] = threshold
+    if 'max_bytes' in data:
+        # None falls back to MONITOR_MAX_PAGE_BYTES
+        max_bytes = data['max_bytes']
+        if max_bytes is not None and (not isinstance(max_bytes, int) or isinstance(max_bytes, bool)
+                                      or max_bytes <= 0):
+            return None, 'max_bytes must be null or a positive number of bytes'
+        options['max_bytes'] = max_bytes
+    if 'min_recheck' in data:
+        # None falls back to MONITOR_MIN_RECHECK
+        min_recheck = data['min_recheck']
+        if min_recheck is not None and (not isinstance(min_recheck, (int, float))
+                                        or isinstance(min_recheck, bool) or min_recheck < 0):
+            return None, 'min_recheck must be null or a number of seconds'
+        options['min_recheck'] = min_recheck
+    return options, None
+
+@app.route('/api/site_settings', methods=['POST'])
+def site_settings():
     data = request.json
     url = data.get('url')
     
     if not url:
         return jsonify({'error': 'URL is required'}), 400
     
-    if url not in monitored_sites:
+    options, error = site_options(data)
+    if error:
+        return jsonify({'error': error}), 400
+    if 'ignore_patterns' in options:
+        # The stored fingerprint was taken with the old patterns
+        options['page_fingerprint'] = None
+    if not store.update_site(url, options):
         return jsonify({'error': 'Site is not being monitored'}), 404
     
-    site_data = monitored_sites[url]
+    site_data = store.get_site(url)
+    return jsonify({
+        'message': 'Settings updated',
+        'url': url,
+        'fingerprint': site_data.get('fingerprint', False),
+        'ignore_patterns': site_data.get('ignore_patterns', []),
+        'simhash_threshold': site_data.get('simhash_threshold', fingerprint.DEFAULT_THRESHOLD),
+        'max_bytes': site_data.get('max_bytes') or MAX_PAGE_BYTES,
+        'min_recheck': site_min_recheck(site_data)
+    })
+
+# Seconds after a check during which another check of the site returns that
+# result instead of fetching again (0 = off; sites can override with min_recheck)
+MIN_RECHECK = float(os.environ.get('MONITOR_MIN_RECHECK', 0))
+
+# Concurrent checks of one site share a single fetch, and recording a check
+# (read previous snapshot, compare, write) is serialized per site
+check_flights = SingleFlight()
+site_locks = KeyedLocks()
+checks_reused = metrics.REGISTRY.counter(
+    'monitor_checks_reused_total', 'Check requests answered without a fetch of their own', ('reason',))
+
+def site_min_recheck(site_data):
+    min_recheck = site_data.get('min_recheck')
+    return MIN_RECHECK if min_recheck is None else min_recheck
+
+def recent_result(url, site_data):
+    """The latest check's result if the site was checked less than min_recheck ago, else None"""
+    min_recheck = site_min_recheck(site_data)
+    last_checked = site_data.get('last_checked')
+    if not min_recheck or not last_checked:
+        return None
+    age = (datetime.now() - datetime.fromisoformat(last_checked)).total_seconds()
+    if age >= min_recheck:
+        return None
+    records = store.iter_history(url, descending=True, chunk_size=1)
+    latest = next(records, None)
+    records.close()
+    if latest is None:
+        return None
+    return {
+        'message': 'Recently checked',
+        'url': url,
+        'changes': latest[1].get('changes', {}),
+        'current_info': site_data.get('info'),
+        'truncated': latest[1].get('truncated', False),
+        'cached': True,
+        'checked_at': last_checked,
+        'age': round(age, 1)
+    }
+
+def perform_check(url, force=False):
+    """Fetch a monitored site, compare it with the last check and record the result
+
+    A check already running for the site is joined rather than repeated,
+    and unless force is set a site checked less than min_recheck seconds
+    ago returns that check's result.
+    """
+    if not force:
+        site_data = store.get_site(url)
+        if site_data is None:
+            return {'error': 'Site is not being monitored'}, 404
+        cached = recent_result(url, site_data)
+        if cached is not None:
+            checks_reused.inc(reason='recent')
+            return cached, 200
+    return single_check(url, fetch_and_record, url)
+
+def single_check(url, func, *args):
+    """Run func, a check of url, unless one is already in flight; then share that one's result"""
+    (result, status), shared = check_flights.do(url, func, *args)
+    if shared:
+        checks_reused.inc(reason='coalesced')
+        result = dict(result, coalesced=True)
+    return result, status
+
+def fetch_and_record(url):
+    site_data = store.get_site(url)
+    if site_data is None:
+        return {'error': 'Site is not being monitored'}, 404
+    
+    # Use the shared scraper for this proxy configuration
+    scraper = scrapers.get(site_data.get('use_tor', False))
     
-    # Use appropriate scraper
-    scraper = WebScraper(use_tor=site_data.get('use_tor', False))
+    # Fetch current content, revalidating against the last seen version
+    page = scraper.fetch_page(url, etag=site_data.get('etag'),
+                              last_modified=site_data.get('last_modified'),
+                              max_bytes=site_data.get('max_bytes'))
+    return record_check(url, scraper, page)
+
+def record_unchanged(url, site_data, page, message, flags, **fields):
+    """Record a check whose page is known to be unchanged without parsing it"""
+    changes = {
+        **flags,
+        'text_changed': False,
+        'title_changed': False,
+        'similarity': 1.0,
+        'changed_regions': [],
+        'added_links': [],
+        'removed_links': [],
+        'added_images': [],
+        'removed_images': []
+    }
+    current_info = site_data['info']
+    store.record_check(url, {
+        **fields,
+        'last_checked': datetime.now().isoformat(),
+        'etag': page['etag'],
+        'last_modified': page['last_modified']
+    }, {
+        'timestamp': datetime.now().isoformat(),
+        **flags,
+        'changes': changes,
+        'info': history_info(current_info)
+    })
+    return {
+        'message': message,
+        'url': url,
+        'changes': changes,
+        'current_info': current_info
+    }, 200
+
+def site_changed(changes):
+    """Whether a check found any change worth counting towards the site's change rate"""
+    return any(changes.get(key) for key in (
+        'text_changed', 'title_changed', 'added_links', 'removed_links',
+        'added_images', 'removed_images'))
+
+def adapt_interval(url, site_data, changed=False, failed=False):
+    """Site fields for the interval learned from this check, rescheduling the site"""
+    if not ADAPTIVE_INTERVALS:
+        return {}
+    base_interval = site_data.get('base_interval') or site_data.get('check_interval') \
+        or DEFAULT_CHECK_INTERVAL
+    state, interval = adaptive_intervals.update(site_data.get('adaptive'), time.time(),
+                                                changed=changed, failed=failed,
+                                                base_interval=base_interval)
+    interval = round(interval, 1)
+    if interval != site_data.get('check_interval'):
+        scheduler.update_interval(url, interval)
+    return {'adaptive': state, 'base_interval': base_interval, 'check_interval': interval}
+
+def record_check(url, scraper, page):
+    """Compare a freshly fetched page with the last check, record it and publish the outcome"""
+    with site_locks.hold(url):
+        result, status = compare_and_record(url, scraper, page)
+    if status != 404:
+        event = check_event(url, result, status)
+        metrics.CHECKS.inc(outcome=check_outcome(event))
+        if not event['ok'] and not event['deferred']:
+            metrics.SITE_ERRORS.inc(site=url)
+        events.publish('check', event)
+    return result, status
+
+def check_outcome(event):
+    """Label for the checks counter: deferred, failed, not_modified, fingerprint, changed or unchanged"""
+    if event['deferred']:
+        return 'deferred'
+    if not event['ok']:
+        return 'failed'
+    if event['not_modified']:
+        return 'not_modified'
+    if event['fingerprint_match']:
+        return 'fingerprint'
+    return 'changed' if event['changed'] else 'unchanged'
+
+def check_event(url, result, status):
+    """The outcome of a check as pushed to dashboards: flags and counts, no lists"""
+    changes = result.get('changes') or {}
+    return {
+        'url': url,
+        'ok': status == 200,
+        'deferred': result.get('deferred', False),
+        'error': result.get('error'),
+        'changed': site_changed(changes),
+        'not_modified': changes.get('not_modified', False),
+        'fingerprint_match': changes.get('fingerprint_match'),
+        'text_changed': changes.get('text_changed', False),
+        'title_changed': changes.get('title_changed', False),
+        'similarity': changes.get('similarity'),
+        'added_links': len(changes.get('added_links', [])),
+        'removed_links': len(changes.get('removed_links', [])),
+        'added_images': len(changes.get('added_images', [])),
+        'removed_images': len(changes.get('removed_images', [])),
+        'truncated': result.get('truncated', False),
+        'timestamp': datetime.now().isoformat()
+    }
+
+def compare_and_record(url, scraper, page):
+    """Compare a freshly fetched page with the last check and record it in history"""
+    site_data = store.get_site(url)
+    if site_data is None:
+        return {'error': 'Site is not being monitored'}, 404
+    if page is not None and page.get('deferred'):
+        # The host asked for a pause: not a failure, the site is just checked
+        # again once the pause is over
+        defer_site(url, page['retry_in'])
+        return {
+            'message': 'Check deferred: the host asked for a pause',
+            'url': url,
+            'deferred': True,
+            'retry_in': round(page['retry_in'], 1)
+        }, 503
+    if page is None or (page['status'] != 304 and not page['content']):
+        # Failing sites back off exponentially
+        fields = adapt_interval(url, site_data, failed=True)
+        if fields:
+            store.update_site(url, fields)
+        return {'error': 'Failed to fetch website content'}, 500
     
-    # Fetch current content
-    current_content = scraper.fetch_website_content(url)
-    if not current_content:
-        return jsonify({'error': 'Failed to fetch website content'}), 500
+    if page['status'] == 304:
+        # Nothing changed upstream: skip parsing and comparison entirely
+        return record_unchanged(url, site_data, page, 'Site not modified', {'not_modified': True},
+                                **adapt_interval(url, site_data))
     
-    # Compare with previous content
-    previous_content = site_data.get('content')
-    changes = scraper.compare_content(previous_content, current_content)
+    # Fingerprint fast path: a byte-identical or near-duplicate body (after
+    # the site's ignore patterns) is recorded without parsing
+    page_fingerprint = None
+    if site_data.get('fingerprint'):
+        page_fingerprint, match = fingerprint.compare_page(
+            site_data.get('page_fingerprint'), page['content'],
+            site_data.get('ignore_patterns') or (),
+            site_data.get('simhash_threshold', fingerprint.DEFAULT_THRESHOLD))
+        if match['match'] != 'changed':
+            return record_unchanged(url, site_data, page, 'Site unchanged', {
+                'fingerprint_match': match['match'],
+                'simhash_distance': match['distance']
+            }, content_hash=page['content_hash'], **adapt_interval(url, site_data))
     
-    # Extract current info
-    current_info = scraper.extract_website_info(current_content)
+    # Parse the new page once; the previous page is already parsed
+    current_snapshot = scraper.parse_snapshot(page['content'], url)
+    first_fields = {}
+    if site_data.get('status') == 'pending':
+        # A bulk-added site whose initial fetch failed: this is its first snapshot
+        changes = {'initial': True}
+        first_fields = {'status': 'active', 'first_checked': datetime.now().isoformat()}
+    else:
+        # Snapshots stored before URL interning are converted on the way in
+        previous_snapshot = scraper.url_table.intern_snapshot(store.get_snapshot(url), url)
+        with metrics.DIFF_SECONDS.time():
+            changes = scraper.compare_snapshots(previous_snapshot, current_snapshot)
+    current_info = scraper.extract_info_from_snapshot(current_snapshot)
     
-    # Record check in history
+    # Update site data and record the check; history keeps the changes and a
+    # reference to the deduplicated snapshot rather than a full copy
     check_record = {
         'timestamp': datetime.now().isoformat(),
         'changes': changes,
-        'info': current_info
+        'info': history_info(current_info)
     }
-    site_data['history'].append(check_record)
-    
-    # Update site data
-    site_data['last_checked'] = datetime.now().isoformat()
-    site_data['content'] = current_content
-    site_data['info'] = current_info
+    if page.get('truncated'):
+        # Only the first max_bytes of the page were read and compared
+        check_record['truncated'] = True
+    store.record_check(url, {
+        'last_checked': datetime.now().isoformat(),
+        'info': current_info,
+        'etag': page['etag'],
+        'last_modified': page['last_modified'],
+        'content_hash': page['content_hash'],
+        'truncated': page.get('truncated', False),
+        'page_fingerprint': page_fingerprint,
+        **first_fields,
+        **adapt_interval(url, site_data, changed=site_changed(changes))
+    }, check_record, snapshot=current_snapshot)
     
-    return jsonify({
+    return {
         'message': 'Site checked',
         'url': url,
         'changes': changes,
-        'current_info': current_info
+        'current_info': current_info,
+        'truncated': page.get('truncated', False)
+    }, 200
+
+# Background scheduler that re-checks every monitored site on its own interval
+scheduler = CheckScheduler(
+    perform_check,
+    default_interval=DEFAULT_CHECK_INTERVAL,
+    jitter=float(os.environ.get('MONITOR_CHECK_JITTER', 0.1)),
+    max_concurrent=int(os.environ.get('MONITOR_MAX_CONCURRENT_CHECKS', 8))
+)
+
+# Shared job queue (e.g. sqlite:///monitor-jobs.db) for worker.py processes. When it
+# is set, this app is only the control plane: sites are scheduled as jobs and
+# the workers run the checks
+QUEUE_SPEC = os.environ.get('MONITOR_QUEUE')
+job_queue = open_queue(
+    QUEUE_SPEC,
+    max_attempts=int(os.environ.get('MONITOR_QUEUE_MAX_ATTEMPTS', 3)),
+    retry_delay=float(os.environ.get('MONITOR_QUEUE_RETRY_DELAY', 30))
+) if QUEUE_SPEC else None
+
+def schedule_site(url, interval, delay=None):
+    """Put a site on the check schedule, by default one interval from now"""
+    if job_queue is not None:
+        job_queue.enqueue(url, interval, run_at=time.time() + (interval if delay is None else delay))
+    else:
+        scheduler.add(url, interval=interval, delay=delay)
+
+def defer_site(url, delay):
+    """Check a site again delay seconds from now, after a politeness pause
+
+    With the job queue the worker that ran the check reschedules the job.
+    """
+    if job_queue is None:
+        scheduler.defer(url, delay)
+
+def unschedule_site(url):
+    if job_queue is not None:
+        job_queue.remove(url)
+    else:
+        scheduler.remove(url)
+
+def schedule_stored_sites():
+    """Queue every stored site, spreading first checks over one interval"""
+    for url, site in store.list_sites():
+        interval = site.get('check_interval') or DEFAULT_CHECK_INTERVAL
+        schedule_site(url, interval, delay=random.uniform(0, interval))
+
+@app.route('/api/check_site', methods=['POST'])
+def check_site():
+    data = request.json
+    url = data.get('url')
+    
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    
+    # force skips the min_recheck cache (a check already running is still joined)
+    result, status = perform_check(url, force=bool(data.get('force')))
+    return jsonify(result), status
+
+# Concurrent fetcher for batch checks; the limits bound total and per-host connections
+batch_fetcher = AsyncFetcher(
+    max_concurrent=int(os.environ.get('MONITOR_BATCH_CONCURRENCY', 100)),
+    per_host=int(os.environ.get('MONITOR_BATCH_PER_HOST', 4)),
+    tor_proxy=TOR_PROXY,
+    tor_circuits=tor_circuits,
+    politeness=politeness,
+    max_bytes=MAX_PAGE_BYTES,
+    fallback_fetch=lambda url, use_tor, etag, last_modified, max_bytes: scrapers.get(use_tor).fetch_page(
+        url, etag=etag, last_modified=last_modified, max_bytes=max_bytes)
+)
+
+@app.route('/api/check_batch', methods=['POST'])
+@app.route('/api/check_all', methods=['POST'])
+def check_batch():
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls')
+    
+    if urls is None:
+        urls = store.list_urls()
+    elif not isinstance(urls, list):
+        return jsonify({'error': 'urls must be a list'}), 400
+    
+    sites = {url: store.get_site(url) for url in urls}
+    unknown = [url for url, site in sites.items() if site is None]
+    if unknown:
+        return jsonify({'error': 'Sites are not being monitored', 'urls': unknown}), 404
+    
+    # Sites checked less than min_recheck ago answer with that check, unless force
+    checked = {}
+    if not data.get('force'):
+        for url, site in sites.items():
+            cached = recent_result(url, site)
+            if cached is not None:
+                checks_reused.inc(reason='recent')
+                checked[url] = cached, 200
+    
+    # Sites with a check already in flight join it rather than fetch again
+    joining = [url for url in sites if url not in checked and check_flights.running(url)]
+    
+    # Fetch everything else concurrently, then run the usual compare/extract
+    # per site, joining any check of the site started meanwhile
+    pages = batch_fetcher.fetch_all(
+        (url, site.get('use_tor', False), site.get('etag'), site.get('last_modified'),
+         site.get('max_bytes'))
+        for url, site in sites.items() if url not in checked and url not in joining
+    )
+    scraper = scrapers.get()
+    
+    def record(url, page):
+        return single_check(url, record_check, url, scraper, page)
+    
+    if parse_pool is not None:
+        # Enough threads to keep every parse worker and its queue busy;
+        # the pool's queue limit blocks the rest
+        with ThreadPoolExecutor(max_workers=parse_pool.max_pending,
+                                thread_name_prefix='batch-check') as executor:
+            checked.update(zip(pages, executor.map(record, pages, pages.values())))
+    else:
+        checked.update((url, record(url, page)) for url, page in pages.items())
+    for url in joining:
+        # Fetches on its own if that check finished in the meantime
+        checked[url] = single_check(url, fetch_and_record, url)
+    results = {}
+    failed = 0
+    deferred = 0
+    for url, (result, status) in checked.items():
+        if result.get('deferred'):
+            deferred += 1
+        elif status != 200:
+            failed += 1
+        results[url] = result
+    
+    return jsonify({
+        'message': 'Batch checked',
+        'checked': len(results) - failed - deferred,
+        'failed': failed,
+        'deferred': deferred,
+        'results': results
+    })
+
+# Bulk imports register sites while the upload streams in, then run the
+# initial fetches in the background, MONITOR_BULK_CHUNK sites per batch fetch
+BULK_CHUNK = int(os.environ.get('MONITOR_BULK_CHUNK', 200))
+BULK_MAX_SITES = int(os.environ.get('MONITOR_BULK_MAX_SITES', 100000))
+# Rows registered per database transaction while an upload is read
+BULK_REGISTER_BATCH = 500
+bulk_jobs = BulkJobStore(side_db('bulk'))
+
+# Site settings that an export carries so that it can be imported again
+SITE_SETTINGS = ('fingerprint', 'ignore_patterns', 'simhash_threshold', 'max_bytes', 'min_recheck')
+EXPORT_CSV_COLUMNS = ('url', 'status', 'use_tor', 'check_interval', 'first_checked', 'last_checked',
+                      'history_count', 'title', 'website_type', 'payment_methods', 'link_count',
+                      'image_count') + SITE_SETTINGS
+
+def bulk_site(row):
+    """Validate one row of a bulk import like add_site does; returns (url, site fields, error)"""
+    url = row.get('url')
+    if not isinstance(url, str) or not url.strip():
+        return None, None, 'URL is required'
+    url = url.strip()
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return url, None, 'URL must be an absolute http(s) URL'
+    check_interval, error = parse_check_interval(row.get('check_interval'))
+    if error:
+        return url, None, error
+    options, error = site_options(row, {'fingerprint': FINGERPRINT_BY_DEFAULT})
+    if error:
+        return url, None, error
+    return url, {
+        'status': 'pending',
+        'first_checked': None,
+        'last_checked': None,
+        'info': None,
+        'use_tor': bool(row.get('use_tor', False)),
+        'check_interval': check_interval,
+        'base_interval': check_interval,
+        **options
+    }, None
+
+@app.route('/api/add_sites_bulk', methods=['POST'])
+def add_sites_bulk():
+    # The body is CSV with a header row (url, use_tor, check_interval and the
+    # site settings columns) or JSON lines with add_site's fields; format=csv
+    # or format=jsonl overrides the Content-Type. Sites are registered as
+    # 'pending' before this returns; /api/bulk_jobs/<job_id> follows the
+    # initial fetches and lists per-line errors
+    fmt = request.args.get('format') or ('csv' if request.mimetype in ('text/csv', 'application/csv')
+                                         else 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': "format must be 'csv' or 'jsonl'"}), 400
+    
+    job_id = bulk_jobs.create()
+    registered = []  # (line, url, use_tor, max_bytes) to fetch
+    batch = {}  # url -> (line, site fields) waiting to be inserted
+    errors = []  # (line, url, stage, error) not yet written to the job
+    seen = set()
+    counts = {'total': 0, 'rejected': 0}
+    
+    def register():
+        added = store.add_sites({url: site for url, (_, site) in batch.items()})
+        for url, (line, site) in batch.items():
+            if url in added:
+                registered.append((line, url, site['use_tor'], site.get('max_bytes')))
+            else:
+                errors.append((line, url, 'register', 'Site is already being monitored'))
+        counts['rejected'] += len(errors)
+        bulk_jobs.update(job_id, total=len(added) + len(errors),
+                         registered=len(added), rejected=len(errors), errors=errors)
+        batch.clear()
+        errors.clear()
+    
+    upload_error = None
+    try:
+        for line, row in read_rows(request.stream, fmt):
+            counts['total'] += 1
+            if isinstance(row, str):
+                errors.append((line, None, 'parse', row))
+                continue
+            url, site, error = bulk_site(row)
+            if error is None and url in seen:
+                error = 'Duplicate URL in upload'
+            if error is None and len(seen) >= BULK_MAX_SITES:
+                error = f'Too many sites in one upload (at most {BULK_MAX_SITES})'
+            if error is not None:
+                errors.append((line, url, 'validate', error))
+                continue
+            seen.add(url)
+            batch[url] = (line, site)
+            if len(batch) + len(errors) >= BULK_REGISTER_BATCH:
+                register()
+    except UnicodeDecodeError as e:
+        upload_error = f'Upload is not UTF-8: {e}'
+    except (csv.Error, OSError) as e:
+        upload_error = f'Upload could not be read: {e}'
+    # Sites registered before an unreadable part of the upload are imported all the same
+    register()
+    if upload_error is not None and not registered:
+        bulk_jobs.update(job_id, status='failed', error=upload_error)
+        return jsonify({'error': upload_error, 'job_id': job_id}), 400
+    
+    bulk_jobs.update(job_id, status='fetching', error=upload_error)
+    threading.Thread(target=run_bulk_import, args=(job_id, registered),
+                     name=f'bulk-import-{job_id[:8]}', daemon=True).start()
+    logger.info("Bulk import %s registered %d of %d sites", job_id, len(registered),
+                counts['total'], extra={'job_id': job_id})
+    return jsonify({
+        'message': 'Sites registered, initial fetches running',
+        'job_id': job_id,
+        'total': counts['total'],
+        'registered': len(registered),
+        'rejected': counts['rejected'],
+        # Why the upload could not be read to the end (rows after the error were skipped)
+        'error': upload_error,
+        'status_url': f'/api/bulk_jobs/{job_id}'
+    }), 202
+
+def run_bulk_import(job_id, sites):
+    """Fetch, parse and record the first snapshot of bulk-registered sites, BULK_CHUNK at a time
+
+    Failures are per site: a chunk whose fetch fails, or a site whose
+    snapshot cannot be recorded, is reported as a fetch error and every
+    registered site is scheduled regardless.
+    """
+    scraper = scrapers.get()
+    done = 0
+    try:
+        for start in range(0, len(sites), BULK_CHUNK):
+            chunk = sites[start:start + BULK_CHUNK]
+            lines = {url: line for line, url, _, _ in chunk}
+            try:
+                pages = batch_fetcher.fetch_all((url, use_tor, None, None, max_bytes)
+                                                for _, url, use_tor, max_bytes in chunk)
+            except Exception as e:
+                # The sites stay pending; their first scheduled check fetches them
+                logger.exception("Bulk import %s: fetching %d sites failed: %s", job_id, len(chunk), e,
+                                 extra={'job_id': job_id})
+                pages = {}
+            pages = {url: pages.get(url) for url in lines}
+            if parse_pool is not None:
+                with ThreadPoolExecutor(max_workers=parse_pool.max_pending,
+                                        thread_name_prefix='bulk-import') as executor:
+                    outcomes = dict(zip(pages, executor.map(
+                        lambda item: record_initial(item[0], scraper, item[1]), pages.items())))
+            else:
+                outcomes = {url: record_initial(url, scraper, page) for url, page in pages.items()}
+            done += len(chunk)
+            errors = [(lines[url], url, 'fetch', error) for url, error in outcomes.items() if error]
+            bulk_jobs.update(job_id, fetched=len(outcomes) - len(errors), failed=len(errors),
+                             errors=errors)
+    except Exception as e:
+        logger.exception("Bulk import %s failed: %s", job_id, e, extra={'job_id': job_id})
+        for _, url, _, _ in sites[done:]:
+            schedule_pending(url)
+        bulk_jobs.update(job_id, status='failed', error=repr(e))
+        return
+    bulk_jobs.update(job_id, status='done')
+    logger.info("Bulk import %s finished", job_id, extra={'job_id': job_id})
+
+def record_initial(url, scraper, page):
+    """Store the first snapshot of a pending site and schedule it; returns an error or None
+
+    A site whose fetch failed stays pending and is scheduled all the same:
+    its first successful check records the snapshot. One whose host asked
+    for a pause is first checked when the pause is over.
+    """
+    error = None
+    delay = None
+    try:
+        with site_locks.hold(url):
+            site_data = store.get_site(url)
+            if site_data is None:
+                return 'Site was removed'
+            # A site checked (e.g. with check_site) before the import got to it is no longer pending
+            if site_data.get('status') == 'pending' and page is not None and page.get('deferred'):
+                error = 'Deferred: the host asked for a pause'
+                delay = page['retry_in']
+            elif site_data.get('status') == 'pending' and (page is None or not page['content']):
+                error = 'Failed to fetch website content'
+            elif site_data.get('status') == 'pending':
+                snapshot = scraper.parse_snapshot(page['content'], url)
+                now = datetime.now().isoformat()
+                store.update_site(url, {
+                    'status': 'active',
+                    'last_checked': now,
+                    'first_checked': now,
+                    'info': scraper.extract_info_from_snapshot(snapshot),
+                    'etag': page['etag'],
+                    'last_modified': page['last_modified'],
+                    'content_hash': page['content_hash'],
+                    'truncated': page['truncated'],
+                    'page_fingerprint': fingerprint.fingerprint(
+                        page['content'], site_data.get('ignore_patterns') or ())
+                    if site_data.get('fingerprint') else None
+                }, snapshot=snapshot)
+    except Exception as e:
+        logger.exception("Error recording the first snapshot of %s: %s", url, e, extra={'url': url})
+        error = f'Failed to record the first snapshot: {e!r}'
+        schedule_pending(url)
+        return error
+    schedule_site(url, site_data.get('check_interval') or DEFAULT_CHECK_INTERVAL, delay=delay)
+    return error
+
+def schedule_pending(url):
+    """Schedule a registered site whose first snapshot could not be recorded"""
+    try:
+        site_data = store.get_site(url)
+        if site_data is not None:
+            schedule_site(url, site_data.get('check_interval') or DEFAULT_CHECK_INTERVAL)
+    except Exception as e:
+        logger.exception("Error scheduling %s: %s", url, e, extra={'url': url})
+
+@app.route('/api/bulk_jobs')
+def list_bulk_jobs():
+    return jsonify({'jobs': bulk_jobs.list()})
+
+@app.route('/api/bulk_jobs/<job_id>')
+def bulk_job_status(job_id):
+    # Progress counters plus one page of errors (errors_cursor/errors_limit)
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown bulk job'}), 404
+    try:
+        cursor = int(request.args.get('errors_cursor') or 0)
+        limit = min(int(request.args.get('errors_limit') or 100), MAX_HISTORY_PAGE)
+    except ValueError:
+        return jsonify({'error': 'errors_cursor and errors_limit must be integers'}), 400
+    if limit < 1:
+        return jsonify({'error': 'errors_limit must be positive'}), 400
+    job['pending'] = max(0, job['registered'] - job['fetched'] - job['failed'])
+    job['errors'], job['next_errors_cursor'] = bulk_jobs.errors(job_id, cursor, limit)
+    return jsonify(job)
+
+def export_row(url, site):
+    """A site as exported: add_site's fields, its settings and the latest info"""
+    row = {
+        'url': url,
+        'status': site.get('status'),
+        'use_tor': site.get('use_tor', False),
+        'check_interval': site.get('base_interval') or site.get('check_interval'),
+        'first_checked': site.get('first_checked'),
+        'last_checked': site.get('last_checked'),
+        'history_count': site.get('history_count', 0),
+    }
+    row.update({name: site[name] for name in SITE_SETTINGS if name in site})
+    row['info'] = site.get('info')
+    return row
+
+def csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+@app.route('/api/export_sites')
+def export_sites():
+    # Every site streamed as JSON lines (format=jsonl, the full latest info)
+    # or CSV (format=csv, info reduced to counts); either can be fed back to
+    # /api/add_sites_bulk
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': "format must be 'csv' or 'jsonl'"}), 400
+    
+    def generate():
+        if fmt == 'csv':
+            yield csv_line(EXPORT_CSV_COLUMNS)
+        for url, site in store.iter_sites():
+            row = export_row(url, site)
+            if fmt == 'jsonl':
+                yield json.dumps(row) + '\n'
+                continue
+            info = history_info(row.pop('info') or {})
+            row.update({
+                'title': info.get('title'),
+                'website_type': info.get('website_type'),
+                'payment_methods': ';'.join(info.get('payment_methods') or ()),
+                'link_count': info['link_count'],
+                'image_count': info['image_count'],
+                'use_tor': int(row['use_tor']),
+            })
+            if 'fingerprint' in row:
+                row['fingerprint'] = int(row['fingerprint'])
+            if row.get('ignore_patterns') is not None:
+                row['ignore_patterns'] = json.dumps(row['ignore_patterns'])
+            yield csv_line(['' if row.get(name) is None else row[name] for name in EXPORT_CSV_COLUMNS])
+    
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=sites.{fmt}'
     })
 
 @app.route('/api/get_sites')
 def get_sites():
-    # Return information about monitored sites without including the actual content
-    sites_info = {}
-    for url, data in monitored_sites.items():
-        sites_info[url] = {
-            'status': data.get('status'),
-            'last_checked': data.get('last_checked'),
-            'first_checked': data.get('first_checked'),
-            'info': data.get('info'),
-            'history_count': len(data.get('history', [])),
-            'use_tor': data.get('use_tor', False)
-        }
-    return jsonify(sites_info)
+    # Return information about monitored sites without including the actual content.
+    # light=1 replaces the link and image lists with counts; status, type, tor
+    # and q (url/title substring) filter, and limit/cursor page through the
+    # sites in url order (X-Total-Count and X-Next-Cursor headers)
+    args = request.args
+    try:
+        limit = int(args['limit']) if args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    use_tor = args.get('tor')
+    if use_tor not in (None, '0', '1'):
+        return jsonify({'error': "tor must be '0' or '1'"}), 400
+
+    site_index.check_external()
+    if request.if_none_match.contains_weak(sites_etag(site_index.version)):
+        response = Response(status=304)
+        response.set_etag(sites_etag(site_index.version), weak=True)
+        return response
+
+    version, pairs, total, next_cursor = site_index.listing(
+        light=args.get('light') == '1', status=args.get('status'),
+        website_type=args.get('type'), use_tor=None if use_tor is None else use_tor == '1',
+        query=args.get('q'), cursor=args.get('cursor'), limit=limit)
+    due = scheduler.next_due_all()
+    body = '{' + ','.join(
+        f'{json.dumps(url)}:{summary[:-1]},"next_check_in":{json.dumps(due.get(url))}}}'
+        for url, summary in pairs) + '}'
+    response = Response(body, mimetype='application/json')
+    # next_check_in counts down between changes, so the ETag is weak: it
+    # only changes when a site does
+    response.set_etag(sites_etag(version), weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Total-Count'] = str(total)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def sites_etag(version):
+    """ETag of a site listing: the index version plus the query that shaped it"""
+    return hashlib.sha1(f'{version}?{request.query_string.decode()}'.encode()).hexdigest()[:16]
+
+# Page size limits for history listings
+DEFAULT_HISTORY_PAGE = 100
+MAX_HISTORY_PAGE = 1000
+
+def parse_history_query(args, default_limit=DEFAULT_HISTORY_PAGE):
+    """Validate cursor/limit/since/until/order query parameters"""
+    try:
+        cursor = int(args['cursor']) if args.get('cursor') else None
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        return None, 'cursor and limit must be integers'
+    if limit < 1:
+        return None, 'limit must be positive'
+    since = args.get('since')
+    until = args.get('until')
+    for value in (since, until):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                return None, 'since and until must be ISO 8601 timestamps'
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        return None, "order must be 'asc' or 'desc'"
+    return {
+        'cursor': cursor,
+        'limit': min(limit, MAX_HISTORY_PAGE),
+        'since': since,
+        'until': until,
+        'descending': order == 'desc'
+    }, None
+
+def history_page(url, query):
+    """Yield up to query['limit'] (id, record) pairs, then the next cursor (or None)"""
+    records = store.iter_history(url, cursor=query['cursor'], since=query['since'],
+                                 until=query['until'], descending=query['descending'],
+                                 chunk_size=min(query['limit'] + 1, 500))
+    last_id = None
+    for count, (record_id, record) in enumerate(records):
+        if count == query['limit']:
+            # There is at least one more record: the page ends at last_id
+            records.close()
+            yield last_id
+            return
+        last_id = record_id
+        yield record_id, record
+    yield None
+
+@app.route('/api/history', methods=['GET'])
+def history_api():
+    url = request.args.get('url')
+    
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    
+    query, error = parse_history_query(request.args)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    if not store.has_site(url):
+        return jsonify({'error': 'Site is not being monitored'}), 404
+    
+    def generate():
+        yield '{"url": ' + json.dumps(url) + ', "records": ['
+        separator = ''
+        for item in history_page(url, query):
+            if not isinstance(item, tuple):
+                yield '], "next_cursor": ' + json.dumps(item) + '}'
+                return
+            record_id, record = item
+            record['id'] = record_id
+            yield separator + json.dumps(record)
+            separator = ', '
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 @app.route('/api/get_site_history', methods=['GET'])
 def get_site_history():
@@ -275,14 +1460,41 @@ def get_site_history():
     if not url:
         return jsonify({'error': 'URL is required'}), 400
     
-    if url not in monitored_sites:
+    query, error = parse_history_query(request.args, default_limit=50)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    if not store.has_site(url):
         return jsonify({'error': 'Site is not being monitored'}), 404
     
-    site_data = monitored_sites[url]
-    history = site_data.get('history', [])
+    # Render one page of history; the rows come from the same pager as /api/history
+    rows = []
+    next_cursor = None
+    for item in history_page(url, query):
+        if not isinstance(item, tuple):
+            next_cursor = item
+            break
+        _, record = item
+        # ISO timestamps already sort and read well; trim them instead of re-parsing
+        timestamp = record['timestamp'][:19].replace('T', ' ')
+        changes = record['changes']
+        info = record.get('info', {})
+        payment_methods = info.get('payment_methods', [])
+        rows.append(f"""
+                                    <tr>
+                                        <td>{timestamp}</td>
+                                        <td>{'Yes' if changes.get('text_changed', False) else 'No'}</td>
+                                        <td>{'Yes' if changes.get('title_changed', False) else 'No'}</td>
+                                        <td>{len(changes.get('added_links', []))}</td>
+                                        <td>{len(changes.get('removed_links', []))}</td>
+                                        <td>{len(changes.get('added_images', []))}</td>
+                                        <td>{len(changes.get('removed_images', []))}</td>
+                                        <td>{escape(info.get('website_type', 'Unknown'))}</td>
+                                        <td>{escape(', '.join(payment_methods)) if payment_methods else 'N/A'}</td>
+                                    </tr>
+            """)
     
-    # Generate HTML to display history properly
-    html = """
+    parts = ["""
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -319,7 +1531,7 @@ def get_site_history():
         </nav>
         
         <div class="container mt-4">
-            <h1>History for """ + url + """</h1>
+            <h1>History for """ + escape(url) + """</h1>
             <a href="/" class="btn btn-primary mb-4">Back to Dashboard</a>
             
             
@@ -329,14 +1541,14 @@ def get_site_history():
                 </div>
                 <div class="card-body">
                     <div id="history-container">
-    """
+    """]
     
-    if not history:
-        html += """
+    if not rows:
+        parts.append("""
                         <p>No history records available.</p>
-        """
+        """)
     else:
-        html += """
+        parts.append("""
                         <div class="table-responsive">
                             <table class="table table-striped">
                                 <thead>
@@ -353,41 +1565,22 @@ def get_site_history():
                                     </tr>
                                 </thead>
                                 <tbody>
-        """
-        
-        for record in history:
-            timestamp = datetime.fromisoformat(record['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
-            changes = record['changes']
-            text_changed = changes.get('text_changed', False)
-            title_changed = changes.get('title_changed', False)
-            added_links = len(changes.get('added_links', []))
-            removed_links = len(changes.get('removed_links', []))
-            added_images = len(changes.get('added_images', []))
-            removed_images = len(changes.get('removed_images', []))
-            website_type = record['info'].get('website_type', 'Unknown')
-            payment_methods = record['info'].get('payment_methods', [])
-            
-            html += f"""
-                                    <tr>
-                                        <td>{timestamp}</td>
-                                        <td>{'Yes' if text_changed else 'No'}</td>
-                                        <td>{'Yes' if title_changed else 'No'}</td>
-                                        <td>{added_links}</td>
-                                        <td>{removed_links}</td>
-                                        <td>{added_images}</td>
-                                        <td>{removed_images}</td>
-                                        <td>{website_type}</td>
-                                        <td>{', '.join(payment_methods) if payment_methods else 'N/A'}</td>
-                                    </tr>
-            """
-        
-        html += """
+        """)
+        parts.extend(rows)
+        parts.append("""
                                 </tbody>
                             </table>
                         </div>
-        """
+        """)
     
-    html += """
+    if next_cursor is not None:
+        next_args = {key: value for key, value in request.args.items() if key != 'cursor'}
+        next_args['cursor'] = next_cursor
+        parts.append(f"""
+                        <a href="/api/get_site_history?{escape(urlencode(next_args))}" class="btn btn-secondary">Next page</a>
+        """)
+    
+    parts.append("""
                     </div>
                 </div>
             </div>
@@ -396,9 +1589,76 @@ def get_site_history():
         <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha1/dist/js/bootstrap.bundle.min.js"></script>
     </body>
     </html>
-    """
+    """)
     
-    return html
+    return ''.join(parts)
+
+@app.route('/api/scheduler')
+def scheduler_status():
+    stats = scheduler.stats()
+    stats['parse_pool'] = parse_pool.stats() if parse_pool is not None else None
+    stats['events'] = events.stats()
+    stats['checks_in_flight'] = check_flights.in_flight()
+    stats['job_queue'] = job_queue.stats() if job_queue is not None else None
+    return jsonify(stats)
+
+# Queue depths and pool state, read when /metrics is scraped
+metrics.REGISTRY.gauge('monitor_scheduled_sites', 'Sites on the check schedule',
+                       function=lambda: scheduler.stats()['scheduled'])
+metrics.REGISTRY.gauge('monitor_checks_due', 'Checks past their due time waiting for a worker',
+                       function=lambda: scheduler.stats()['due'])
+metrics.REGISTRY.gauge('monitor_checks_running', 'Checks in progress',
+                       function=lambda: scheduler.stats()['running'])
+metrics.REGISTRY.gauge('monitor_parse_queue', 'Pages waiting for or in a parse worker',
+                       function=lambda: parse_pool.stats()['pending'] if parse_pool is not None else 0)
+metrics.REGISTRY.gauge('monitor_history_pending', 'History records buffered for the next database write',
+                       function=lambda: store.pending_count())
+metrics.REGISTRY.gauge('monitor_event_subscribers', 'Open /api/events streams',
+                       function=lambda: events.stats()['subscribers'])
+metrics.REGISTRY.gauge('monitor_tor_circuit_in_flight', 'Requests in flight per Tor circuit', ('circuit',),
+                       function=lambda: {(circuit['name'],): circuit['in_flight']
+                                         for circuit in tor_circuits.stats()} if tor_circuits else {})
+
+def watch_external_writes(interval):
+    """Poll for database writes by other processes in a daemon thread"""
+    def poll():
+        while True:
+            time.sleep(interval)
+            try:
+                site_index.check_external()
+            except Exception as e:
+                logger.warning("Error reloading the site index: %s", e)
+    threading.Thread(target=poll, name='index-poll', daemon=True).start()
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/events')
+def event_stream():
+    # Server-Sent Events: 'site' (summary as in get_sites?light=1), 'removed',
+    # 'check' (outcome of each check) and 'resync' (reload the listing)
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    subscriber = events.subscribe(last_id)
+    if subscriber is None:
+        return jsonify({'error': 'Too many event stream subscribers'}), 503
+    return Response(events.stream(subscriber), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/tor_circuits')
+def tor_circuit_status():
+    return jsonify({'circuits': tor_circuits.stats()})
+
+@app.route('/api/hosts')
+def host_status():
+    # Per-host politeness state: requests in flight, pauses and crawl delays
+    return jsonify({'hosts': politeness.stats()})
 
 @app.route('/api/remove_site', methods=['POST'])
 def remove_site():
@@ -408,11 +1668,11 @@ def remove_site():
     if not url:
         return jsonify({'error': 'URL is required'}), 400
     
-    if url not in monitored_sites:
+    # Remove the site, its snapshot and its history
+    if not store.remove_site(url):
         return jsonify({'error': 'Site is not being monitored'}), 404
-    
-    # Remove the site from monitored sites
-    del monitored_sites[url]
+    unschedule_site(url)
+    metrics.SITE_ERRORS.remove(site=url)
     
     return jsonify({
         'message': 'Site removed from monitoring',
@@ -469,10 +1729,16 @@ def index_template():
         </div>
         
         <script>
-            // Fetch monitored sites
+            // Fetch monitored sites; the table is only redrawn when they changed
+            let sitesEtag = null;
             async function loadSites() {
                 try {
-                    const response = await fetch('/api/get_sites');
+                    const headers = sitesEtag ? {'If-None-Match': sitesEtag} : {};
+                    const response = await fetch('/api/get_sites?light=1', {headers, cache: 'no-store'});
+                    if (response.status === 304) {
+                        return;
+                    }
+                    sitesEtag = response.headers.get('ETag');
                     const sites = await response.json();
                     displaySites(sites);
                 } catch (error) {
@@ -491,33 +1757,85 @@ def index_template():
                 }
                 
                 let html = '<div class="table-responsive"><table class="table table-striped">';
-                html += '<thead><tr><th>URL</th><th>Title</th><th>Last Checked</th><th>Status</th><th>Website Type</th><th>Payment Methods</th><th>Actions</th></tr></thead><tbody>';
+                html += '<thead><tr><th>URL</th><th>Title</th><th>Last Checked</th><th>Status</th><th>Website Type</th><th>Payment Methods</th><th>Actions</th></tr></thead><tbody id="sites-body">';
                 
                 for (const url in sites) {
-                    const site = sites[url];
-                    const lastChecked = new Date(site.last_checked).toLocaleString();
-                    const websiteType = site.info.website_type || 'Unknown';
-                    const paymentMethods = site.info.payment_methods || [];
-                    
-                    html += `<tr>
-                        <td>${url}</td>
-                        <td>${site.info.title || 'N/A'}</td>
-                        <td>${lastChecked}</td>
-                        <td>${site.status}</td>
-                        <td>${websiteType}</td>
-                        <td>${paymentMethods.join(', ') || 'N/A'}</td>
-                        <td>
-                            <button class="btn btn-sm btn-primary me-1" onclick="checkSite('${url}')">Check Now</button>
-                            <button class="btn btn-sm btn-info me-1" onclick="viewHistory('${url}')">History</button>
-                            <button class="btn btn-sm btn-danger" onclick="removeSite('${url}')">Remove</button>
-                        </td>
-                    </tr>`;
+                    html += siteRow(url, sites[url]);
                 }
                 
                 html += '</tbody></table></div>';
                 container.innerHTML = html;
             }
             
+            function siteRow(url, site) {
+                const info = site.info || {};
+                const lastChecked = site.last_checked ? new Date(site.last_checked).toLocaleString() : 'Never';
+                const websiteType = info.website_type || 'Unknown';
+                const paymentMethods = info.payment_methods || [];
+                
+                return `<tr data-url="${url}">
+                    <td>${url}</td>
+                    <td>${info.title || 'N/A'}</td>
+                    <td>${lastChecked}</td>
+                    <td>${site.status}</td>
+                    <td>${websiteType}</td>
+                    <td>${paymentMethods.join(', ') || 'N/A'}</td>
+                    <td>
+                        <button class="btn btn-sm btn-primary me-1" onclick="checkSite('${url}')">Check Now</button>
+                        <button class="btn btn-sm btn-info me-1" onclick="viewHistory('${url}')">History</button>
+                        <button class="btn btn-sm btn-danger" onclick="removeSite('${url}')">Remove</button>
+                    </td>
+                </tr>`;
+            }
+            
+            function findRow(url) {
+                const body = document.getElementById('sites-body');
+                return body ? Array.from(body.rows).find(row => row.dataset.url === url) : null;
+            }
+            
+            // Replace one site's row, or insert it in url order
+            function updateSiteRow(url, site) {
+                const body = document.getElementById('sites-body');
+                if (!body) {
+                    loadSites();
+                    return;
+                }
+                const template = document.createElement('tbody');
+                template.innerHTML = siteRow(url, site);
+                const row = template.rows[0];
+                const existing = findRow(url);
+                if (existing) {
+                    existing.replaceWith(row);
+                } else {
+                    const next = Array.from(body.rows).find(other => other.dataset.url > url);
+                    body.insertBefore(row, next || null);
+                }
+            }
+            
+            // Live updates: only the affected rows change
+            function subscribeEvents() {
+                const source = new EventSource('/api/events');
+                source.addEventListener('site', event => {
+                    const data = JSON.parse(event.data);
+                    updateSiteRow(data.url, data.site);
+                });
+                source.addEventListener('removed', event => {
+                    const row = findRow(JSON.parse(event.data).url);
+                    if (row) {
+                        row.remove();
+                    }
+                });
+                source.addEventListener('check', event => {
+                    const data = JSON.parse(event.data);
+                    const row = findRow(data.url);
+                    if (row) {
+                        row.classList.toggle('table-warning', data.changed);
+                        row.classList.toggle('table-danger', !data.ok);
+                    }
+                });
+                source.addEventListener('resync', () => loadSites());
+            }
+            
             async function checkSite(url) {
                 try {
                     const response = await fetch('/api/check_site', {
@@ -577,8 +1895,13 @@ def index_template():
             // Load sites on page load
             document.addEventListener('DOMContentLoaded', loadSites);
             
-            // Refresh sites every 60 seconds
-            setInterval(loadSites, 60000);
+            // Rows are kept current by the event stream; without EventSource,
+            // refresh sites every 60 seconds
+            if (window.EventSource) {
+                subscribeEvents();
+            } else {
+                setInterval(loadSites, 60000);
+            }
         </script>
         
         <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha1/dist/js/bootstrap.bundle.min.js"></script>
@@ -748,5 +2071,18 @@ def monitor_template():
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))  # Render provides PORT env var
-    print(f"Starting website monitoring application on port {port}...")
+    logger.info("Starting website monitoring application on port %d...", port)
+    # With the debug reloader the module is loaded twice; only the serving
+    # child process (WERKZEUG_RUN_MAIN) should run scheduled checks
+    if os.environ.get('MONITOR_SCHEDULER', '1') != '0' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Imports cut short by a restart leave their sites pending; the
+        # schedule picks them up like any other site
+        bulk_jobs.interrupt_running()
+        schedule_stored_sites()
+        if job_queue is None:
+            scheduler.start()
+        else:
+            # Workers write to the database directly; pick their results up
+            # for the site listing and the event stream
+            watch_external_writes(float(os.environ.get('MONITOR_INDEX_POLL', 1.0)))
     app.run(debug=True, host="0.0.0.0", port=port)
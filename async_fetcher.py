@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+
+import download
+import metrics
+from politeness import deferred_page
+
+# aiohttp (and aiohttp_socks for Tor) are optional: without them the fetcher
+# falls back to running the blocking fetch function in a thread pool
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    from aiohttp_socks import ProxyConnectionError, ProxyConnector, ProxyError, ProxyTimeoutError
+except ImportError:
+    ProxyConnector = None
+
+# Errors that fail one fetch; aiohttp_socks' proxy errors are not ClientErrors
+FETCH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError) if aiohttp is not None else ()
+if ProxyConnector is not None:
+    FETCH_ERRORS += (ProxyConnectionError, ProxyError, ProxyTimeoutError)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFetcher:
+    """Fetch many sites concurrently with a global and a per-host limit"""
+
+    def __init__(self, max_concurrent=100, per_host=4, timeout=30, tor_proxy=None,
+                 fallback_fetch=None, tor_circuits=None, politeness=None, max_bytes=5 * 1024 * 1024):
+        self.max_concurrent = max_concurrent
+        self.per_host = per_host
+        self.timeout = timeout
+        # Default cap on body bytes read per page
+        self.max_bytes = max_bytes
+        self.tor_proxy = tor_proxy
+        # Optional TorCircuitPool; Tor requests then pick a circuit each
+        self.tor_circuits = tor_circuits
+        # Optional Politeness: per-host rate limits, shared with the blocking fetch path
+        self.politeness = politeness
+        # Blocking fetch(url, use_tor, etag, last_modified, max_bytes)
+        # returning a page dict, used when aiohttp is not installed
+        self.fallback_fetch = fallback_fetch
+
+    def fetch_all(self, sites):
+        """Fetch an iterable of (url, use_tor, etag, last_modified[, max_bytes]) tuples
+
+        Returns {url: page or None}, where a page has the same shape as
+        WebScraper.fetch_page (status, content, etag, last_modified,
+        content_hash, size, truncated), or a politeness.deferred_page when
+        the site's host asked for a pause.
+        """
+        return asyncio.run(self.fetch_many(sites))
+
+    async def fetch_many(self, sites):
+        sites = list(sites)
+        total = asyncio.Semaphore(self.max_concurrent)
+        per_host = {}
+
+        def host_slot(url):
+            host = urlsplit(url).hostname or ''
+            if host not in per_host:
+                per_host[host] = asyncio.Semaphore(self.per_host)
+            return per_host[host]
+
+        sessions = self._open_sessions(any(site[1] for site in sites))
+        try:
+            async def fetch_one(url, use_tor, etag, last_modified, max_bytes=None):
+                page = await self._fetch(sessions, (host_slot(url), total), url, use_tor, etag,
+                                         last_modified, max_bytes or self.max_bytes)
+                return url, page
+
+            # One site failing in an unexpected way must not fail the others
+            results = await asyncio.gather(*(fetch_one(*site) for site in sites),
+                                           return_exceptions=True)
+        finally:
+            for session in sessions.values():
+                if session is not None:
+                    await session.close()
+        pages = {}
+        for site, result in zip(sites, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    # KeyboardInterrupt, cancellation and the like
+                    raise result
+                logger.error("Error fetching %s: %r", site[0], result, extra={'url': site[0]})
+                pages[site[0]] = None
+            else:
+                pages[result[0]] = result[1]
+        return pages
+
+    def _open_sessions(self, need_tor):
+        if aiohttp is None:
+            return {}
+        timeout = self._client_timeout()
+        sessions = {
+            False: aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrent,
+                                               limit_per_host=self.per_host),
+                timeout=timeout),
+            True: None,
+        }
+        # With a circuit pool, Tor sessions are opened per circuit on first use
+        if need_tor and self.tor_proxy and self.tor_circuits is None and ProxyConnector is not None:
+            sessions[True] = aiohttp.ClientSession(
+                connector=self._proxy_connector(self.tor_proxy),
+                timeout=timeout)
+        return sessions
+
+    def _circuit_session(self, sessions, proxy):
+        """Session for one circuit's proxy URL, stored in sessions under that URL"""
+        if proxy not in sessions:
+            sessions[proxy] = aiohttp.ClientSession(
+                connector=self._proxy_connector(proxy),
+                timeout=self._client_timeout())
+        return sessions[proxy]
+
+    def _client_timeout(self):
+        # The body download is bounded separately (see _request), so that an
+        # endless response is truncated rather than failed
+        return aiohttp.ClientTimeout(connect=self.timeout, sock_read=self.timeout)
+
+    def _proxy_connector(self, proxy):
+        # aiohttp_socks has no socks5h scheme; remote DNS is the rdns flag instead
+        rdns = proxy.startswith('socks5h://')
+        if rdns:
+            proxy = 'socks5://' + proxy[len('socks5h://'):]
+        return ProxyConnector.from_url(proxy, rdns=rdns, limit=self.max_concurrent,
+                                       limit_per_host=self.per_host)
+
+    async def _fetch(self, sessions, slots, url, use_tor, etag, last_modified, max_bytes):
+        """Fetch one site within slots, its (per-host, total) semaphores"""
+        host_slot, total = slots
+        use_circuit = use_tor and sessions and self.tor_circuits is not None and ProxyConnector is not None
+        session = sessions.get(bool(use_tor))
+        if not use_circuit and session is None:
+            # The fallback (WebScraper.fetch_page) waits for politeness and
+            # records its own metrics
+            async with host_slot, total:
+                return await self._fetch_in_thread(url, use_tor, etag, last_modified, max_bytes)
+        # Wait for the host's rate limit before taking a connection slot, so
+        # a throttled host does not hold up the others
+        permit = None
+        if self.politeness is not None:
+            permit = await self.politeness.acquire_async(url, use_tor)
+            if permit is None:
+                metrics.FETCHES.inc(route=metrics.route(use_tor), result='deferred')
+                return deferred_page(self.politeness.paused_for(url))
+        response = {}
+        try:
+            async with host_slot, total:
+                if use_circuit:
+                    # The event loop must not block, so take the least loaded
+                    # circuit even when it is at its concurrency limit
+                    circuit = self.tor_circuits.acquire(wait=False)
+                    return await self._timed_request(
+                        use_tor, self._circuit_session(sessions, circuit.proxy),
+                        url, etag, last_modified, max_bytes, response, circuit)
+                return await self._timed_request(use_tor, session, url, etag, last_modified,
+                                                 max_bytes, response)
+        finally:
+            if permit is not None:
+                self.politeness.release(permit, response.get('status'), response.get('retry_after'))
+
+    async def _timed_request(self, use_tor, *args):
+        start = time.perf_counter()
+        page = None
+        try:
+            page = await self._request(*args)
+            return page
+        finally:
+            metrics.observe_fetch(metrics.route(use_tor), time.perf_counter() - start, page)
+
+    async def _request(self, session, url, etag, last_modified, max_bytes, response_info, circuit=None):
+        """Fetch one page; the response status and Retry-After header are put
+        in response_info for the politeness layer"""
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        # Whether the transport worked: HTTP error statuses are not the circuit's fault
+        delivered = False
+        start = time.monotonic()
+        try:
+            async with session.get(url, headers=headers) as response:
+                response_info['status'] = response.status
+                response_info['retry_after'] = response.headers.get('Retry-After')
+                if response.status >= 400 or response.status == 304:
+                    delivered = True
+                response.raise_for_status()
+                if response.status == 304:
+                    return {
+                        'status': 304,
+                        'content': None,
+                        'etag': response.headers.get('ETag', etag),
+                        'last_modified': response.headers.get('Last-Modified', last_modified),
+                        'content_hash': None,
+                    }
+                content_type = response.headers.get('Content-Type')
+                if not download.content_type_allowed(content_type):
+                    delivered = True
+                    logger.warning("Error fetching %s: unsupported Content-Type %s", url, content_type,
+                                   extra={'url': url, 'content_type': content_type})
+                    return None
+                reader = download.BodyReader(max_bytes, content_type,
+                                             download.default_encoding(content_type))
+                deadline = time.monotonic() + self.timeout
+                async for chunk in response.content.iter_chunked(download.CHUNK_SIZE):
+                    if not reader.feed(chunk):
+                        break
+                    if time.monotonic() > deadline:
+                        reader.truncated = True
+                        break
+                body = reader.finish()
+                delivered = True
+                if body['truncated']:
+                    logger.info("Truncated %s after %d bytes", url, body['size'],
+                                extra={'url': url, 'size': body['size']})
+                return {
+                    'status': response.status,
+                    'content': body['content'],
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'content_hash': body['content_hash'],
+                    'size': body['size'],
+                    'truncated': body['truncated'],
+                }
+        except FETCH_ERRORS as e:
+            # A dead proxy or unreachable onion fails the circuit (delivered
+            # stays False), not the batch
+            logger.warning("Error fetching %s: %s", url, e, extra={'url': url})
+            return None
+        finally:
+            if circuit is not None:
+                self.tor_circuits.release(circuit, time.monotonic() - start, delivered)
+
+    async def _fetch_in_thread(self, url, use_tor, etag, last_modified, max_bytes):
+        if self.fallback_fetch is None:
+            logger.warning("Error fetching %s: no async client available", url, extra={'url': url})
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.fallback_fetch, url, use_tor,
+                                          etag, last_modified, max_bytes)
@@ -0,0 +1,68 @@
+"""Simulate adaptive check intervals against sites with known change rates.
+
+Replays --hours of checks for sites that change every 10 minutes, hourly,
+daily, never, and one that starts failing, and compares the number of
+fetches with a fixed --interval schedule. "missed" counts versions that
+came and went between two checks (a fixed 5 minute schedule misses none
+of these).
+
+    python benchmarks/bench_adaptive.py --hours 48 --min-interval 60
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adaptive import AdaptiveInterval  # noqa: E402
+
+
+def simulate(policy, period, hours, base_interval, fail_after=None):
+    state = None
+    now = 0.0
+    interval = base_interval
+    checks = missed = seen_version = 0
+    while now < hours * 3600:
+        now += interval
+        checks += 1
+        failed = fail_after is not None and now > fail_after
+        version = int(now // period) if period else 0
+        changed = version != seen_version and not failed
+        if changed:
+            missed += version - seen_version - 1
+            seen_version = version
+        state, interval = policy.update(state, now, changed=changed, failed=failed,
+                                        base_interval=base_interval)
+    return checks, missed, interval
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hours', type=float, default=48)
+    parser.add_argument('--interval', type=float, default=300, help='configured (fixed) interval')
+    parser.add_argument('--min-interval', type=float, default=60)
+    parser.add_argument('--max-interval', type=float, default=86400)
+    parser.add_argument('--checks-per-change', type=float, default=2)
+    args = parser.parse_args()
+
+    policy = AdaptiveInterval(min_interval=args.min_interval, max_interval=args.max_interval,
+                              checks_per_change=args.checks_per_change)
+    fixed = int(args.hours * 3600 / args.interval)
+    sites = [
+        ('changes every 10 min', 600, None),
+        ('changes hourly', 3600, None),
+        ('changes daily', 86400, None),
+        ('never changes', None, None),
+        ('fails after 1 hour', 3600, 3600),
+    ]
+    total = 0
+    for label, period, fail_after in sites:
+        checks, missed, interval = simulate(policy, period, args.hours, args.interval, fail_after)
+        total += checks
+        print(f"{label:<22} {checks:6d} checks (fixed: {fixed})  missed {missed}  "
+              f"final interval {interval:8.0f}s")
+    print(f"{'total':<22} {total:6d} checks (fixed: {fixed * len(sites)})")
+
+
+if __name__ == '__main__':
+    main()
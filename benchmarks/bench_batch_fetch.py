@@ -0,0 +1,88 @@
+"""Compare serial /api/check_site calls with one /api/check_batch call.
+
+Starts a local stub HTTP server that answers every path with a small HTML
+page after an artificial delay, registers --sites URLs spread over several
+loopback addresses and reports sites checked per second for both paths.
+
+    python benchmarks/bench_batch_fetch.py --sites 200 --delay 0.05
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONITOR_DB', ':memory:')
+# The stub servers are all on loopback: per-host politeness would measure itself
+os.environ.setdefault('MONITOR_HOST_RATE', '0')
+os.environ.setdefault('MONITOR_HOST_CONCURRENCY', '0')
+
+import app as monitor  # noqa: E402
+
+PAGE = (b"<html><head><title>Stub</title></head><body>"
+        + b"".join(b'<a href="/p%d">shop %d</a>' % (i, i) for i in range(50))
+        + b"</body></html>")
+
+
+def start_stub_server(delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # The default backlog of 5 drops connection bursts into SYN retries
+        request_queue_size = 1024
+
+    server = Server(('', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=200)
+    parser.add_argument('--hosts', type=int, default=8, help='loopback addresses to spread sites over')
+    parser.add_argument('--delay', type=float, default=0.05, help='stub server latency in seconds')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.delay)
+    port = server.server_address[1]
+    urls = [f'http://127.0.0.{1 + i % args.hosts}:{port}/site/{i}' for i in range(args.sites)]
+
+    client = monitor.app.test_client()
+    snapshot = monitor.scrapers.get().parse_snapshot(PAGE.decode())
+    for url in urls:
+        monitor.store.add_site(url, {'status': 'active', 'info': {}, 'use_tor': False},
+                               snapshot=snapshot)
+
+    start = time.perf_counter()
+    for url in urls:
+        client.post('/api/check_site', json={'url': url})
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post('/api/check_batch', json={'urls': urls})
+    batch = time.perf_counter() - start
+    assert response.json['checked'] == len(urls), response.json
+
+    print(f"sites:  {len(urls)} over {args.hosts} hosts, {args.delay * 1000:.0f} ms latency")
+    print(f"serial: {serial:7.2f} s  {len(urls) / serial:8.1f} sites/s")
+    print(f"batch:  {batch:7.2f} s  {len(urls) / batch:8.1f} sites/s  ({serial / batch:.1f}x)")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
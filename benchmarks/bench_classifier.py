@@ -0,0 +1,90 @@
+"""Time website type classification on large pages.
+
+Compares the original first-match rules (one substring scan per keyword
+and category, stopping at the first hit), per-keyword str.count scoring
+and the one-pass KeywordClassifier, with the default keyword set and with
+a large generated keyword set (--keywords).
+
+    python benchmarks/bench_classifier.py --size 4 --keywords 300
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classifier import DEFAULT_CATEGORIES, KeywordClassifier  # noqa: E402
+
+
+def first_match(categories, text):
+    """The original identify_website_type rules"""
+    text = text.lower()
+    for category, keywords in categories.items():
+        if any(keyword in text for keyword in keywords):
+            return category
+    return 'Unknown'
+
+
+def count_scores(categories, text):
+    text = text.lower()
+    return {category: sum(text.count(keyword) * weight for keyword, weight in keywords.items())
+            for category, keywords in categories.items()}
+
+
+def random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+
+def generated_categories(count, rng):
+    per_category = max(1, count // 5)
+    return {f'Type {i}': {random_word(rng): 1.0 for _ in range(per_category)} for i in range(5)}
+
+
+def make_text(size_mb, vocabulary, rng):
+    words = []
+    length = 0
+    while length < size_mb * 2 ** 20:
+        word = rng.choice(vocabulary)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def run(label, categories, text):
+    classifier = KeywordClassifier(categories)
+    old_ms, old_label = timed(first_match, categories, text)
+    count_ms, _ = timed(count_scores, categories, text)
+    new_ms, (new_label, _) = timed(classifier.classify, text)
+    print(f"{label:<18} first-match {old_ms:8.1f}ms ({old_label})  "
+          f"str.count {count_ms:8.1f}ms  classifier {new_ms:8.1f}ms ({new_label})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=float, default=2, help='page text size in MiB')
+    parser.add_argument('--keywords', type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    filler = [random_word(rng) for _ in range(2000)]
+    default_keywords = [keyword for keywords in DEFAULT_CATEGORIES.values() for keyword in keywords]
+
+    run('default, no hits', DEFAULT_CATEGORIES, make_text(args.size, filler, rng))
+    run('default, hits', DEFAULT_CATEGORIES, make_text(args.size, filler + default_keywords, rng))
+
+    generated = generated_categories(args.keywords, rng)
+    some_keywords = [keyword for keywords in generated.values() for keyword in list(keywords)[:3]]
+    run(f'{args.keywords} keywords', generated, make_text(args.size, filler + some_keywords, rng))
+
+
+if __name__ == '__main__':
+    main()
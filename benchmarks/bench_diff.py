@@ -0,0 +1,96 @@
+"""Time textdiff.diff_text against difflib on growing pages.
+
+Each page is --lines lines of text times a size factor; the new version
+has --edits random lines changed plus one inserted and one deleted block.
+difflib.SequenceMatcher over lines is what an offline diff would use.
+Pass --no-difflib to skip it on very large inputs.
+
+A second case rewrites --rewrites whole paragraphs of a prose page (long
+replaced regions, the worst case for the similarity's word and character
+matching); it must finish within --max-seconds or the script exits
+non-zero.
+
+    python benchmarks/bench_diff.py --lines 20000 --factors 1 2 4 8
+"""
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import textdiff  # noqa: E402
+
+
+def make_versions(lines, edits, rng):
+    # A small vocabulary gives many repeated lines, like real listing pages
+    old = [f'item {rng.randrange(lines // 4)} price {rng.randrange(100)} BTC\n' for _ in range(lines)]
+    new = list(old)
+    for _ in range(edits):
+        index = rng.randrange(len(new))
+        new[index] = 'updated ' + new[index]
+    del new[lines // 3:lines // 3 + 20]
+    new[2 * lines // 3:2 * lines // 3] = [f'new listing {i}\n' for i in range(20)]
+    return ''.join(old), ''.join(new)
+
+
+def make_rewrites(paragraphs, rewrites, rng):
+    """A prose page and a version of it with whole paragraphs rewritten"""
+    # Short words over a small alphabet, as in prose: plenty of character
+    # matches between unrelated paragraphs
+    vocabulary = [''.join(rng.choice('etaoinshrdlucmfwyp') for _ in range(rng.randrange(2, 9)))
+                  for _ in range(5000)]
+
+    def paragraph():
+        return ' '.join(rng.choice(vocabulary) for _ in range(rng.randrange(60, 600))) + '\n'
+
+    old = [paragraph() for _ in range(paragraphs)]
+    new = list(old)
+    for index in rng.sample(range(paragraphs), rewrites):
+        new[index] = paragraph()
+    return ''.join(old), ''.join(new)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=20000)
+    parser.add_argument('--edits', type=int, default=1000)
+    parser.add_argument('--factors', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--no-difflib', action='store_true')
+    parser.add_argument('--paragraphs', type=int, default=100)
+    parser.add_argument('--rewrites', type=int, default=50)
+    parser.add_argument('--max-seconds', type=float, default=1.0,
+                        help='time limit for the rewritten paragraphs case')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'size':>10} {'diff_text':>12} {'similarity':>11} {'difflib':>12} {'ratio':>8}")
+    for factor in args.factors:
+        old, new = make_versions(args.lines * factor, args.edits, rng)
+        elapsed, result = timed(textdiff.diff_text, old, new)
+        line = f"{len(old) / 2 ** 20:8.2f}MB {elapsed * 1000:10.1f}ms {result['similarity']:11.4f}"
+        if not args.no_difflib:
+            matcher = difflib.SequenceMatcher(None, old.splitlines(True), new.splitlines(True))
+            reference_elapsed, ratio = timed(matcher.ratio)
+            line += f" {reference_elapsed * 1000:10.1f}ms {ratio:8.4f}"
+        print(line)
+
+    old, new = make_rewrites(args.paragraphs, args.rewrites, rng)
+    elapsed, result = timed(textdiff.diff_text, old, new)
+    print(f"{len(old) / 1024:8.0f}KB with {args.rewrites} of {args.paragraphs} paragraphs rewritten: "
+          f"{elapsed * 1000:.1f}ms, similarity {result['similarity']:.4f}")
+    if elapsed > args.max_seconds:
+        print(f"FAIL: slower than {args.max_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
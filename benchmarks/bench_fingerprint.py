@@ -0,0 +1,78 @@
+"""CPU time per check with and without the fingerprint fast path.
+
+Each scenario checks a page against the previous version: byte-identical,
+identical apart from a rotating CSRF token and timestamp (with and without
+ignore patterns), and a real content change. The full path parses the new
+page, diffs it against the previous snapshot and extracts the site info;
+the fingerprint path does that only when compare_page reports a change.
+
+    python benchmarks/bench_fingerprint.py --paragraphs 2000 --engine stream
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fingerprint  # noqa: E402
+import parsers  # noqa: E402
+from app import WebScraper  # noqa: E402
+from bench_parse import generate_page  # noqa: E402
+
+IGNORE_PATTERNS = [r'name="csrf" value="[^"]*"', r'Generated at [\d:]+']
+
+
+def with_noise(page, token, clock):
+    return page.replace('</body>', f'<input type="hidden" name="csrf" value="{token}">'
+                                   f'<p>Generated at {clock}</p></body>')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=500)
+    parser.add_argument('--images', type=int, default=100)
+    parser.add_argument('--paragraphs', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--engine', default=parsers.DEFAULT_ENGINE, choices=parsers.available_engines())
+    args = parser.parse_args()
+
+    scraper = WebScraper(parser=args.engine)
+    base = generate_page(args.links, args.images, args.paragraphs, 1)
+    previous = with_noise(base, 'a1b2c3d4', '12:00:00')
+    changed = generate_page(args.links, args.images, args.paragraphs, 2)
+    scenarios = [
+        ('identical', previous, []),
+        ('rotating token', with_noise(base, 'e5f6a7b8', '12:05:00'), []),
+        ('token, ignored', with_noise(base, 'e5f6a7b8', '12:05:00'), IGNORE_PATTERNS),
+        ('real change', with_noise(changed, 'e5f6a7b8', '12:05:00'), IGNORE_PATTERNS),
+    ]
+    old_snapshot = scraper.parse_snapshot(previous)
+
+    def full_check(page):
+        snapshot = scraper.parse_snapshot(page)
+        scraper.compare_snapshots(old_snapshot, snapshot)
+        scraper.extract_info_from_snapshot(snapshot)
+
+    print(f"page {len(base) / 1024:.0f} KiB, engine {args.engine}")
+    for label, page, patterns in scenarios:
+        old_fingerprint = fingerprint.fingerprint(previous, patterns)
+
+        start = time.process_time()
+        for _ in range(args.repeat):
+            full_check(page)
+        full_ms = (time.process_time() - start) / args.repeat * 1000
+
+        start = time.process_time()
+        for _ in range(args.repeat):
+            _, match = fingerprint.compare_page(old_fingerprint, page, patterns)
+            if match['match'] == 'changed':
+                full_check(page)
+        fast_ms = (time.process_time() - start) / args.repeat * 1000
+
+        print(f"{label:<16} {match['match']:<15} distance {match['distance']!s:>4}  "
+              f"full {full_ms:7.2f}ms  fingerprint {fast_ms:7.2f}ms  ({full_ms / fast_ms:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Time /api/get_sites: a full walk over the store against the summary index.
+
+Fills an in-memory store with --sites sites whose info carries --links
+links and --images images, then times the old per-request walk
+(list_sites plus jsonify of every site), the indexed full and light
+listings, a filtered page, and a revalidation that ends in 304.
+
+    python benchmarks/bench_get_sites.py --sites 2000 --links 300
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONITOR_DB', ':memory:')
+
+import app as monitor  # noqa: E402
+from flask import jsonify  # noqa: E402
+
+
+def walk_sites():
+    """The listing as it was built before the index: every site, every request"""
+    return jsonify({url: dict(monitor.site_summary(data), next_check_in=monitor.scheduler.next_due(url))
+                    for url, data in monitor.store.list_sites()})
+
+
+def timed(label, repeat, call):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = call()
+    ms = (time.perf_counter() - start) / repeat * 1000
+    print(f"{label:<28} {ms:8.2f}ms  {response.status_code}  {len(response.get_data()) / 1024:8.0f} KiB")
+    return ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=1000)
+    parser.add_argument('--links', type=int, default=200)
+    parser.add_argument('--images', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for i in range(args.sites):
+        monitor.store.add_site(f'http://site{i:05d}.example/', {
+            'status': 'active',
+            'use_tor': i % 3 == 0,
+            'info': {
+                'title': f'Site {i}',
+                'website_type': ('shop', 'blog', 'forum')[i % 3],
+                'links': [f'http://site{i:05d}.example/page{n}' for n in range(args.links)],
+                'images': [f'http://site{i:05d}.example/img{n}.png' for n in range(args.images)],
+            },
+        })
+    print(f"{args.sites} sites added in {time.perf_counter() - start:.2f}s (index kept current)")
+
+    client = monitor.app.test_client()
+    with monitor.app.app_context():
+        walk_ms = timed('walk store + jsonify', args.repeat, walk_sites)
+    timed('index, full', args.repeat, lambda: client.get('/api/get_sites'))
+    light_ms = timed('index, light', args.repeat, lambda: client.get('/api/get_sites?light=1'))
+    timed('index, light, type+page', args.repeat,
+          lambda: client.get('/api/get_sites?light=1&type=shop&limit=50'))
+    etag = client.get('/api/get_sites?light=1').headers['ETag']
+    revalidate_ms = timed('index, light, 304', args.repeat,
+                          lambda: client.get('/api/get_sites?light=1', headers={'If-None-Match': etag}))
+    print(f"light listing {walk_ms / light_ms:.1f}x faster than the walk, 304 {walk_ms / revalidate_ms:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
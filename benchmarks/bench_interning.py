@@ -0,0 +1,167 @@
+"""Memory and speed of interned link/image sets vs. lists of raw strings.
+
+Simulates --sites link-heavy directory sites, each linking to --links
+URLs drawn from a shared pool of --pool URLs (directories list the same
+services), checked --checks times; a check replaces --churn of a page's
+links. Two layouts hold every site's latest links and images and diff
+each check against the previous one, read back from JSON as the store
+does:
+
+- strings: lists of freshly parsed strings per snapshot and diffs on
+  sets of them, as before interning
+- interned: lists of ids into a UrlTable (normalized against the page
+  URL) and diffs on sets of ids, resolved back to URLs only for changes
+
+Reports the heap held after the run, time per check (interning
+included) and the JSON size of one stored snapshot's link lists:
+
+    python benchmarks/bench_interning.py --sites 200 --links 1000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from url_table import UrlTable, normalize_url  # noqa: E402
+
+
+def fresh(value):
+    """A new string object with the same value, as re-parsing would produce"""
+    return (value + '.')[:-1]
+
+
+class DirectorySite:
+    def __init__(self, index, pool, links, images, rng):
+        self.url = f'http://dir{index}.onion/'
+        self.pool = pool
+        self.rng = rng
+        self.links = rng.sample(pool, links)
+        self.images = [f'/static/{index}/{i}.png' for i in range(images)]
+
+    def mutate(self, churn):
+        for _ in range(churn):
+            self.links[self.rng.randrange(len(self.links))] = self.rng.choice(self.pool)
+
+    def parsed(self):
+        # Raw hrefs as a parser returns them: new string objects every time
+        return [fresh(link) for link in self.links], [fresh(image) for image in self.images]
+
+
+def simulate(args, layout, trace=False):
+    """Run the checks; returns seconds per check, or with trace (heap bytes
+    held, JSON bytes per snapshot) instead: tracemalloc slows every
+    allocation down, so timing and memory are measured in separate runs"""
+    rng = random.Random(args.seed)
+    pool = [f'http://{rng.getrandbits(80):020x}.onion/item/{i}' for i in range(args.pool)]
+    sites = [DirectorySite(i, pool, args.links, args.images, rng) for i in range(args.sites)]
+    if trace:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    latest = [layout.snapshot(site) for site in sites]
+    # The previous snapshot comes back from the store as JSON on every check
+    stored = [json.dumps(snapshot) for snapshot in latest]
+    elapsed = 0.0
+    for _ in range(args.checks):
+        for index, site in enumerate(sites):
+            site.mutate(args.churn)
+            start = time.perf_counter()
+            snapshot = layout.snapshot(site)
+            layout.diff(json.loads(stored[index]), snapshot)
+            stored[index] = json.dumps(snapshot)
+            elapsed += time.perf_counter() - start
+            latest[index] = snapshot
+    if not trace:
+        return elapsed / (args.sites * args.checks)
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return held, len(json.dumps(latest[0]))
+
+
+class StringLayout:
+    def snapshot(self, site):
+        links, images = site.parsed()
+        return {'links': links, 'images': images}
+
+    def diff(self, old, new):
+        changes = {}
+        for field in ('links', 'images'):
+            old_set, new_set = set(old[field]), set(new[field])
+            changes['added_' + field] = list(new_set - old_set)
+            changes['removed_' + field] = list(old_set - new_set)
+        return changes
+
+
+class InternedLayout:
+    def __init__(self, table):
+        self.table = table
+
+    def snapshot(self, site):
+        links, images = site.parsed()
+        return self.table.intern_snapshot({'links': links, 'images': images}, site.url)
+
+    def diff(self, old, new):
+        changes = {}
+        for field in ('links', 'images'):
+            changes['added_' + field], changes['removed_' + field] = \
+                self.table.diff(old[field], new[field])
+        return changes
+
+
+def verify(args):
+    """Both layouts report the same changes (up to normalization against the page URL)"""
+    rng = random.Random(args.seed)
+    pool = [f'http://{rng.getrandbits(80):020x}.onion/item/{i}' for i in range(1000)]
+    site = DirectorySite(0, pool, 100, 10, rng)
+    strings, interned = StringLayout(), InternedLayout(UrlTable())
+    old_strings, old_ids = strings.snapshot(site), interned.snapshot(site)
+    site.mutate(10)
+    site.images[0] = '/static/new.png#top'
+    expected = strings.diff(old_strings, strings.snapshot(site))
+    actual = interned.diff(old_ids, interned.snapshot(site))
+    for key, urls in expected.items():
+        assert sorted(normalize_url(url, site.url) for url in urls) == sorted(actual[key]), key
+
+
+def mib(value):
+    return f'{value / 2 ** 20:8.1f} MiB'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=200)
+    parser.add_argument('--links', type=int, default=1000, help='links per page')
+    parser.add_argument('--images', type=int, default=50, help='images per page')
+    parser.add_argument('--pool', type=int, default=50000, help='distinct link targets across sites')
+    parser.add_argument('--churn', type=int, default=20, help='links replaced per check')
+    parser.add_argument('--checks', type=int, default=5)
+    parser.add_argument('--cache', type=int, default=200000, help='URLs the table caches in memory')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    strings = (simulate(args, StringLayout()), *simulate(args, StringLayout(), trace=True))
+    with tempfile.TemporaryDirectory() as directory:
+        # SQLite-backed tables, as the app uses; tracemalloc counts their cache
+        interned = simulate(args, InternedLayout(
+            UrlTable(os.path.join(directory, 'timed.db'), cache_size=args.cache)))
+        table = UrlTable(os.path.join(directory, 'traced.db'), cache_size=args.cache)
+        interned = (interned, *simulate(args, InternedLayout(table), trace=True))
+        urls = len(table)
+
+    verify(args)
+    print(f"{args.sites} sites x {args.links} links (+{args.images} images) from a pool of "
+          f"{args.pool}, {args.checks} checks replacing {args.churn} links each")
+    print(f"strings:  {strings[0] * 1e3:7.3f} ms/check  heap {mib(strings[1])}  "
+          f"snapshot lists {strings[2] / 1024:7.1f} KiB")
+    print(f"interned: {interned[0] * 1e3:7.3f} ms/check  heap {mib(interned[1])}  "
+          f"snapshot lists {interned[2] / 1024:7.1f} KiB  ({urls} URLs cached)")
+    print(f"heap {strings[1] / interned[1]:.1f}x smaller, stored lists "
+          f"{strings[2] / interned[2]:.1f}x smaller, checks {strings[0] / interned[0]:.2f}x as fast")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Memory used by check history: in-memory dicts vs. the snapshot store.
+
+Simulates --sites sites checked --checks times each. A page changes on a
+check with probability --mutation-rate; otherwise the same content is
+fetched again. The in-memory layout keeps the latest HTML per site and a
+full info dict (with link and image lists) in every history record, as
+the monitor did before the snapshot store. The store layout keeps history
+rows with hashes and deltas and deduplicated, compressed snapshots.
+
+Results are measured at the given scale and projected linearly to
+--project-sites x --project-checks (10k x 1k by default):
+
+    python benchmarks/bench_memory.py --sites 200 --checks 100
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import SiteStore  # noqa: E402
+
+
+def fresh(value):
+    """A new string object with the same value, as re-parsing would produce"""
+    return (value + '.')[:-1]
+
+
+class SyntheticSite:
+    def __init__(self, index, links, images, rng):
+        self.rng = rng
+        self.links = [f'/site{index}/item/{rng.randrange(10 ** 6)}' for _ in range(links)]
+        self.images = [f'/site{index}/img/{rng.randrange(10 ** 6)}.png' for _ in range(images)]
+        self.words = [f'word{rng.randrange(5000)}' for _ in range(400)]
+        self.version = 0
+
+    def mutate(self):
+        self.version += 1
+        self.links[self.rng.randrange(len(self.links))] = f'/new/{self.rng.randrange(10 ** 6)}'
+        self.words[self.rng.randrange(len(self.words))] = f'changed{self.version}'
+
+    def html(self):
+        return ('<html><head><title>Site</title></head><body><p>' + ' '.join(self.words) + '</p>'
+                + ''.join(f'<a href="{link}">x</a>' for link in self.links)
+                + ''.join(f'<img src="{image}">' for image in self.images) + '</body></html>')
+
+    def snapshot(self):
+        return {
+            'title': 'Site', 'has_title': True, 'meta_description': None,
+            'links': [fresh(link) for link in self.links],
+            'images': [fresh(image) for image in self.images],
+            'text': ' '.join(self.words), 'payment_methods': [], 'transactions': [],
+        }
+
+
+def info_from(snapshot):
+    return {
+        'title': snapshot['title'], 'meta_description': 'No Description',
+        'links': snapshot['links'], 'images': snapshot['images'],
+        'text_length': len(snapshot['text']), 'website_type': 'Unknown',
+        'payment_methods': [], 'transactions': [],
+    }
+
+
+def changes_between(old, new):
+    old_links, new_links = set(old['links']), set(new['links'])
+    return {
+        'text_changed': old['text'] != new['text'],
+        'old_text_length': len(old['text']), 'new_text_length': len(new['text']),
+        'added_links': list(new_links - old_links), 'removed_links': list(old_links - new_links),
+        'added_images': [], 'removed_images': [], 'title_changed': False,
+    }
+
+
+def simulate(sites, checks, rate, seed, record):
+    rng = random.Random(seed)
+    population = [SyntheticSite(i, 100, 20, rng) for i in range(sites)]
+    previous = [site.snapshot() for site in population]
+    for _ in range(checks):
+        for index, site in enumerate(population):
+            if rng.random() < rate:
+                site.mutate()
+            snapshot = site.snapshot()
+            record(index, site, previous[index], snapshot)
+            previous[index] = snapshot
+
+
+def run_dict_layout(args):
+    monitored_sites = {}
+
+    def record(index, site, old, new):
+        data = monitored_sites.setdefault(index, {'history': []})
+        data['content'] = site.html()
+        data['info'] = info_from(new)
+        data['history'].append({'timestamp': time.time(), 'changes': changes_between(old, new),
+                                'info': info_from(new)})
+
+    tracemalloc.start()
+    simulate(args.sites, args.checks, args.mutation_rate, args.seed, record)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, 0
+
+
+def run_store_layout(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        store = SiteStore(path, batch_size=500, keep_snapshots=args.keep_snapshots)
+        for index in range(args.sites):
+            store.add_site(str(index), {'status': 'active', 'info': {}})
+
+        def record(index, site, old, new):
+            info = info_from(new)
+            summary = {key: value for key, value in info.items() if key not in ('links', 'images')}
+            store.record_check(str(index), {'info': info},
+                               {'timestamp': str(time.time()), 'changes': changes_between(old, new),
+                                'info': summary},
+                               snapshot=new if new != old else None)
+
+        tracemalloc.start()
+        simulate(args.sites, args.checks, args.mutation_rate, args.seed, record)
+        store.prune()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = store.storage_stats()
+        store.close()
+        disk = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    return current, peak, disk, stats
+
+
+def mib(value):
+    return f'{value / 2 ** 20:10.1f} MiB'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=100)
+    parser.add_argument('--checks', type=int, default=100)
+    parser.add_argument('--mutation-rate', type=float, default=0.1)
+    parser.add_argument('--keep-snapshots', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--project-sites', type=int, default=10000)
+    parser.add_argument('--project-checks', type=int, default=1000)
+    args = parser.parse_args()
+
+    scale = (args.project_sites * args.project_checks) / (args.sites * args.checks)
+    dict_current, dict_peak, _ = run_dict_layout(args)
+    store_current, store_peak, disk, stats = run_store_layout(args)
+
+    print(f"{args.sites} sites x {args.checks} checks, mutation rate {args.mutation_rate}")
+    print(f"dict layout:  heap {mib(dict_current)}  projected {mib(dict_current * scale)}")
+    print(f"store layout: heap {mib(store_current)}  (peak {mib(store_peak).strip()}), "
+          f"disk {mib(disk).strip()}, projected disk {mib(disk * scale).strip()}")
+    print(f"snapshots stored: {stats['snapshots']} "
+          f"({mib(stats['raw_bytes']).strip()} raw, {mib(stats['stored_bytes']).strip()} compressed)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""CPU time per check: re-parsing old and new HTML vs. one cached snapshot.
+
+The old path is compare_content(old_html, new_html) followed by
+extract_website_info(new_html), i.e. three BeautifulSoup parses per check.
+The snapshot path parses the new page once and diffs it against the
+snapshot kept from the previous check.
+
+    python benchmarks/bench_parse.py --links 2000 --paragraphs 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsers  # noqa: E402
+from app import WebScraper  # noqa: E402
+
+
+def generate_page(links, images, paragraphs, seed):
+    rng = random.Random(seed)
+    parts = ['<html><head><title>Market %d</title>' % seed,
+             '<meta name="description" content="Synthetic page"></head><body>']
+    for i in range(paragraphs):
+        parts.append('<p>Listing %d: buy product %d in our store.</p>' % (i, rng.randrange(10 ** 6)))
+    for i in range(links):
+        parts.append('<a href="/item/%d">item</a>' % rng.randrange(links * 2))
+    for i in range(images):
+        parts.append('<img src="/img/%d.png">' % rng.randrange(images * 2))
+    parts.append('<div class="payment-method">Bitcoin</div></body></html>')
+    return ''.join(parts)
+
+
+def cpu_per_check(func, pages, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        func(pages)
+    return (time.process_time() - start) / (repeat * (len(pages) - 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=500)
+    parser.add_argument('--images', type=int, default=100)
+    parser.add_argument('--paragraphs', type=int, default=500)
+    parser.add_argument('--checks', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engine', default=parsers.DEFAULT_ENGINE, choices=parsers.available_engines())
+    args = parser.parse_args()
+
+    scraper = WebScraper()
+    engine_scraper = WebScraper(parser=args.engine)
+    pages = [generate_page(args.links, args.images, args.paragraphs, seed)
+             for seed in range(args.checks + 1)]
+
+    def reparse(pages):
+        for old, new in zip(pages, pages[1:]):
+            scraper.compare_content(old, new)
+            scraper.extract_website_info(new)
+
+    def snapshot(pages):
+        previous = engine_scraper.parse_snapshot(pages[0])
+        for new in pages[1:]:
+            current = engine_scraper.parse_snapshot(new)
+            engine_scraper.compare_snapshots(previous, current)
+            engine_scraper.extract_info_from_snapshot(current)
+            previous = current
+
+    before = cpu_per_check(reparse, pages, args.repeat)
+    after = cpu_per_check(snapshot, pages, args.repeat)
+    print(f"page size: {len(pages[0]) / 1024:.0f} KiB")
+    print(f"re-parse:  {before * 1000:8.2f} ms CPU per check")
+    print(f"snapshot:  {after * 1000:8.2f} ms CPU per check  ({before / after:.1f}x, {args.engine})")
+
+
+if __name__ == '__main__':
+    main()
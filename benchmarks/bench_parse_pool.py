@@ -0,0 +1,53 @@
+"""Parse throughput in-process vs. in a ParsePool of worker processes.
+
+Parses --pages synthetic pages the way /api/check_batch does with
+MONITOR_PARSE_WORKERS set: a thread per queue slot hands pages to the pool
+and waits for the snapshot. Throughput should grow with the worker count
+up to the number of cores (os.cpu_count() is printed for reference).
+
+    python benchmarks/bench_parse_pool.py --pages 200 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsers  # noqa: E402
+from bench_parse import generate_page  # noqa: E402
+from parse_pool import ParsePool  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--paragraphs', type=int, default=1000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--engine', default=parsers.DEFAULT_ENGINE, choices=parsers.available_engines())
+    args = parser.parse_args()
+
+    pages = [generate_page(args.paragraphs // 2, 50, args.paragraphs, seed) for seed in range(args.pages)]
+    print(f"{len(pages)} pages of {len(pages[0]) / 1024:.0f} KiB, engine {args.engine}, "
+          f"{os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    expected = [parsers.parse_snapshot(page, args.engine) for page in pages]
+    baseline = time.perf_counter() - start
+    print(f"in-process:  {len(pages) / baseline:8.1f} pages/s")
+
+    for workers in args.workers:
+        pool = ParsePool(workers)
+        pool.parse(pages[0], args.engine)  # start the workers outside the timing
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=pool.max_pending) as executor:
+            snapshots = list(executor.map(lambda page: pool.parse(page, args.engine), pages))
+        elapsed = time.perf_counter() - start
+        pool.shutdown()
+        assert snapshots == expected
+        print(f"{workers:2d} workers:  {len(pages) / elapsed:8.1f} pages/s  ({baseline / elapsed:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""End-to-end benchmark of add_site/check_site against a local site farm.
+
+Starts a SiteFarm (and, with --tor-share, a stub SOCKS proxy standing in
+for Tor, reached through .onion hostnames), then drives the app through
+the Flask test client: --sites add_site calls, --rounds rounds of
+check_site over every site, and a page of /api/history per site. Besides
+the request latencies it times the stages inside each request: fetch
+(WebScraper.fetch_page), parse, diff, history_write (store.record_check)
+and history_read. For each it reports count, throughput, p50/p99/max
+latency, and the peak RSS of this process after the phase.
+
+Results are written as JSON (stdout or --output). With --baseline, p50
+and p99 are compared against an earlier run and the exit status is 1 if
+any got slower than --tolerance allows:
+
+    python benchmarks/bench_suite.py --sites 50 --rounds 5 --output base.json
+    python benchmarks/bench_suite.py --sites 50 --rounds 5 --baseline base.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from site_farm import SiteFarm  # noqa: E402
+from stub_socks import StubSocksServer  # noqa: E402
+
+# Latency changes smaller than this are noise, whatever the ratio
+NOISE_FLOOR_MS = 0.5
+
+
+class StageTimer:
+    """Collect wall-clock samples per stage"""
+
+    def __init__(self):
+        self.samples = {}
+        self.elapsed = {}
+
+    def record(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def phase(self, stage, func, items):
+        """Call func on every item, timing each call and the phase as a whole"""
+        start = time.perf_counter()
+        results = [self.wrap(stage, func)(item) for item in items]
+        self.elapsed[stage] = time.perf_counter() - start
+        return results
+
+    def summary(self, stage, rss):
+        samples = sorted(self.samples.get(stage, []))
+        if not samples:
+            return None
+        elapsed = self.elapsed.get(stage) or sum(samples)
+        return {
+            'count': len(samples),
+            'per_second': round(len(samples) / elapsed, 2) if elapsed else None,
+            'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+            'max_ms': round(samples[-1] * 1000, 3),
+            'peak_rss_mb': rss,
+        }
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of p50/p99 against a baseline run, as readable lines"""
+    regressions = []
+    for section in ('requests', 'stages'):
+        for name, current in results[section].items():
+            previous = (baseline.get(section) or {}).get(name)
+            if not current or not previous:
+                continue
+            for key in ('p50_ms', 'p99_ms'):
+                old, new = previous[key], current[key]
+                if new > old * (1 + tolerance) and new - old > NOISE_FLOOR_MS:
+                    regressions.append(f'{section}.{name}.{key}: {old} -> {new} ms '
+                                       f'(+{(new / old - 1) * 100 if old else float("inf"):.0f}%)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=5, help='check_site calls per site')
+    parser.add_argument('--paragraphs', type=int, default=200)
+    parser.add_argument('--links', type=int, default=200)
+    parser.add_argument('--images', type=int, default=50)
+    parser.add_argument('--mutation-rate', type=float, default=0.2,
+                        help='chance that a site has changed on each fetch')
+    parser.add_argument('--delay', type=float, default=0.0, help='farm response delay in seconds')
+    parser.add_argument('--etags', action='store_true', help='farm sends ETags and 304s')
+    parser.add_argument('--tor-share', type=float, default=0.0,
+                        help='share of sites fetched through the stub SOCKS proxy')
+    parser.add_argument('--tor-delay', type=float, default=0.0, help='stub SOCKS delay in seconds')
+    parser.add_argument('--engine', default=None, help='parser engine (MONITOR_PARSER)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown of p50/p99 before failing')
+    args = parser.parse_args()
+
+    farm = SiteFarm(paragraphs=args.paragraphs, links=args.links, images=args.images,
+                    mutation_rate=args.mutation_rate, delay=args.delay, etags=args.etags,
+                    seed=args.seed).start()
+    tor_sites = round(args.sites * args.tor_share)
+    socks = None
+    if tor_sites:
+        socks = StubSocksServer(delay=args.tor_delay, onion_target=('127.0.0.1', farm.port)).start()
+        os.environ['MONITOR_TOR_PROXY'] = f'socks5h://127.0.0.1:{socks.port}'
+        os.environ.pop('MONITOR_TOR_PROXIES', None)
+    # The app reads its configuration at import time
+    workdir = tempfile.mkdtemp(prefix='monitor-bench-')
+    os.environ['MONITOR_DB'] = os.path.join(workdir, 'monitor.db')
+    os.environ.setdefault('MONITOR_LOG_LEVEL', 'ERROR')
+    # The stub servers are all on loopback: per-host politeness would measure itself
+    os.environ.setdefault('MONITOR_HOST_RATE', '0')
+    os.environ.setdefault('MONITOR_HOST_CONCURRENCY', '0')
+    if args.engine:
+        os.environ['MONITOR_PARSER'] = args.engine
+    import app as monitor
+
+    timer = StageTimer()
+    monitor.WebScraper.fetch_page = timer.wrap('fetch', monitor.WebScraper.fetch_page)
+    monitor.WebScraper.parse_snapshot = timer.wrap('parse', monitor.WebScraper.parse_snapshot)
+    monitor.WebScraper.compare_snapshots = timer.wrap('diff', monitor.WebScraper.compare_snapshots)
+    monitor.store.record_check = timer.wrap('history_write', monitor.store.record_check)
+
+    client = monitor.app.test_client()
+    sites = [(farm.url(i, f'site{i}.onion') if i < tor_sites else farm.url(i), i < tor_sites)
+             for i in range(args.sites)]
+    rss = {}
+
+    def add(site):
+        url, use_tor = site
+        response = client.post('/api/add_site', json={'url': url, 'use_tor': use_tor})
+        assert response.status_code == 200, (url, response.status_code, response.get_data(as_text=True))
+
+    def check(site):
+        response = client.post('/api/check_site', json={'url': site[0]})
+        assert response.status_code == 200, (site[0], response.status_code, response.get_data(as_text=True))
+
+    def history(site):
+        response = client.get('/api/history', query_string={'url': site[0], 'limit': 100})
+        assert response.status_code == 200, (site[0], response.status_code)
+
+    timer.phase('add_site', add, sites)
+    rss['add_site'] = peak_rss_mb()
+    timer.phase('check_site', check, sites * args.rounds)
+    rss['check_site'] = peak_rss_mb()
+    monitor.store.flush()
+    timer.phase('history_read', history, sites)
+    rss['history_read'] = peak_rss_mb()
+
+    results = {
+        'benchmark': 'bench_suite',
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'baseline', 'tolerance')},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'parser': monitor.scrapers.get().parser,
+            'parse_workers': monitor.PARSE_WORKERS,
+        },
+        'requests': {name: timer.summary(name, rss[name]) for name in ('add_site', 'check_site')},
+        'stages': {
+            'fetch': timer.summary('fetch', rss['check_site']),
+            'parse': timer.summary('parse', rss['check_site']),
+            'diff': timer.summary('diff', rss['check_site']),
+            'history_write': timer.summary('history_write', rss['check_site']),
+            'history_read': timer.summary('history_read', rss['history_read']),
+        },
+        'farm': {'requests': farm.requests, 'bytes_sent': farm.bytes_sent},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if socks is not None:
+        results['farm']['tor_connections'] = sum(socks.connections.values())
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != results['config']:
+            print("warning: the baseline was run with a different configuration", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        results['regressions'] = regressions
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        status = 1 if regressions else 0
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    farm.shutdown()
+    if socks is not None:
+        socks.shutdown()
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Onion check throughput through one Tor circuit vs. a TorCircuitPool.
+
+Runs --checks fetches of .onion URLs from --threads threads (like the
+scheduler does) through stub SOCKS proxies from stub_socks.py, which
+carry one request per circuit at a time with --delay latency. Scenarios:
+a single circuit, several SOCKS ports, one port split by SOCKS auth
+isolation, and pools with one slow or one failing circuit that should be
+retired.
+
+    python benchmarks/bench_tor_circuits.py --checks 200 --circuits 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONITOR_DB', ':memory:')
+
+import app as monitor  # noqa: E402
+from bench_batch_fetch import start_stub_server  # noqa: E402
+from stub_socks import StubSocksServer  # noqa: E402
+from tor_circuits import TorCircuitPool  # noqa: E402
+
+
+def run(label, servers, isolation, args):
+    proxies = [f'socks5h://127.0.0.1:{server.port}' for server in servers]
+    pool = TorCircuitPool(proxies, isolation=isolation, max_concurrent=args.threads,
+                          min_samples=3, cooldown=300)
+    scraper = monitor.WebScraper(use_tor=True, tor_circuits=pool, pool_maxsize=args.threads)
+    urls = [f'http://site{i}.onion/' for i in range(args.checks)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        pages = list(executor.map(scraper.fetch_page, urls))
+    elapsed = time.perf_counter() - start
+    scraper.session.close()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+    failed = sum(page is None for page in pages)
+    print(f"{label:<24} {len(urls) / elapsed:7.1f} checks/s  failed {failed:3d}  "
+          f"circuits: " + ' '.join(
+              f"{c['name']}={c['requests']}{'*' * c['rotations']}" for c in pool.stats()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--circuits', type=int, default=4)
+    parser.add_argument('--delay', type=float, default=0.02, help='per-request circuit latency')
+    args = parser.parse_args()
+
+    http = start_stub_server(0)
+    target = ('127.0.0.1', http.server_address[1])
+
+    def stubs(count, delays=None, failure_rates=None):
+        return [StubSocksServer(delay=(delays or {}).get(i, args.delay),
+                                failure_rate=(failure_rates or {}).get(i, 0.0),
+                                circuit_streams=1, onion_target=target, seed=i).start()
+                for i in range(count)]
+
+    n = args.circuits
+    print(f"{args.checks} checks, {args.threads} threads, {args.delay * 1000:.0f} ms per request "
+          f"(circuit=requests served, * per rotation)")
+    run('single circuit', stubs(1), 0, args)
+    run(f'{n} SOCKS ports', stubs(n), 0, args)
+    run(f'1 port, {n} isolated', stubs(1), n, args)
+    run(f'{n} ports, one slow', stubs(n, delays={0: args.delay * 10}), 0, args)
+    run(f'{n} ports, one failing', stubs(n, failure_rates={0: 1.0}), 0, args)
+    http.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Check that every parser engine produces the same snapshot and website info.
+
+The 'html.parser' engine is the reference. Every other available engine
+must produce identical snapshots for the corpus below (plus generated
+pages); any mismatch is printed and the script exits non-zero.
+
+lxml builds its tree by different rules (RCDATA titles, first duplicate
+attribute wins, CDATA and whitespace after the doctype dropped), so the
+documents where that is visible are listed in KNOWN_DIFFERENCES. The
+streaming extractor has no exceptions.
+
+    python benchmarks/parser_conformance.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsers  # noqa: E402
+from app import WebScraper  # noqa: E402
+from bench_parse import generate_page  # noqa: E402
+
+CORPUS = {
+    'empty': '',
+    'text only': 'just some text, no markup & no tags',
+    'basic': '''<!DOCTYPE html>
+<html>
+<head>
+  <title>Marketplace</title>
+  <meta name="description" content="Buy things">
+  <style>body { color: red; }</style>
+  <script>var cart = "<a href='/nope'>";</script>
+</head>
+<body>
+  <h1>Welcome to the shop</h1>
+  <p>Read our <a href="/blog">blog</a> or <a href="/news#top">news</a>.</p>
+  <img src="/logo.png" alt="logo"><img alt="no src">
+  <div class="payment-method">Bitcoin</div>
+  <div class="card payment-method wide">Monero <b>XMR</b><!-- hidden --></div>
+  <table><tr class="transaction"><td>#1</td><td>0.1 BTC</td></tr>
+  <tr class="transaction"><td>#2</td><td>0.2 BTC</td></tr></table>
+</body>
+</html>''',
+    'entities': '<title>A &amp; B</title><p>&nbsp;&copy; &#169; &#x263A; &unknown; &#xZZ; 5 &lt; 6</p>',
+    'no title string': '<title>Two <b>parts</b></title><p>body</p>',
+    'nested title': '<title><span>Inner</span></title>',
+    'missing description content': '<meta name="description"><meta name="description" content="second">',
+    'valueless attributes': '<a href>empty href</a><img src><div class=payment-method>Cash</div>',
+    'duplicate attributes': '<a href="first" href="second">dup</a>',
+    'whitespace': '<div>\n   \n</div><span>   </span><pre>  \n  kept  </pre><textarea>\n\n</textarea>',
+    'void end tags': '<p>one<br>two</br>three<br/>four<img src="x.png"></img></p>',
+    'unclosed': '<div class="payment-method">open <p>para <div class="transaction">deep',
+    'stray end tags': '</div></span><p>text</p></p></body>',
+    'nested extraction': '<div class="payment-method">outer <span class="payment-method">inner</span> tail</div>',
+    'script extraction': '<script class="payment-method">var x = 1;</script>',
+    'cdata and comments': '<p><![CDATA[raw data]]><!-- c --></p><?php echo 1 ?><!DOCTYPE other>',
+    'template and ruby': '<template>tpl text</template><ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>',
+    'uppercase markup': '<HTML><HEAD><TITLE>Caps</TITLE></HEAD><BODY><A HREF="/Up">Up</A><IMG SRC="I.PNG"></BODY></HTML>',
+    'text after html': '<html><body>in</body></html>\ntrailing text',
+}
+
+# (engine, document) -> snapshot fields that are allowed to differ
+KNOWN_DIFFERENCES = {
+    ('lxml', 'basic'): {'text'},
+    ('lxml', 'entities'): {'text'},
+    ('lxml', 'no title string'): {'title', 'text'},
+    ('lxml', 'nested title'): {'title', 'text'},
+    ('lxml', 'duplicate attributes'): {'links'},
+    ('lxml', 'cdata and comments'): {'text'},
+}
+
+
+def corpus():
+    yield from CORPUS.items()
+    for seed in range(5):
+        yield f'generated {seed}', generate_page(200, 50, 200, seed)
+
+
+def main():
+    reference = WebScraper(parser='html.parser')
+    engines = [engine for engine in parsers.available_engines() if engine != 'html.parser']
+    failures = 0
+    for engine in engines:
+        scraper = WebScraper(parser=engine)
+        for name, html in corpus():
+            expected = reference.parse_snapshot(html)
+            actual = scraper.parse_snapshot(html)
+            allowed = KNOWN_DIFFERENCES.get((engine, name), set())
+            differing = {key for key in expected if expected[key] != actual.get(key)}
+            if differing - allowed:
+                failures += 1
+                print(f"[{engine}] {name}: snapshot differs")
+                for key in sorted(differing - allowed):
+                    print(f"    {key}: expected {expected[key]!r}, got {actual.get(key)!r}")
+            elif not allowed and scraper.extract_website_info(html) != reference.extract_website_info(html):
+                failures += 1
+                print(f"[{engine}] {name}: website info differs")
+        print(f"[{engine}] checked {len(CORPUS) + 5} documents")
+    if failures:
+        print(f"{failures} mismatches")
+        sys.exit(1)
+    print("all engines conform")
+
+
+if __name__ == '__main__':
+    main()
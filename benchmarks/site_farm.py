@@ -0,0 +1,157 @@
+"""Local HTTP server serving a farm of synthetic, slowly changing sites.
+
+Every path /site/<n> is one site. Its page has --paragraphs paragraphs,
+--links links and --images images generated from the site number, and on
+each request the site moves to a new version with probability
+--mutation-rate: one paragraph is rewritten and one link replaced, as a
+listing page that gains an item would. With --etags the server sends an
+ETag per version and answers If-None-Match with 304.
+
+    python benchmarks/site_farm.py --port 8000 --mutation-rate 0.2
+"""
+import argparse
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SiteFarm(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connection bursts into SYN retries
+    request_queue_size = 1024
+
+    def __init__(self, address=('127.0.0.1', 0), paragraphs=200, links=200, images=50,
+                 mutation_rate=0.0, delay=0.0, etags=False, seed=0):
+        super().__init__(address, _FarmHandler)
+        self.paragraphs = paragraphs
+        self.links = links
+        self.images = images
+        self.mutation_rate = mutation_rate
+        # Seconds each response is held back
+        self.delay = delay
+        self.etags = etags
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.sites = {}
+        self.requests = 0
+        self.bytes_sent = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def url(self, site, host='127.0.0.1'):
+        return f'http://{host}:{self.port}/site/{site}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def fetch(self, site):
+        """(version, page bytes) for one request to a site, mutating it first with mutation_rate"""
+        with self.lock:
+            state = self.sites.get(site)
+            if state is None:
+                state = self.sites[site] = _SiteState(site, self)
+            self.requests += 1
+            if state.rng.random() < self.mutation_rate:
+                state.mutate()
+            return state.version, state.page()
+
+
+class _SiteState:
+
+    def __init__(self, site, farm):
+        self.rng = random.Random(farm.seed * 1000003 + site)
+        rng = self.rng
+        self.site = site
+        self.version = 0
+        self.title = f'Market {site}'
+        self.paragraphs = [f'Listing {i}: buy product {rng.randrange(10 ** 6)} in our store.'
+                           for i in range(farm.paragraphs)]
+        self.links = [f'/site/{site}/item/{rng.randrange(10 ** 6)}' for _ in range(farm.links)]
+        self.images = [f'/site/{site}/img/{rng.randrange(10 ** 6)}.png' for _ in range(farm.images)]
+        self._page = None
+
+    def mutate(self):
+        self.version += 1
+        if self.paragraphs:
+            index = self.rng.randrange(len(self.paragraphs))
+            self.paragraphs[index] = f'Updated listing {self.version}: product {self.rng.randrange(10 ** 6)}.'
+        if self.links:
+            self.links[self.rng.randrange(len(self.links))] = \
+                f'/site/{self.site}/item/{self.rng.randrange(10 ** 6)}'
+        self._page = None
+
+    def page(self):
+        if self._page is None:
+            parts = [f'<html><head><title>{self.title}</title>',
+                     '<meta name="description" content="Synthetic farm page"></head><body>']
+            parts.extend(f'<p>{text}</p>' for text in self.paragraphs)
+            parts.extend(f'<a href="{link}">item</a>' for link in self.links)
+            parts.extend(f'<img src="{image}">' for image in self.images)
+            parts.append('<div class="payment-method">Bitcoin</div></body></html>')
+            self._page = ''.join(parts).encode()
+        return self._page
+
+
+class _FarmHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; with Nagle the body
+        # waits for the client's delayed ACK (~40 ms per request)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        parts = self.path.split('/')
+        if len(parts) < 3 or parts[1] != 'site' or not parts[2].isdigit():
+            self.send_error(404)
+            return
+        farm = self.server
+        version, page = farm.fetch(int(parts[2]))
+        if farm.delay:
+            time.sleep(farm.delay)
+        etag = f'"{parts[2]}-{version}"'
+        if farm.etags and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(page)))
+        if farm.etags:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(page)
+        with farm.lock:
+            farm.bytes_sent += len(page)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--paragraphs', type=int, default=200)
+    parser.add_argument('--links', type=int, default=200)
+    parser.add_argument('--images', type=int, default=50)
+    parser.add_argument('--mutation-rate', type=float, default=0.0)
+    parser.add_argument('--delay', type=float, default=0.0)
+    parser.add_argument('--etags', action='store_true')
+    args = parser.parse_args()
+
+    farm = SiteFarm(('127.0.0.1', args.port), args.paragraphs, args.links, args.images,
+                    args.mutation_rate, args.delay, args.etags)
+    print(f"Site farm on {farm.url(0)} (any site number)")
+    farm.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
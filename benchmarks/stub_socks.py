@@ -0,0 +1,189 @@
+"""Minimal SOCKS5 proxy standing in for Tor in benchmarks and local testing.
+
+Supports CONNECT with IPv4 or domain addresses (socks5h), no-auth and
+username/password auth. Every distinct (port, username) pair acts as one
+"circuit": it gets its own latency, failure rate and a cap on requests in
+transit at once, like a real Tor circuit's limited bandwidth. Hostnames ending in
+.onion are connected to onion_target instead of being resolved.
+
+    python benchmarks/stub_socks.py --ports 9050 9051 --onion-target 127.0.0.1:8000
+"""
+import argparse
+import random
+import select
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+
+class StubSocksServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, address=('127.0.0.1', 0), delay=0.0, failure_rate=0.0,
+                 circuit_streams=None, onion_target=None, seed=None):
+        super().__init__(address, _SocksHandler)
+        # Seconds each request is held back, or a function of the circuit key
+        self.delay = delay
+        # Share of CONNECTs refused with "general failure"
+        self.failure_rate = failure_rate
+        # Requests a circuit carries at once; None for unlimited
+        self.circuit_streams = circuit_streams
+        self.onion_target = onion_target
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.circuits = {}
+        self.connections = {}
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def circuit_slot(self, key):
+        with self.lock:
+            self.connections[key] = self.connections.get(key, 0) + 1
+            if self.circuit_streams is None:
+                return None
+            if key not in self.circuits:
+                self.circuits[key] = threading.Semaphore(self.circuit_streams)
+            return self.circuits[key]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _SocksHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        sock = self.request
+        try:
+            username = self.negotiate(sock)
+            if username is False:
+                return
+            target = self.read_request(sock)
+            if target is None:
+                return
+            self.connect_and_relay(sock, (self.server.port, username), target)
+        except (OSError, ValueError):
+            pass
+
+    def negotiate(self, sock):
+        version, count = _recv_exact(sock, 2)
+        methods = _recv_exact(sock, count)
+        if version != 5:
+            return False
+        if 2 in methods:
+            sock.sendall(b'\x05\x02')
+            _, length = _recv_exact(sock, 2)
+            username = _recv_exact(sock, length).decode('utf-8', 'replace')
+            (length,) = _recv_exact(sock, 1)
+            _recv_exact(sock, length)
+            sock.sendall(b'\x01\x00')
+            return username
+        if 0 in methods:
+            sock.sendall(b'\x05\x00')
+            return None
+        sock.sendall(b'\x05\xff')
+        return False
+
+    def read_request(self, sock):
+        _, command, _, address_type = _recv_exact(sock, 4)
+        if address_type == 1:
+            host = socket.inet_ntoa(_recv_exact(sock, 4))
+        elif address_type == 3:
+            (length,) = _recv_exact(sock, 1)
+            host = _recv_exact(sock, length).decode('idna')
+        elif address_type == 4:
+            host = socket.inet_ntop(socket.AF_INET6, _recv_exact(sock, 16))
+        else:
+            self.reply(sock, 8)
+            return None
+        (port,) = struct.unpack('!H', _recv_exact(sock, 2))
+        if command != 1:
+            self.reply(sock, 7)
+            return None
+        if host.endswith('.onion') and self.server.onion_target:
+            return self.server.onion_target
+        return host, port
+
+    def connect_and_relay(self, sock, key, target):
+        server = self.server
+        delay = server.delay(key) if callable(server.delay) else server.delay
+        with server.lock:
+            fail = server.random.random() < server.failure_rate
+        if fail:
+            self.reply(sock, 1)
+            return
+        try:
+            upstream = socket.create_connection(target, timeout=10)
+        except OSError:
+            self.reply(sock, 5)
+            return
+        with upstream:
+            # Relayed requests are small writes; do not hold them back for ACKs
+            for end in (sock, upstream):
+                end.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.reply(sock, 0)
+            _relay(sock, upstream, delay, server.circuit_slot(key))
+
+    def reply(self, sock, code):
+        sock.sendall(b'\x05' + bytes([code]) + b'\x00\x01' + b'\x00' * 6)
+
+
+def _recv_exact(sock, length):
+    data = b''
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ValueError('connection closed')
+        data += chunk
+    return data
+
+
+def _relay(a, b, delay, slot):
+    """Copy data both ways; data from the client (requests) is held back by
+    delay, during which it occupies one of its circuit's stream slots"""
+    sockets = [a, b]
+    while True:
+        readable, _, _ = select.select(sockets, [], [], 30)
+        if not readable:
+            return
+        for source in readable:
+            data = source.recv(65536)
+            if not data:
+                return
+            if source is a:
+                if slot is not None:
+                    with slot:
+                        time.sleep(delay)
+                elif delay:
+                    time.sleep(delay)
+            (b if source is a else a).sendall(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ports', type=int, nargs='+', default=[9050])
+    parser.add_argument('--delay', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--circuit-streams', type=int, default=None)
+    parser.add_argument('--onion-target', default=None, help='host:port that .onion hosts connect to')
+    args = parser.parse_args()
+
+    onion_target = None
+    if args.onion_target:
+        host, _, port = args.onion_target.rpartition(':')
+        onion_target = (host, int(port))
+    for port in args.ports:
+        StubSocksServer(('127.0.0.1', port), args.delay, args.failure_rate,
+                        args.circuit_streams, onion_target).start()
+        print(f"SOCKS5 stub listening on 127.0.0.1:{port}")
+    threading.Event().wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from storage import Transaction
+
+BULK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bulk_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created TEXT NOT NULL,
+    finished TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    registered INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    fetched INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS bulk_job_errors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    line INTEGER,
+    url TEXT,
+    stage TEXT NOT NULL,
+    error TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bulk_job_errors_job_id ON bulk_job_errors (job_id, id);
+"""
+
+# Counters a job accumulates as it goes
+JOB_COUNTERS = ('total', 'registered', 'rejected', 'fetched', 'failed')
+
+# CSV columns that are not strings, with their conversion
+_TRUE = ('1', 'true', 'yes', 'y', 'on')
+CSV_CONVERSIONS = {
+    'use_tor': lambda value: value.strip().lower() in _TRUE,
+    'fingerprint': lambda value: value.strip().lower() in _TRUE,
+    'check_interval': float,
+    'min_recheck': float,
+    'max_bytes': int,
+    'simhash_threshold': int,
+    'ignore_patterns': json.loads,
+}
+
+
+class BulkJobStore:
+    """Progress and per-URL errors of bulk imports, kept in SQLite
+
+    A job moves from 'registering' (the upload is being read) to
+    'fetching' (initial fetches running in the background) to 'done', or
+    'failed' / 'interrupted' if it could not finish.
+    """
+
+    def __init__(self, path='monitor.db'):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(BULK_SCHEMA)
+
+    def create(self):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute('INSERT INTO bulk_jobs (id, status, created) VALUES (?, ?, ?)',
+                               (job_id, 'registering', datetime.now().isoformat()))
+        return job_id
+
+    def update(self, job_id, status=None, error=None, errors=(), **increments):
+        """Add to the job's counters, record (line, url, stage, error) tuples
+        and optionally move it to a new status"""
+        assignments = [f'{name} = {name} + ?' for name in increments if name in JOB_COUNTERS]
+        params = [increments[name] for name in increments if name in JOB_COUNTERS]
+        if status is not None:
+            assignments.append('status = ?')
+            params.append(status)
+            if status in ('done', 'failed'):
+                assignments.append('finished = ?')
+                params.append(datetime.now().isoformat())
+        if error is not None:
+            assignments.append('error = ?')
+            params.append(error)
+        with self._lock, Transaction(self._conn):
+            if assignments:
+                self._conn.execute(f'UPDATE bulk_jobs SET {", ".join(assignments)} WHERE id = ?',
+                                   (*params, job_id))
+            self._conn.executemany(
+                'INSERT INTO bulk_job_errors (job_id, line, url, stage, error) VALUES (?, ?, ?, ?, ?)',
+                [(job_id, *entry) for entry in errors])
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM bulk_jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list(self, limit=50):
+        with self._lock:
+            rows = self._conn.execute('SELECT * FROM bulk_jobs ORDER BY created DESC LIMIT ?',
+                                      (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def errors(self, job_id, cursor=None, limit=100):
+        """Up to limit errors after cursor; returns (errors, next cursor or None)"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, line, url, stage, error FROM bulk_job_errors '
+                'WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?',
+                (job_id, cursor or 0, limit + 1)).fetchall()
+        errors = [dict(row) for row in rows[:limit]]
+        return errors, errors[-1]['id'] if len(rows) > limit else None
+
+    def interrupt_running(self):
+        """Mark jobs left unfinished by a previous process"""
+        with self._lock:
+            self._conn.execute("UPDATE bulk_jobs SET status = 'interrupted' "
+                               "WHERE status IN ('registering', 'fetching')")
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) from a CSV (with a header) or JSONL byte
+    stream as it arrives; a row that cannot be read is yielded as an error string"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None or 'url' not in reader.fieldnames:
+            yield 1, "CSV needs a header row with a 'url' column"
+            return
+        for row in reader:
+            line = reader.line_num
+            try:
+                yield line, {name: CSV_CONVERSIONS[name](value) if name in CSV_CONVERSIONS else value
+                             for name, value in row.items() if name and value not in (None, '')}
+            except ValueError as e:
+                yield line, f'Bad value: {e}'
+        return
+    for line, raw in enumerate(text, 1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as e:
+            yield line, f'Invalid JSON: {e}'
+            continue
+        yield line, row if isinstance(row, dict) else 'Each line must be a JSON object'
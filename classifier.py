@@ -0,0 +1,108 @@
+import json
+import re
+
+# Keyword weights per website type. Order matters only to break score ties,
+# and follows the precedence the original first-match rules used.
+DEFAULT_CATEGORIES = {
+    'E-commerce': {'shop': 1.0, 'cart': 2.0, 'buy': 1.0, 'product': 1.0, 'store': 0.5},
+    'Blog': {'blog': 2.0, 'post': 0.5, 'article': 1.0, 'comment': 1.0},
+    'News': {'news': 1.0, 'headline': 2.0, 'breaking': 2.0, 'article': 1.0},
+    'Social Media': {'login': 0.5, 'signup': 2.0, 'profile': 1.0, 'share': 0.5},
+    'Payment Gateway': {'payment': 1.0, 'checkout': 2.0, 'credit card': 2.0, 'paypal': 2.0},
+}
+
+
+def load_categories(path):
+    """Read categories from a JSON file: {type: [keywords]} or {type: {keyword: weight}}"""
+    with open(path, encoding='utf-8') as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise ValueError(f"{path}: expected an object mapping website types to keywords")
+    categories = {}
+    for category, keywords in raw.items():
+        if isinstance(keywords, list):
+            keywords = {keyword: 1.0 for keyword in keywords}
+        if not isinstance(keywords, dict):
+            raise ValueError(f"{path}: keywords for {category!r} must be a list or an object")
+        categories[category] = {str(keyword).lower(): float(weight) for keyword, weight in keywords.items()}
+    return categories
+
+
+def trie_pattern(keywords):
+    """Regex matching any keyword, factored into a trie so each position is tried once per prefix
+
+    A flat alternation makes the regex engine try every keyword at every
+    position; the trie form only follows branches that match the text so
+    far, and its greedy optional groups still prefer the longest keyword.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        group = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # A keyword ends here: the longer continuations are optional
+            return ('(?:' + group + ')?') if len(branches) == 1 else group + '?'
+        return group
+
+    return emit(trie)
+
+
+class KeywordClassifier:
+    """Score every website type in one pass over the text
+
+    All keywords are compiled into a single trie-shaped regex, so the text
+    is scanned once no matter how many keywords there are. Keywords that
+    are substrings of a longer matched keyword are credited too, giving the
+    same counts as separate substring searches except for partial overlaps
+    between two different keywords.
+    """
+
+    def __init__(self, categories=None):
+        self.categories = categories if categories is not None else DEFAULT_CATEGORIES
+        self.order = list(self.categories)
+
+        # keyword -> [(category, weight)]
+        self.weights = {}
+        for category, keywords in self.categories.items():
+            for keyword, weight in keywords.items():
+                self.weights.setdefault(keyword.lower(), []).append((category, weight))
+
+        keywords = sorted(self.weights)
+        self.pattern = re.compile(trie_pattern(keywords)) if keywords else None
+        # keyword -> {shorter keyword: occurrences inside it}
+        self.contained = {
+            keyword: {other: keyword.count(other) for other in keywords
+                      if other != keyword and other in keyword}
+            for keyword in keywords
+        }
+
+    def count_keywords(self, text):
+        """Occurrences of every keyword in the (lowercased) text"""
+        counts = {}
+        if self.pattern is None:
+            return counts
+        for keyword in self.pattern.findall(text.lower()):
+            counts[keyword] = counts.get(keyword, 0) + 1
+        for keyword, count in list(counts.items()):
+            for other, inside in self.contained[keyword].items():
+                counts[other] = counts.get(other, 0) + count * inside
+        return counts
+
+    def classify(self, text):
+        """Return (label, scores): the best scoring type ('Unknown' if none) and all scores"""
+        scores = {category: 0.0 for category in self.order}
+        for keyword, count in self.count_keywords(text).items():
+            for category, weight in self.weights[keyword]:
+                scores[category] += count * weight
+        best = max(self.order, key=lambda category: scores[category], default=None)
+        if best is None or scores[best] <= 0:
+            return 'Unknown', scores
+        return best, scores
@@ -0,0 +1,122 @@
+import codecs
+import hashlib
+import re
+
+# Content types worth parsing; anything else is rejected before the body is read
+HTML_CONTENT_TYPES = frozenset([
+    'text/html', 'application/xhtml+xml', 'text/plain', 'text/xml', 'application/xml',
+])
+
+# Bytes examined for a BOM or <meta charset> before decoding starts
+SNIFF_BYTES = 4096
+
+CHUNK_SIZE = 65536
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_:.-]+)', re.I)
+
+
+def parse_content_type(header):
+    """Split a Content-Type header into (mime type, {parameter: value})"""
+    if not header:
+        return None, {}
+    mime, *params = header.split(';')
+    parsed = {}
+    for param in params:
+        key, _, value = param.partition('=')
+        parsed[key.strip().lower()] = value.strip().strip('"\'')
+    return mime.strip().lower(), parsed
+
+
+def content_type_allowed(header):
+    """Whether a response with this Content-Type should be downloaded (missing counts as HTML)"""
+    mime, _ = parse_content_type(header)
+    return mime is None or mime in HTML_CONTENT_TYPES
+
+
+def default_encoding(header):
+    """Encoding to assume when nothing is declared: ISO-8859-1 for text/* as in
+    HTTP/1.1 (and requests), UTF-8 otherwise"""
+    mime, _ = parse_content_type(header)
+    return 'ISO-8859-1' if mime is not None and mime.startswith('text/') else 'utf-8'
+
+
+def known_encoding(name):
+    """Canonical codec name, or None if Python does not know the encoding"""
+    try:
+        return codecs.lookup(name).name if name else None
+    except LookupError:
+        return None
+
+
+def bom_encoding(head):
+    """Encoding given by a byte order mark at the start of a body, or None"""
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    return None
+
+
+def meta_encoding(head):
+    """Encoding declared by a <meta charset> near the start of a page, or None"""
+    match = _META_CHARSET.search(head[:SNIFF_BYTES])
+    return known_encoding(match.group(1).decode('ascii')) if match else None
+
+
+class BodyReader:
+    """Consume a response body chunk by chunk within a byte cap
+
+    The body is hashed and decoded as it arrives, so the raw bytes are
+    never held in full. The encoding comes from a BOM, then the
+    Content-Type charset, then a <meta charset> in the first SNIFF_BYTES,
+    then default_encoding. Bytes beyond max_bytes are dropped and the
+    result is flagged as truncated.
+    """
+
+    def __init__(self, max_bytes, content_type=None, default_encoding=None):
+        self.max_bytes = max_bytes
+        self.header_encoding = known_encoding(parse_content_type(content_type)[1].get('charset'))
+        self.default_encoding = known_encoding(default_encoding) or 'utf-8'
+        self.encoding = None
+        self.size = 0
+        self.truncated = False
+        self._hash = hashlib.sha256()
+        self._head = b''
+        self._decoder = None
+        self._parts = []
+
+    def feed(self, chunk):
+        """Add a chunk; returns False once the cap is reached and reading should stop"""
+        room = self.max_bytes - self.size
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            self.truncated = True
+        self.size += len(chunk)
+        self._hash.update(chunk)
+        if self._decoder is None:
+            self._head += chunk
+            if len(self._head) >= SNIFF_BYTES or self.truncated:
+                self._start_decoding()
+        else:
+            self._parts.append(self._decoder.decode(chunk))
+        return not self.truncated
+
+    def finish(self):
+        """The decoded text, sha256 of the bytes read, byte count and truncation flag"""
+        if self._decoder is None:
+            self._start_decoding()
+        self._parts.append(self._decoder.decode(b'', final=True))
+        return {
+            'content': ''.join(self._parts),
+            'content_hash': self._hash.hexdigest(),
+            'size': self.size,
+            'truncated': self.truncated,
+            'encoding': self.encoding,
+        }
+
+    def _start_decoding(self):
+        self.encoding = bom_encoding(self._head) or self.header_encoding \
+            or meta_encoding(self._head) or self.default_encoding
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        self._parts.append(self._decoder.decode(self._head))
+        self._head = b''
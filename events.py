@@ -0,0 +1,105 @@
+import collections
+import json
+import queue
+import threading
+
+
+class EventBroker:
+    """Fan site events out to Server-Sent Events subscribers
+
+    publish() serializes an event once and hands it to every subscriber's
+    queue without blocking. Each event gets an increasing id, and the last
+    `history` events are kept so a client reconnecting with Last-Event-ID
+    is sent what it missed. A subscriber that falls queue_size events
+    behind, or asks to resume from an event no longer kept, gets a single
+    'resync' event instead of the backlog, telling it to reload everything.
+    """
+
+    def __init__(self, history=1000, queue_size=1000, heartbeat=15.0, max_subscribers=100):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self.resyncs = 0
+        self._lock = threading.Lock()
+        self._history = collections.deque(maxlen=history)
+        self._subscribers = set()
+        self._last_id = 0
+
+    def publish(self, event, data):
+        """Send an event to every subscriber"""
+        with self._lock:
+            self._last_id += 1
+            message = _format(event, data, self._last_id)
+            self._history.append((self._last_id, message))
+            self.published += 1
+            for subscriber in self._subscribers:
+                self._put(subscriber, message)
+
+    def subscribe(self, last_id=None):
+        """A queue of SSE messages, starting after last_id if given; None when full"""
+        subscriber = queue.Queue(self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            if last_id is not None:
+                oldest = self._history[0][0] if self._history else self._last_id + 1
+                if last_id > self._last_id or last_id + 1 < oldest:
+                    # Resuming across a restart or a gap bigger than the history
+                    self._put(subscriber, None)
+                else:
+                    for event_id, message in self._history:
+                        if event_id > last_id:
+                            self._put(subscriber, message)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber):
+        """SSE text for a subscriber, with comment heartbeats while idle; unsubscribes when closed"""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    yield subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'last_id': self._last_id,
+                'resyncs': self.resyncs,
+            }
+
+    def _put(self, subscriber, message):
+        if message is not None:
+            try:
+                subscriber.put_nowait(message)
+                return
+            except queue.Full:
+                pass
+        # Too far behind (or nothing to resume from): drop the backlog and
+        # ask the client to reload
+        self.resyncs += 1
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(_format('resync', {}, self._last_id))
+
+
+def _format(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,130 @@
+import hashlib
+import re
+import struct
+from functools import lru_cache
+from operator import xor
+
+# Words per shingle fed into the SimHash
+SHINGLE_SIZE = 3
+# Pages whose SimHashes differ in at most this many of the 64 bits are
+# treated as unchanged (rotating tokens, timestamps, counters). Small real
+# edits to a large page can fall under it too; None matches exact bodies only
+DEFAULT_THRESHOLD = 3
+
+# Markup is dropped without parsing: script/style bodies, comments, then any tag
+_MARKUP = re.compile(r'<(script|style)\b.*?</\1\s*>|<!--.*?-->|<[^>]*>', re.S | re.I)
+_WORD = re.compile(r'\w+')
+# Bytes with the given bit clear; deleting them with bytes.translate leaves
+# one byte per set bit
+_BIT_CLEAR = [bytes(byte for byte in range(256) if not byte >> bit & 1) for bit in range(8)]
+
+
+@lru_cache(maxsize=256)
+def compile_patterns(patterns):
+    """Compile a tuple of ignore patterns into one regex (None if empty)"""
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+
+def validate_patterns(patterns):
+    """Return an error message for an invalid ignore pattern list, or None"""
+    if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+        return 'ignore_patterns must be a list of regular expressions'
+    for pattern in patterns:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            return f'Invalid ignore pattern {pattern!r}: {e}'
+    return None
+
+
+def _rotate(value, bits):
+    return ((value << bits) | (value >> (64 - bits))) & 0xFFFFFFFFFFFFFFFF
+
+
+def simhash(words):
+    """64-bit SimHash of the word shingles of a token list"""
+    if not words:
+        return 0
+    # Each distinct word is hashed once; a shingle hash xors the hashes of
+    # its words rotated by their position, so the per-shingle work is all
+    # C-level map/xor/pack calls rather than one hash object per shingle
+    word_hashes = {}
+    for word in set(words):
+        word_hashes[word] = int.from_bytes(
+            hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'big')
+    # Short texts still get one shingle of all their words
+    count = max(len(words) - SHINGLE_SIZE + 1, 1)
+    shingles = list(map(word_hashes.__getitem__, words[:count]))
+    for position in range(1, min(SHINGLE_SIZE, len(words))):
+        rotated = {word: _rotate(value, position) for word, value in word_hashes.items()}
+        shingles = list(map(xor, shingles, map(rotated.__getitem__, words[position:])))
+    # Distinct shingles only, so repeated boilerplate does not outvote the rest
+    shingles = set(shingles)
+    digests = struct.pack(f'>{len(shingles)}Q', *shingles)
+
+    value = 0
+    for column in range(8):
+        # Every 8th byte is one byte of each shingle hash, most significant first
+        column_bytes = digests[column::8]
+        for bit in range(8):
+            ones = len(column_bytes.translate(None, _BIT_CLEAR[bit]))
+            if ones * 2 > len(shingles):
+                value |= 1 << ((7 - column) * 8 + bit)
+    return value
+
+
+def text_simhash(content):
+    """SimHash of the page text with markup stripped by regex, as 16 hex digits"""
+    words = _WORD.findall(_MARKUP.sub(' ', content).lower())
+    return f'{simhash(words):016x}'
+
+
+def body_hash(content):
+    return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def strip_ignored(content, ignore_patterns=()):
+    """Remove everything matched by the ignore patterns"""
+    ignore = compile_patterns(tuple(ignore_patterns))
+    return ignore.sub('', content) if ignore is not None else content
+
+
+def fingerprint(content, ignore_patterns=()):
+    """Cheap fingerprints of a raw page, computed without parsing it
+
+    body_hash is a sha256 of the body after removing everything matched by
+    the ignore patterns; simhash is a 64-bit SimHash over word shingles of
+    what is left.
+    """
+    content = strip_ignored(content, ignore_patterns)
+    return {'body_hash': body_hash(content), 'simhash': text_simhash(content)}
+
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD):
+    """Compare two fingerprints: 'identical', 'near_duplicate' or 'changed', with the bit distance"""
+    if not old or not new:
+        return {'match': 'changed', 'distance': None}
+    if old['body_hash'] == new['body_hash']:
+        return {'match': 'identical', 'distance': 0}
+    distance = bin(int(old['simhash'], 16) ^ int(new['simhash'], 16)).count('1')
+    return {
+        'match': 'near_duplicate' if threshold is not None and distance <= threshold else 'changed',
+        'distance': distance,
+    }
+
+
+def compare_page(old, content, ignore_patterns=(), threshold=DEFAULT_THRESHOLD):
+    """Fingerprint a page against the previous fingerprint; returns (fingerprint, comparison)
+
+    The SimHash is only computed when the body hash differs, so a
+    byte-identical page costs one regex pass and one sha256.
+    """
+    content = strip_ignored(content, ignore_patterns)
+    new = {'body_hash': body_hash(content)}
+    if old and old['body_hash'] == new['body_hash']:
+        new['simhash'] = old['simhash']
+    else:
+        new['simhash'] = text_simhash(content)
+    return new, compare(old, new, threshold)
@@ -0,0 +1,230 @@
+import sqlite3
+import threading
+import time
+import uuid
+
+from storage import Transaction
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    url TEXT PRIMARY KEY,
+    interval REAL NOT NULL,
+    run_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_id TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_run_at ON jobs (run_at);
+CREATE INDEX IF NOT EXISTS jobs_lease_expires ON jobs (lease_expires);
+"""
+
+
+class Job:
+    """One leased check: valid until `expires` unless extended"""
+
+    def __init__(self, url, interval, attempts, lease_id, expires):
+        self.url = url
+        self.interval = interval
+        self.attempts = attempts
+        self.lease_id = lease_id
+        self.expires = expires
+
+    def __repr__(self):
+        return f'Job({self.url!r}, attempt {self.attempts})'
+
+
+class JobQueue:
+    """Recurring site checks handed out to workers under leases
+
+    Every monitored site has one job that comes due every `interval`
+    seconds. lease() hands due jobs to a worker for `visibility` seconds;
+    the worker extends the lease while it works and then completes or
+    fails the job. A job whose lease runs out (its worker crashed or hung)
+    is due again and is handed to the next worker that asks. Every lease
+    counts as an attempt: a failed job is retried with exponential backoff
+    up to max_attempts, then waits for its next regular check.
+
+    Completing, failing or extending takes the lease id, so a worker whose
+    lease has been reclaimed cannot overwrite the new holder's state.
+    This class defines the interface; SQLiteJobQueue is the default
+    backend and others can be added with register_backend().
+    """
+
+    def enqueue(self, url, interval, run_at=None, reschedule=False):
+        """Add a site's job (due at run_at, default now); an existing job is
+        kept unless reschedule is set. Returns whether anything changed."""
+        raise NotImplementedError
+
+    def remove(self, url):
+        raise NotImplementedError
+
+    def lease(self, owner, limit=1, visibility=300):
+        """Take up to limit due jobs for `visibility` seconds; returns Jobs"""
+        raise NotImplementedError
+
+    def extend(self, job, visibility=300):
+        """Push a lease's expiry out; returns False if the lease was lost"""
+        raise NotImplementedError
+
+    def complete(self, job, interval=None, delay=None):
+        """Finish a check and schedule the next one interval (or the job's
+        interval) from now, or delay seconds from now if given"""
+        raise NotImplementedError
+
+    def fail(self, job, error):
+        """Give a failed check back for a retry with backoff"""
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteJobQueue(JobQueue):
+    """JobQueue in a SQLite table, shared by every process that opens the file
+
+    Leasing runs in a BEGIN IMMEDIATE transaction, so two workers never
+    take the same job. WAL mode lets the control plane read while workers
+    write; all workers must share the file, i.e. run on one machine or
+    use a backend for a networked database instead.
+    """
+
+    def __init__(self, path='monitor.db', max_attempts=3, retry_delay=30.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        # First retry delay in seconds, doubled for each further attempt
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(JOBS_SCHEMA)
+
+    def enqueue(self, url, interval, run_at=None, reschedule=False):
+        run_at = time.time() if run_at is None else run_at
+        with self._lock:
+            if reschedule:
+                # A leased job keeps its lease (and is rescheduled again when completed)
+                cursor = self._conn.execute(
+                    'INSERT INTO jobs (url, interval, run_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT (url) DO UPDATE SET interval = excluded.interval, '
+                    'run_at = excluded.run_at', (url, interval, run_at))
+            else:
+                cursor = self._conn.execute(
+                    'INSERT OR IGNORE INTO jobs (url, interval, run_at) VALUES (?, ?, ?)',
+                    (url, interval, run_at))
+        return cursor.rowcount > 0
+
+    def remove(self, url):
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM jobs WHERE url = ?', (url,))
+        return cursor.rowcount > 0
+
+    def lease(self, owner, limit=1, visibility=300):
+        now = time.time()
+        expires = now + visibility
+        with self._lock, Transaction(self._conn):
+            rows = self._conn.execute(
+                'SELECT url, interval, attempts, lease_expires FROM jobs '
+                'WHERE run_at <= ? AND (lease_expires IS NULL OR lease_expires <= ?) '
+                'ORDER BY run_at LIMIT ?', (now, now, limit)).fetchall()
+            jobs = []
+            for row in rows:
+                if row['lease_expires'] is not None and row['attempts'] >= self.max_attempts:
+                    # Its workers keep dying or hanging on it: back to the regular schedule
+                    self._conn.execute(
+                        'UPDATE jobs SET run_at = ?, attempts = 0, last_error = ?, lease_id = NULL, '
+                        'lease_owner = NULL, lease_expires = NULL WHERE url = ?',
+                        (now + row['interval'], 'lease expired', row['url']))
+                    continue
+                lease_id = uuid.uuid4().hex
+                self._conn.execute(
+                    'UPDATE jobs SET lease_id = ?, lease_owner = ?, lease_expires = ?, '
+                    'attempts = attempts + 1 WHERE url = ?', (lease_id, owner, expires, row['url']))
+                jobs.append(Job(row['url'], row['interval'], row['attempts'] + 1, lease_id, expires))
+        return jobs
+
+    def extend(self, job, visibility=300):
+        expires = time.time() + visibility
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET lease_expires = ? WHERE url = ? AND lease_id = ?',
+                (expires, job.url, job.lease_id))
+        if cursor.rowcount:
+            job.expires = expires
+        return cursor.rowcount > 0
+
+    def complete(self, job, interval=None, delay=None):
+        interval = interval or job.interval
+        delay = interval if delay is None else delay
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET interval = ?, run_at = ?, attempts = 0, '
+                'lease_id = NULL, lease_owner = NULL, lease_expires = NULL, last_error = NULL '
+                'WHERE url = ? AND lease_id = ?',
+                (interval, time.time() + delay, job.url, job.lease_id))
+        return cursor.rowcount > 0
+
+    def fail(self, job, error):
+        now = time.time()
+        if job.attempts < self.max_attempts:
+            run_at, attempts = now + self.retry_delay * 2 ** (job.attempts - 1), job.attempts
+        else:
+            # Out of retries: wait for the next regular check
+            run_at, attempts = now + job.interval, 0
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET run_at = ?, attempts = ?, last_error = ?, lease_id = NULL, '
+                'lease_owner = NULL, lease_expires = NULL WHERE url = ? AND lease_id = ?',
+                (run_at, attempts, str(error), job.url, job.lease_id))
+        return cursor.rowcount > 0
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT COUNT(*) AS jobs, '
+                'COALESCE(SUM(lease_expires > ?), 0) AS leased, '
+                'COALESCE(SUM(lease_expires <= ?), 0) AS expired, '
+                'COALESCE(SUM(run_at <= ? AND lease_expires IS NULL), 0) AS due, '
+                'COALESCE(SUM(attempts > 0 AND lease_expires IS NULL), 0) AS retrying '
+                'FROM jobs', (now, now, now)).fetchone()
+            owners = self._conn.execute(
+                'SELECT lease_owner, COUNT(*) FROM jobs WHERE lease_expires > ? '
+                'GROUP BY lease_owner', (now,)).fetchall()
+        stats = dict(row)
+        stats['workers'] = {owner: count for owner, count in owners}
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Queue backends by URL scheme: factory(location, **options) -> JobQueue
+BACKENDS = {'sqlite': SQLiteJobQueue}
+
+
+def register_backend(scheme, factory):
+    BACKENDS[scheme] = factory
+
+
+def open_queue(spec, **options):
+    """Open a queue from 'scheme://location' (e.g. sqlite:///var/monitor.db);
+    a bare path is a SQLite database"""
+    scheme, separator, location = spec.partition('://')
+    if not separator:
+        scheme, location = 'sqlite', spec
+    elif scheme == 'sqlite' and location.startswith('/') and not location.startswith('//'):
+        # sqlite:///relative.db -> relative.db, sqlite:////abs.db -> /abs.db
+        location = location[1:]
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unknown job queue backend {scheme!r} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[scheme](location, **options)
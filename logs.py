@@ -0,0 +1,49 @@
+import json
+import logging
+import sys
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _extra_fields(record):
+    # Libraries' private markers (urllib3 adds one to retry warnings) are skipped
+    return {key: value for key, value in vars(record).items()
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith('_')}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra` fields as keys"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The usual one-line format, followed by any `extra` fields as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = ' '.join(f'{key}={value}' for key, value in _extra_fields(record).items())
+        return f'{line} [{fields}]' if fields else line
+
+
+def configure_logging(level='INFO', fmt='text'):
+    """Send log records to stderr at `level`, as text or JSON lines"""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
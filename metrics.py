@@ -0,0 +1,206 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; fetches over Tor routinely take several seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} takes labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def remove(self, **labels):
+        """Drop one labelled series (e.g. the series of a site that is no longer monitored)"""
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def samples(self):
+        """(suffix, label pairs, value) for every series"""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield '', tuple(zip(self.labelnames, key)), value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; with `function` it is read when rendered
+
+    function() returns a number, or a {label values tuple: number} dict
+    for labelled gauges.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function is None:
+            yield from super().samples()
+            return
+        value = self.function()
+        if not isinstance(value, dict):
+            value = {(): value}
+        for key, number in value.items():
+            yield '', tuple(zip(self.labelnames, key)), number
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (the last is +Inf), then sum
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of a block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield '_bucket', labels + (('le', _format_value(bound)),), cumulative
+            yield '_sum', labels, total
+            yield '_count', labels, cumulative
+
+
+class Registry:
+    """A set of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {_escape(metric.documentation, help_text=True)}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, labels, value in metric.samples():
+                label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+                lines.append(f'{metric.name}{suffix}{{{label_text}}} {_format_value(value)}'
+                             if label_text else f'{metric.name}{suffix} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(text, help_text=False):
+    text = str(text).replace('\\', '\\\\').replace('\n', '\\n')
+    return text if help_text else text.replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(int(value))
+
+
+# The monitor's own metrics, shared by the synchronous and async fetch paths
+
+REGISTRY = Registry()
+
+FETCH_SECONDS = REGISTRY.histogram(
+    'monitor_fetch_seconds', 'Time to fetch a page, including its body', ('route',))
+FETCHES = REGISTRY.counter(
+    'monitor_fetches_total', 'Page fetches by route and result', ('route', 'result'))
+FETCH_BYTES = REGISTRY.counter(
+    'monitor_fetch_bytes_total', 'Body bytes downloaded', ('route',))
+PARSE_SECONDS = REGISTRY.histogram(
+    'monitor_parse_seconds', 'Time to parse a page into a snapshot (including any wait for a parse worker)',
+    ('engine',))
+DIFF_SECONDS = REGISTRY.histogram(
+    'monitor_diff_seconds', 'Time to compare two snapshots')
+CHECKS = REGISTRY.counter(
+    'monitor_checks_total', 'Recorded checks by outcome', ('outcome',))
+SITE_ERRORS = REGISTRY.counter(
+    'monitor_site_errors_total', 'Failed checks per site', ('site',))
+POLITENESS_WAIT_SECONDS = REGISTRY.histogram(
+    'monitor_politeness_wait_seconds', 'Time a fetch waited for its host\'s rate limit or concurrency cap')
+HOST_BACKOFFS = REGISTRY.counter(
+    'monitor_host_backoffs_total', 'Responses that paused requests to a host', ('status',))
+
+
+def route(use_tor):
+    return 'tor' if use_tor else 'direct'
+
+
+def observe_fetch(route, seconds, page):
+    """Record one fetch: its latency, result and body bytes"""
+    FETCH_SECONDS.observe(seconds, route=route)
+    if page is None:
+        result = 'error'
+    elif page['status'] == 304:
+        result = 'not_modified'
+    elif page.get('truncated'):
+        result = 'truncated'
+    else:
+        result = 'ok'
+    FETCHES.inc(route=route, result=result)
+    if page is not None and page.get('size'):
+        FETCH_BYTES.inc(page['size'], route=route)
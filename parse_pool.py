@@ -0,0 +1,68 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import parsers
+
+
+class ParsePool:
+    """Parse pages into snapshots in worker processes
+
+    HTML parsing is CPU-bound and holds the GIL, so it runs in a process
+    pool while fetching stays in the calling process. Workers return
+    snapshot dicts (plain strings and lists), never parsed trees. At most
+    max_pending pages are queued or being parsed; submit() blocks beyond
+    that, so callers are slowed down instead of piling pages up in memory.
+    """
+
+    def __init__(self, workers, max_pending=None):
+        self.workers = workers
+        self.max_pending = max_pending or workers * 2
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+
+        # forkserver keeps workers out of this (threaded) process's state;
+        # preloading parsers makes each worker start with bs4 imported
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['parsers'])
+        else:
+            context = multiprocessing.get_context('spawn')
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+    def submit(self, html_content, engine=parsers.DEFAULT_ENGINE):
+        """Queue a page for parsing; returns a future of its snapshot"""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(parsers.parse_snapshot, html_content, engine)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def parse(self, html_content, engine=parsers.DEFAULT_ENGINE):
+        """Parse one page in a worker and wait for its snapshot"""
+        return self.submit(html_content, engine).result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'completed': self._completed,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+        self._slots.release()
@@ -0,0 +1,289 @@
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+from bs4.dammit import EntitySubstitution
+
+# lxml is optional; without it only the pure-Python engines are available
+try:
+    import lxml  # noqa: F401
+except ImportError:
+    lxml = None
+
+# Elements whose text is collected into the snapshot, keyed by snapshot field
+CLASS_EXTRACTIONS = {
+    'payment_methods': 'payment-method',
+    'transactions': 'transaction',
+}
+
+DEFAULT_ENGINE = 'html.parser'
+
+
+def available_engines():
+    """Names of the parser engines usable in this environment"""
+    engines = ['html.parser', 'stream']
+    if lxml is not None:
+        engines.append('lxml')
+    return engines
+
+
+def parse_snapshot(html_content, engine=DEFAULT_ENGINE):
+    """Parse HTML with the given engine into a snapshot dict"""
+    if engine == 'stream':
+        return StreamingExtractor().extract(html_content)
+    if engine not in available_engines():
+        raise ValueError(f"Parser engine {engine!r} is not available "
+                         f"(choose from {', '.join(available_engines())})")
+    return soup_snapshot(BeautifulSoup(html_content, engine))
+
+
+def extract_class_text(soup, class_name):
+    """Text of every element carrying the given class, in document order"""
+    return [element.get_text() for element in soup.find_all(class_=class_name)]
+
+
+def soup_snapshot(soup):
+    """Build a snapshot from an already parsed BeautifulSoup tree"""
+    meta = soup.find('meta', attrs={'name': 'description'})
+    snapshot = {
+        'title': str(soup.title.string) if soup.title and soup.title.string is not None else None,
+        'has_title': soup.title is not None,
+        'meta_description': meta.get('content') if meta else None,
+        'links': [a['href'] for a in soup.find_all('a', href=True)],
+        'images': [img['src'] for img in soup.find_all('img', src=True)],
+        'text': soup.get_text(),
+    }
+    for field, class_name in CLASS_EXTRACTIONS.items():
+        snapshot[field] = extract_class_text(soup, class_name)
+    return snapshot
+
+
+class _Capture:
+    """Text being collected for one open element with an extracted class"""
+
+    __slots__ = ('field', 'index', 'container', 'parts')
+
+    def __init__(self, field, index, container):
+        self.field = field
+        self.index = index
+        self.container = container
+        self.parts = []
+
+
+class _TitleNode:
+    """Minimal child list for the first <title>, enough to emulate Tag.string"""
+
+    __slots__ = ('children',)
+
+    def __init__(self):
+        self.children = []
+
+    def string(self):
+        if len(self.children) != 1:
+            return None
+        child = self.children[0]
+        return child if isinstance(child, str) else child.string()
+
+
+class StreamingExtractor(HTMLParser):
+    """Single-pass, tree-less snapshot extractor
+
+    Walks the html.parser token stream and applies the same rules the
+    BeautifulSoup html.parser tree builder uses (void elements, end tags
+    popping to the nearest open match, whitespace collapsing, script/style
+    strings excluded from text), so its snapshot matches parse_snapshot()
+    with the 'html.parser' engine without materialising a tree.
+    """
+
+    VOID_ELEMENTS = HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS
+    STRING_CONTAINERS = frozenset(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+    PRESERVE_WHITESPACE = HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS
+    ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        # Open elements as (name, captures, title_node) tuples
+        self.stack = []
+        self.open_counts = {}
+        self.containers = []
+        self.preserve = 0
+        self.already_closed = []
+        self.pending = []
+        self.text = []
+        self.title_state = None  # None -> not seen, node -> open, False -> closed
+        self.title_node = None
+        self.meta_description = None
+        self.meta_seen = False
+        self.links = []
+        self.images = []
+        self.captures = []
+        self.extracted = {field: [] for field in CLASS_EXTRACTIONS}
+
+    def extract(self, html_content):
+        self.feed(html_content)
+        self.close()
+        self._flush()
+        while self.stack:
+            self._pop()
+        snapshot = {
+            'title': None,
+            'has_title': self.title_node is not None,
+            'meta_description': self.meta_description,
+            'links': self.links,
+            'images': self.images,
+            'text': ''.join(self.text),
+        }
+        if self.title_node is not None:
+            title = self.title_node.string()
+            snapshot['title'] = str(title) if title is not None else None
+        for field, values in self.extracted.items():
+            snapshot[field] = [''.join(parts) for parts in values]
+        return snapshot
+
+    # Text handling
+
+    def _flush(self, kind='text'):
+        """Emit buffered character data as one string, like BeautifulSoup.endData"""
+        if not self.pending:
+            return
+        data = ''.join(self.pending)
+        self.pending = []
+        if not self.preserve and not data.strip(self.ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+
+        if self.title_state:
+            self.title_state.children.append(data)
+
+        if kind == 'text':
+            # Strings inside script/style/template/rt/rp belong to that container
+            container = self.containers[-1] if self.containers else None
+        elif kind == 'cdata':
+            container = None
+        else:
+            # Comments, doctypes and processing instructions are never text
+            return
+
+        if container is None:
+            self.text.append(data)
+        for capture in self.captures:
+            if capture.container == container:
+                capture.parts.append(data)
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def handle_charref(self, name):
+        dereferenced, _, extra_data = \
+            BeautifulSoupHTMLParser._dereference_numeric_character_reference(name)
+        if dereferenced is not None:
+            self.pending.append(dereferenced)
+        if extra_data is not None:
+            self.pending.append(extra_data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.pending.append(character if character is not None else '&%s' % name)
+
+    def _special(self, data, kind):
+        self._flush()
+        self.pending.append(data)
+        self._flush(kind)
+
+    def handle_comment(self, data):
+        self._special(data, 'comment')
+
+    def handle_decl(self, decl):
+        self._special(decl[len('DOCTYPE '):], 'doctype')
+
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self._special(data[len('CDATA['):], 'cdata')
+        else:
+            self._special(data, 'declaration')
+
+    def handle_pi(self, data):
+        self._special(data, 'pi')
+
+    # Element handling
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._flush()
+        attr_dict = {}
+        for key, value in attrs:
+            attr_dict[key] = '' if value is None else value
+
+        if tag == 'a' and 'href' in attr_dict:
+            self.links.append(attr_dict['href'])
+        elif tag == 'img' and 'src' in attr_dict:
+            self.images.append(attr_dict['src'])
+        elif tag == 'meta' and not self.meta_seen and attr_dict.get('name') == 'description':
+            self.meta_seen = True
+            self.meta_description = attr_dict.get('content')
+
+        captures = []
+        if 'class' in attr_dict:
+            value = attr_dict['class']
+            classes = value.split()
+            container = tag if tag in self.STRING_CONTAINERS else None
+            for field, class_name in CLASS_EXTRACTIONS.items():
+                if class_name in classes or class_name == value:
+                    values = self.extracted[field]
+                    capture = _Capture(field, len(values), container)
+                    values.append(capture.parts)
+                    captures.append(capture)
+            self.captures.extend(captures)
+
+        title_node = None
+        if self.title_state:
+            title_node = _TitleNode()
+            self.title_state.children.append(title_node)
+        if tag == 'title' and self.title_node is None:
+            title_node = self.title_node = _TitleNode()
+
+        self.stack.append((tag, captures, title_node, self.title_state))
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if tag in self.STRING_CONTAINERS:
+            self.containers.append(tag)
+        if tag in self.PRESERVE_WHITESPACE:
+            self.preserve += 1
+        if title_node is not None:
+            self.title_state = title_node
+
+        if handle_empty_element and tag in self.VOID_ELEMENTS:
+            self._end(tag)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self._end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.already_closed:
+            self.already_closed.remove(tag)
+        else:
+            self._end(tag)
+
+    def _end(self, tag):
+        self._flush()
+        if not self.open_counts.get(tag):
+            return
+        while self.stack:
+            name = self._pop()
+            if name == tag:
+                break
+
+    def _pop(self):
+        name, captures, title_node, parent_title_state = self.stack.pop()
+        self.open_counts[name] -= 1
+        if name in self.STRING_CONTAINERS:
+            self.containers.pop()
+        if name in self.PRESERVE_WHITESPACE:
+            self.preserve -= 1
+        for capture in captures:
+            self.captures.remove(capture)
+        if title_node is not None:
+            # Leaving the first <title> (or an element inside it)
+            self.title_state = parent_title_state if parent_title_state else (
+                None if title_node is not self.title_node else False)
+        return name
@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import metrics
+from single_flight import SingleFlight
+
+# tldextract knows the public suffix list; without it a host's registrable
+# domain is guessed from its last labels
+try:
+    import tldextract
+except ImportError:
+    tldextract = None
+
+logger = logging.getLogger(__name__)
+
+# Second-level labels under which registrations happen one level down
+# (example.co.uk), for guessing the registrable domain without tldextract
+_SECOND_LEVEL = frozenset(['ac', 'co', 'com', 'edu', 'gov', 'net', 'org', 'ne', 'or', 'go'])
+
+# Seconds between checks for a free slot when waiting from the event loop
+SLOT_POLL = 0.05
+
+
+def registrable_domain(host):
+    """eTLD+1 of a host name (www.example.co.uk -> example.co.uk); IPs and
+    single labels are returned as they are"""
+    host = (host or '').lower().rstrip('.')
+    if not host or host.replace('.', '').isdigit() or ':' in host:
+        return host
+    if tldextract is not None:
+        extracted = _extract(host)
+        if extracted.domain and extracted.suffix:
+            return f'{extracted.domain}.{extracted.suffix}'
+        return host
+    labels = host.split('.')
+    if len(labels) > 2 and labels[-2] in _SECOND_LEVEL and len(labels[-1]) == 2:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+if tldextract is not None:
+    # The bundled suffix list snapshot, never fetched over the network
+    _extract = tldextract.TLDExtract(suffix_list_urls=())
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta seconds or an HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class TokenBucket:
+    """`rate` requests per second on average, with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Host:
+    """Throttling state of one host (or registrable domain)"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.in_flight = 0
+        self.requests = 0
+        self.blocked_until = 0.0
+        self.throttles = 0  # consecutive 429/503 responses
+        self.crawl_delay = None
+
+
+class Politeness:
+    """Per-host rate limits and concurrency caps shared by every fetch path
+
+    Requests are grouped by host, or by registrable domain (eTLD+1) with
+    by_domain, so www.example.com and cdn.example.com share one budget.
+    Each group has a token bucket (rate requests per second, bursts of
+    burst) and at most max_per_host requests in flight. A 429 or 503
+    response pauses the group for its Retry-After, or for an exponential
+    backoff from base_backoff up to max_backoff when there is none.
+
+    With robots_fetch(robots_url, use_tor) -> text (or None on failure)
+    given, each origin's robots.txt is fetched once per robots_ttl and its
+    Crawl-delay / Request-rate for user_agent slows the group down further.
+
+    acquire() (threads) and acquire_async() (event loop) wait for a permit
+    and return it, or None if the host asked for a pause longer than
+    max_wait; every permit is handed back with release() once the response
+    status is known. After a None, paused_for(url) tells how long the
+    pause still has to run.
+    """
+
+    def __init__(self, rate=2.0, burst=10, max_per_host=4, by_domain=True, base_backoff=5.0,
+                 max_backoff=600.0, max_wait=60.0, robots_fetch=None, robots_ttl=3600.0,
+                 user_agent='*'):
+        self.rate = rate  # 0 turns the rate limit off
+        self.burst = burst
+        self.max_per_host = max_per_host  # 0 turns the concurrency cap off
+        self.by_domain = by_domain
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self.robots_fetch = robots_fetch
+        self.robots_ttl = robots_ttl
+        self.user_agent = user_agent
+        self._cond = threading.Condition()
+        self._hosts = {}
+        self._robots = {}  # origin -> (crawl delay or None, expiry)
+        self._robots_flights = SingleFlight()
+
+    def key(self, url):
+        host = urlsplit(url).hostname or ''
+        return registrable_domain(host) if self.by_domain else host
+
+    def acquire(self, url, use_tor=False):
+        """Block until a request to url may start; returns a permit or None"""
+        self._apply_robots(url, use_tor)
+        key = self.key(url)
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                granted, wait, blocked = self._try_acquire(key)
+                if granted:
+                    break
+                if blocked and wait > self.max_wait:
+                    return self._deferred(url, wait)
+                self._cond.wait(wait)
+        metrics.POLITENESS_WAIT_SECONDS.observe(time.monotonic() - start)
+        return key
+
+    async def acquire_async(self, url, use_tor=False):
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking the loop"""
+        if self.robots_fetch is not None and self._cached_delay(_origin(url)) is _MISSING:
+            await asyncio.get_running_loop().run_in_executor(None, self._apply_robots, url, use_tor)
+        key = self.key(url)
+        start = time.monotonic()
+        while True:
+            with self._cond:
+                granted, wait, blocked = self._try_acquire(key)
+            if granted:
+                break
+            if blocked and wait > self.max_wait:
+                return self._deferred(url, wait)
+            await asyncio.sleep(SLOT_POLL if wait is None else wait)
+        metrics.POLITENESS_WAIT_SECONDS.observe(time.monotonic() - start)
+        return key
+
+    def release(self, permit, status=None, retry_after=None):
+        """Hand a permit back with the response status (None if the request
+        failed) and its Retry-After header"""
+        with self._cond:
+            host = self._hosts[permit]
+            host.in_flight -= 1
+            if status in (429, 503):
+                host.throttles += 1
+                delay = parse_retry_after(retry_after)
+                if delay is None:
+                    delay = self.base_backoff * 2 ** (host.throttles - 1)
+                delay = min(delay, self.max_backoff)
+                host.blocked_until = max(host.blocked_until, time.monotonic() + delay)
+                metrics.HOST_BACKOFFS.inc(status=str(status))
+                logger.info("%s answered %d: pausing requests for %.0fs", permit, status, delay,
+                            extra={'host': permit, 'status': status, 'delay': delay})
+            elif status is not None:
+                host.throttles = 0
+            self._cond.notify_all()
+
+    def paused_for(self, url):
+        """Seconds until requests to url's host may start again (0 if it is not paused)"""
+        with self._cond:
+            host = self._hosts.get(self.key(url))
+            return max(0.0, host.blocked_until - time.monotonic()) if host is not None else 0.0
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            return {key: {
+                'in_flight': host.in_flight,
+                'requests': host.requests,
+                'paused_for': round(max(0.0, host.blocked_until - now), 1),
+                'crawl_delay': host.crawl_delay,
+            } for key, host in sorted(self._hosts.items())}
+
+    def _host(self, key):
+        host = self._hosts.get(key)
+        if host is None:
+            host = self._hosts[key] = _Host(TokenBucket(self.rate, self.burst) if self.rate else None)
+        return host
+
+    def _try_acquire(self, key):
+        """Take a permit if the host allows one now; returns (granted, seconds
+        to wait or None for 'until a release', whether the host is paused)"""
+        now = time.monotonic()
+        host = self._host(key)
+        if host.blocked_until > now:
+            return False, host.blocked_until - now, True
+        if self.max_per_host and host.in_flight >= self.max_per_host:
+            return False, None, False
+        if host.bucket is not None:
+            wait = host.bucket.wait_time(now)
+            if wait > 0:
+                return False, wait, False
+            host.bucket.take()
+        host.in_flight += 1
+        host.requests += 1
+        return True, 0.0, False
+
+    def _deferred(self, url, wait):
+        logger.info("Skipping %s: its host asked for a pause of %.0fs more", url, wait,
+                    extra={'url': url, 'delay': wait})
+        return None
+
+    # robots.txt
+
+    def _cached_delay(self, origin):
+        with self._cond:
+            cached = self._robots.get(origin)
+        if cached is None or cached[1] <= time.monotonic():
+            return _MISSING
+        return cached[0]
+
+    def _apply_robots(self, url, use_tor):
+        if self.robots_fetch is None:
+            return
+        origin = _origin(url)
+        if self._cached_delay(origin) is _MISSING:
+            # Concurrent first requests to an origin share one robots.txt fetch
+            self._robots_flights.do(origin, self._load_robots, origin, self.key(url), use_tor)
+
+    def _load_robots(self, origin, key, use_tor):
+        text = self.robots_fetch(origin + '/robots.txt', use_tor)
+        delay = None
+        if text:
+            parser = RobotFileParser()
+            parser.parse(text.splitlines())
+            # crawl_delay() answers None until the parser counts as loaded
+            parser.modified()
+            delay = parser.crawl_delay(self.user_agent)
+            request_rate = parser.request_rate(self.user_agent)
+            if request_rate and request_rate.requests:
+                delay = max(float(delay or 0), request_rate.seconds / request_rate.requests)
+            delay = float(delay) if delay else None
+        # An unreachable robots.txt is retried sooner than a fetched one
+        ttl = self.robots_ttl if text is not None else min(self.robots_ttl, 300.0)
+        with self._cond:
+            self._robots[origin] = (delay, time.monotonic() + ttl)
+            host = self._host(key)
+            if delay != host.crawl_delay:
+                host.crawl_delay = delay
+                rate = self.rate
+                if delay:
+                    rate = min(rate, 1 / delay) if rate else 1 / delay
+                # A crawl delay spaces requests out evenly: no bursts
+                host.bucket = TokenBucket(rate, 1 if delay else self.burst) if rate else None
+        if delay:
+            logger.info("%s asks for a crawl delay of %ss", origin, delay,
+                        extra={'origin': origin, 'delay': delay})
+        return delay
+
+
+_MISSING = object()
+
+
+def deferred_page(retry_in):
+    """What a fetch returns in place of a page when the host asked for a
+    pause: no status or content, and the seconds until the pause ends"""
+    return {'status': None, 'content': None, 'deferred': True, 'retry_in': retry_in}
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'
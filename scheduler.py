@@ -0,0 +1,178 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class CheckScheduler:
+    """Run site checks on a timer, ordered by next-due time"""
+
+    def __init__(self, check_func, default_interval=300, jitter=0.1, max_concurrent=8):
+        self.check_func = check_func
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.max_concurrent = max_concurrent
+
+        # Heap of (due_time, seq, url). Entries are invalidated lazily: only the
+        # (due_time, seq) stored in self._entries for a url is considered live.
+        self._heap = []
+        self._entries = {}
+        self._intervals = {}
+        self._running = set()
+        self._seq = itertools.count()
+
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._executor = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def add(self, url, interval=None, delay=None):
+        """Schedule a site; by default its first check is one interval away"""
+        with self._cond:
+            interval = interval or self._intervals.get(url) or self.default_interval
+            self._intervals[url] = interval
+            if delay is None:
+                delay = self._jittered(interval)
+            self._push(url, time.monotonic() + delay)
+
+    def remove(self, url):
+        """Stop scheduling a site (a check already running is left to finish)"""
+        with self._cond:
+            self._entries.pop(url, None)
+            self._intervals.pop(url, None)
+            self._cond.notify()
+
+    def update_interval(self, url, interval):
+        """Change the interval of a scheduled site
+
+        A queued site is rescheduled one new interval from now; a site
+        whose check is running picks the interval up when it is re-queued.
+        Sites that are not scheduled are left alone.
+        """
+        with self._cond:
+            if url not in self._intervals:
+                return False
+            self._intervals[url] = interval
+            if url in self._entries:
+                self._push(url, time.monotonic() + self._jittered(interval))
+            return True
+
+    def defer(self, url, delay):
+        """Move a scheduled site's next check to delay seconds from now,
+        also when its check is running; sites that are not scheduled are
+        left alone"""
+        with self._cond:
+            if url not in self._intervals:
+                return False
+            self._push(url, time.monotonic() + delay)
+            return True
+
+    def next_due(self, url):
+        """Seconds until the next check of a site, or None if not scheduled"""
+        with self._cond:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            return max(0.0, entry[0] - time.monotonic())
+
+    def next_due_all(self):
+        """Seconds until the next check of every scheduled site"""
+        now = time.monotonic()
+        with self._cond:
+            return {url: max(0.0, entry[0] - now) for url, entry in self._entries.items()}
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            return {
+                'scheduled': len(self._entries),
+                # Waiting for a free worker past their due time
+                'due': sum(1 for entry in self._entries.values() if entry[0] <= now),
+                'running': len(self._running),
+                'max_concurrent': self.max_concurrent,
+            }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent,
+                                            thread_name_prefix='site-check')
+        self._thread = threading.Thread(target=self._loop, name='check-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def _jittered(self, interval):
+        if not self.jitter:
+            return interval
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _push(self, url, due):
+        seq = next(self._seq)
+        self._entries[url] = (due, seq)
+        heapq.heappush(self._heap, (due, seq, url))
+        self._cond.notify()
+
+    def _pop_due(self):
+        """Block until a live entry is due and return its url (None on stop)"""
+        with self._cond:
+            while not self._stopped.is_set():
+                # Drop stale heap entries left behind by remove()/reschedules
+                while self._heap and self._entries.get(self._heap[0][2]) != self._heap[0][:2]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, seq, url = self._heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                del self._entries[url]
+                self._running.add(url)
+                return url
+        return None
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            # Take a concurrency slot before popping so that the queue keeps its
+            # order while every slot is busy
+            while not self._slots.acquire(timeout=0.5):
+                if self._stopped.is_set():
+                    return
+            url = self._pop_due()
+            if url is None:
+                self._slots.release()
+                return
+            self._executor.submit(self._run, url)
+
+    def _run(self, url):
+        try:
+            self.check_func(url)
+        except Exception as e:
+            logger.exception("Scheduled check of %s failed: %s", url, e, extra={'url': url})
+        finally:
+            with self._cond:
+                self._running.discard(url)
+                interval = self._intervals.get(url)
+                # Sites removed while their check was running are not re-queued
+                if interval is not None and url not in self._entries:
+                    self._push(url, time.monotonic() + self._jittered(interval))
+            self._slots.release()
@@ -0,0 +1,82 @@
+import threading
+from contextlib import contextmanager
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run one call per key at a time; callers arriving meanwhile share its outcome
+
+    do(key, func) runs func unless a call for the same key is already in
+    flight, in which case it waits for that call and returns its result
+    (or raises its exception). Nothing is cached once the call is over.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """Returns (result, shared): shared is True if another caller's call was reused"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def running(self, key):
+        """Whether a call for key is in flight"""
+        with self._lock:
+            return key in self._calls
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class KeyedLocks:
+    """A lock per key, created on first use and dropped when nobody holds or waits for it"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}  # key -> [lock, holders and waiters]
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
@@ -0,0 +1,149 @@
+import bisect
+import json
+import threading
+
+
+class SiteIndex:
+    """Precomputed per-site summaries for the site listing, kept current incrementally
+
+    The index listens to the store and re-reads only the site a write
+    touched. Each entry keeps its summary serialized twice: in full and
+    in a light form from light(), so a listing is a join of cached
+    strings rather than a walk over every site's info. `version` goes up
+    on every change and is what the listing's ETag is made from. Writes
+    by other processes sharing the database are noticed through SQLite's
+    data_version; the sites they touched are read from the store's change
+    log and refreshed, with a full rebuild only if the log has moved on.
+
+    summarize(site) turns a stored site into its summary dict;
+    light(summary) returns the cut-down summary for the light listing.
+    Listeners are called, in index order, with (url, light summary) after
+    a site changes and (url, None) after it is removed, including changes
+    found by a rebuild.
+    """
+
+    def __init__(self, store, summarize, light):
+        self.store = store
+        self.summarize = summarize
+        self.light = light
+        self.version = 0
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+        self._urls = []  # sorted, for cursor paging
+        self._entries = {}
+        self._data_version = None
+        self._change_seq = None
+        self._external_lock = threading.Lock()
+        self.listeners = []
+        store.listeners.append(self.refresh)
+        self.rebuild()
+
+    def rebuild(self):
+        """Re-read every site from the store"""
+        with self._lock:
+            self._data_version = self.store.data_version()
+            self._change_seq = self.store.site_changes()[0]
+            old_entries = self._entries
+            self._entries = {url: self._entry(site) for url, site in self.store.list_sites()}
+            self._urls = sorted(self._entries)
+            self.version += 1
+            self.rebuilds += 1
+            for url in old_entries.keys() - self._entries.keys():
+                self._notify(url, None)
+            for url in self._urls:
+                old = old_entries.get(url)
+                if old is None or old[1] != self._entries[url][1]:
+                    self._notify(url, self._entries[url][0])
+
+    def refresh(self, url, changed_only=False):
+        """Re-read one site after a write (store listener); with changed_only,
+        a site whose summary is unchanged is not announced again"""
+        # The store is read under the index lock so that two writers to
+        # one site cannot leave the older state in the index
+        with self._lock:
+            site = self.store.get_site(url)
+            old = self._entries.get(url)
+            if site is None:
+                if old is None and changed_only:
+                    return
+                if self._entries.pop(url, None) is not None:
+                    del self._urls[bisect.bisect_left(self._urls, url)]
+                light = None
+            else:
+                entry = self._entry(site)
+                if changed_only and old is not None and old[1] == entry[1]:
+                    return
+                if old is None:
+                    bisect.insort(self._urls, url)
+                self._entries[url] = entry
+                light = entry[0]
+            self.version += 1
+            self._notify(url, light)
+
+    def check_external(self):
+        """Pick up the sites another connection has written since the last read"""
+        with self._external_lock:
+            data_version = self.store.data_version()
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            change_seq, urls = self.store.site_changes(self._change_seq)
+            if urls is None:
+                self.rebuild()
+                return
+            self._change_seq = change_seq
+            # Includes this process's own writes, which are already applied
+            for url in urls:
+                self.refresh(url, changed_only=True)
+
+    def listing(self, light=False, status=None, website_type=None, use_tor=None,
+                query=None, cursor=None, limit=None):
+        """Matching (url, summary JSON) pairs in url order after cursor, up to limit
+
+        Returns (version, pairs, number of matches on all pages, next cursor or None).
+        Call check_external() first to pick up writes from other processes.
+        """
+        query = query.lower() if query else None
+        with self._lock:
+            pairs = []
+            total = 0
+            next_cursor = None
+            for url in self._urls:
+                brief, full_json, light_json, title = self._entries[url]
+                if status is not None and brief.get('status') != status:
+                    continue
+                if website_type is not None and \
+                        (brief.get('info') or {}).get('website_type') != website_type:
+                    continue
+                if use_tor is not None and bool(brief.get('use_tor')) != use_tor:
+                    continue
+                if query is not None and query not in url.lower() and query not in title:
+                    continue
+                total += 1
+                if cursor is not None and url <= cursor:
+                    continue
+                if limit is None or len(pairs) < limit:
+                    pairs.append((url, light_json if light else full_json))
+                elif next_cursor is None:
+                    next_cursor = pairs[-1][0]
+            return self.version, pairs, total, next_cursor
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _entry(self, site):
+        # Only the light summary is kept as objects (filters need nothing
+        # else); the full one, with its link and image lists, only as JSON
+        summary = self.summarize(site)
+        title = str((summary.get('info') or {}).get('title') or '').lower()
+        light = self.light(summary)
+        return light, _dumps(summary), _dumps(light), title
+
+    def _notify(self, url, light):
+        # Under the index lock, so listeners see changes in the order applied
+        for listener in self.listeners:
+            listener(url, light)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'))
@@ -0,0 +1,491 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+# zstd compresses snapshots better and faster when available; zlib otherwise
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sites (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    use_tor INTEGER NOT NULL DEFAULT 0,
+    first_checked TEXT,
+    last_checked TEXT,
+    check_interval REAL,
+    history_count INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    url TEXT PRIMARY KEY,
+    snapshot_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    snapshot_hash TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checks_url_id ON checks (url, id);
+CREATE INDEX IF NOT EXISTS checks_url_timestamp ON checks (url, timestamp);
+CREATE INDEX IF NOT EXISTS checks_snapshot_hash ON checks (snapshot_hash);
+CREATE TABLE IF NOT EXISTS site_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS sites_inserted AFTER INSERT ON sites
+BEGIN INSERT INTO site_changes (url) VALUES (NEW.url); END;
+CREATE TRIGGER IF NOT EXISTS sites_updated AFTER UPDATE ON sites
+BEGIN INSERT INTO site_changes (url) VALUES (NEW.url); END;
+CREATE TRIGGER IF NOT EXISTS sites_deleted AFTER DELETE ON sites
+BEGIN INSERT INTO site_changes (url) VALUES (OLD.url); END;
+"""
+
+# Entries kept in the site_changes log, through which other processes find
+# the sites that changed; a reader further behind re-reads every site
+CHANGE_LOG_KEEP = 10000
+
+# Site fields stored in their own columns; everything else goes into the data JSON
+SITE_COLUMNS = ('status', 'use_tor', 'first_checked', 'last_checked', 'check_interval')
+
+
+def side_path(path, name):
+    """Path of a database file kept next to the site database at path
+
+    Other connections' commits to the site database make the summary index
+    re-read it, so tables written on their own connection (URL table, bulk
+    jobs, job queue) live in files of their own.
+    """
+    if path == ':memory:':
+        return ':memory:'
+    return f'{os.path.splitext(path)[0]}-{name}.db'
+
+
+def compress(payload):
+    """Compress bytes with the best available codec; returns (codec, data)"""
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=3).compress(payload)
+    return 'zlib', zlib.compress(payload, 6)
+
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd-compressed snapshots')
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown snapshot codec {codec!r}")
+
+
+def encode_snapshot(snapshot):
+    """Canonical JSON bytes of a snapshot and their sha256"""
+    payload = json.dumps(snapshot, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest(), payload
+
+
+class SiteStore:
+    """SQLite-backed storage for monitored sites, their snapshots and check history
+
+    History records are buffered and written in batches, either when
+    batch_size records are pending or flush_interval seconds after the
+    first pending record, whichever comes first.
+
+    Snapshots are stored once per distinct content in a compressed,
+    content-addressed blob table; sites and history rows refer to them by
+    hash. Only the latest keep_snapshots history rows of a site (and none
+    older than max_age_days, if set) keep their snapshot reference;
+    unreferenced blobs are pruned every prune_every history records.
+    """
+
+    def __init__(self, path='monitor.db', batch_size=100, flush_interval=1.0,
+                 keep_snapshots=100, max_age_days=None, prune_every=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.keep_snapshots = keep_snapshots
+        self.max_age_days = max_age_days
+        self.prune_every = prune_every
+        self._lock = threading.RLock()
+        self._pending = []
+        self._timer = None
+        self._since_prune = 0
+        # Called with a url after a write to that site has committed
+        self.listeners = []
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            # WAL lets several worker processes read while one writes
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(SCHEMA)
+        atexit.register(self.flush)
+
+    # Sites
+
+    def has_site(self, url):
+        with self._lock:
+            row = self._conn.execute('SELECT 1 FROM sites WHERE url = ?', (url,)).fetchone()
+        return row is not None
+
+    def add_site(self, url, site, snapshot=None):
+        """Insert a new site; returns False if it is already stored"""
+        columns, data = self._split(site)
+        with self._lock, self._transaction():
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO sites (url, status, use_tor, first_checked, last_checked, '
+                'check_interval, data) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, columns.get('status', 'active'), int(bool(columns.get('use_tor'))),
+                 columns.get('first_checked'), columns.get('last_checked'),
+                 columns.get('check_interval'), json.dumps(data)))
+            if cursor.rowcount == 0:
+                return False
+            if snapshot is not None:
+                self._put_snapshot(url, snapshot)
+        self._notify(url)
+        return True
+
+    def add_sites(self, sites):
+        """Insert several new sites ({url: site}) in one transaction; returns
+        the set of urls that were added (the others are already stored)"""
+        added = set()
+        with self._lock, self._transaction():
+            for url, site in sites.items():
+                columns, data = self._split(site)
+                cursor = self._conn.execute(
+                    'INSERT OR IGNORE INTO sites (url, status, use_tor, first_checked, last_checked, '
+                    'check_interval, data) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (url, columns.get('status', 'active'), int(bool(columns.get('use_tor'))),
+                     columns.get('first_checked'), columns.get('last_checked'),
+                     columns.get('check_interval'), json.dumps(data)))
+                if cursor.rowcount:
+                    added.add(url)
+        for url in sorted(added):
+            self._notify(url)
+        return added
+
+    def get_site(self, url):
+        """Site fields as a dict (without history or snapshot), or None"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM sites WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+            return self._row_to_site(row, self._pending_counts())
+
+    def list_sites(self):
+        """All sites as (url, site) pairs, ordered by url"""
+        with self._lock:
+            rows = self._conn.execute('SELECT * FROM sites ORDER BY url').fetchall()
+            pending = self._pending_counts()
+            return [(row['url'], self._row_to_site(row, pending)) for row in rows]
+
+    def iter_sites(self, chunk_size=500):
+        """Yield (url, site) pairs in url order, reading chunks by keyset
+        pagination so the lock is not held while the caller consumes them"""
+        cursor = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute('SELECT * FROM sites WHERE url > ? ORDER BY url LIMIT ?',
+                                          (cursor, chunk_size)).fetchall()
+                pending = self._pending_counts()
+            for row in rows:
+                yield row['url'], self._row_to_site(row, pending)
+            if len(rows) < chunk_size:
+                return
+            cursor = rows[-1]['url']
+
+    def list_urls(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT url FROM sites ORDER BY url')]
+
+    def update_site(self, url, fields, snapshot=None):
+        """Merge fields into a stored site and optionally replace its snapshot"""
+        with self._lock, self._transaction():
+            if not self._update_site(url, fields):
+                return False
+            if snapshot is not None:
+                self._put_snapshot(url, snapshot)
+        self._notify(url)
+        return True
+
+    def _update_site(self, url, fields):
+        columns, data = self._split(fields)
+        row = self._conn.execute('SELECT data FROM sites WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return False
+        merged = json.loads(row['data'])
+        merged.update(data)
+        if 'use_tor' in columns:
+            columns['use_tor'] = int(bool(columns['use_tor']))
+        assignments = ''.join(f'{name} = ?, ' for name in columns)
+        self._conn.execute(f'UPDATE sites SET {assignments}data = ? WHERE url = ?',
+                           (*columns.values(), json.dumps(merged), url))
+        return True
+
+    def remove_site(self, url):
+        """Delete a site with its snapshot and history; returns False if unknown"""
+        with self._lock:
+            self._pending = [entry for entry in self._pending if entry[0] != url]
+            with self._transaction():
+                cursor = self._conn.execute('DELETE FROM sites WHERE url = ?', (url,))
+                self._conn.execute('DELETE FROM snapshots WHERE url = ?', (url,))
+                self._conn.execute('DELETE FROM checks WHERE url = ?', (url,))
+        if cursor.rowcount == 0:
+            return False
+        self._notify(url)
+        return True
+
+    def record_check(self, url, fields, record, snapshot=None):
+        """Store the outcome of one check: site fields, new snapshot and history record
+
+        The record gets a 'snapshot' key with the hash of the snapshot the
+        site points to after this check.
+        """
+        with self._lock:
+            with self._transaction():
+                if not self._update_site(url, fields):
+                    return False
+                if snapshot is not None:
+                    snapshot_hash = self._put_snapshot(url, snapshot)
+                else:
+                    row = self._conn.execute('SELECT snapshot_hash FROM snapshots WHERE url = ?',
+                                             (url,)).fetchone()
+                    snapshot_hash = row['snapshot_hash'] if row else None
+            record['snapshot'] = snapshot_hash
+            self.append_history(url, record)
+        self._notify(url)
+        return True
+
+    # Snapshots
+
+    def get_snapshot(self, url):
+        """Latest snapshot of a site, or None"""
+        with self._lock:
+            row = self._conn.execute('SELECT snapshot_hash FROM snapshots WHERE url = ?',
+                                     (url,)).fetchone()
+        return self.get_snapshot_by_hash(row['snapshot_hash']) if row else None
+
+    def get_snapshot_by_hash(self, snapshot_hash):
+        with self._lock:
+            row = self._conn.execute('SELECT codec, data FROM blobs WHERE hash = ?',
+                                     (snapshot_hash,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(decompress(row['codec'], row['data']))
+
+    def _put_snapshot(self, url, snapshot):
+        snapshot_hash, payload = encode_snapshot(snapshot)
+        exists = self._conn.execute('SELECT 1 FROM blobs WHERE hash = ?', (snapshot_hash,)).fetchone()
+        if exists is None:
+            codec, data = compress(payload)
+            self._conn.execute('INSERT INTO blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)',
+                               (snapshot_hash, codec, len(payload), data))
+        self._conn.execute('INSERT OR REPLACE INTO snapshots (url, snapshot_hash) VALUES (?, ?)',
+                           (url, snapshot_hash))
+        return snapshot_hash
+
+    def prune(self):
+        """Apply the retention policy and delete snapshots nothing refers to any more"""
+        self.flush()
+        with self._lock, self._transaction():
+            self._since_prune = 0
+            self._conn.execute(
+                'UPDATE checks SET snapshot_hash = NULL WHERE id IN ('
+                ' SELECT id FROM ('
+                '  SELECT id, ROW_NUMBER() OVER (PARTITION BY url ORDER BY id DESC) AS position'
+                '  FROM checks WHERE snapshot_hash IS NOT NULL'
+                ' ) WHERE position > ?)', (self.keep_snapshots,))
+            if self.max_age_days is not None:
+                cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+                self._conn.execute('UPDATE checks SET snapshot_hash = NULL '
+                                   'WHERE snapshot_hash IS NOT NULL AND timestamp < ?', (cutoff,))
+            cursor = self._conn.execute(
+                'DELETE FROM blobs WHERE hash NOT IN ('
+                ' SELECT snapshot_hash FROM checks WHERE snapshot_hash IS NOT NULL'
+                ' UNION SELECT snapshot_hash FROM snapshots)')
+            self._conn.execute('DELETE FROM site_changes WHERE seq <= '
+                               '(SELECT MAX(seq) FROM site_changes) - ?', (CHANGE_LOG_KEEP,))
+        return cursor.rowcount
+
+    def storage_stats(self):
+        with self._lock:
+            row = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0), '
+                                     'COALESCE(SUM(LENGTH(data)), 0) FROM blobs').fetchone()
+        return {'snapshots': row[0], 'raw_bytes': row[1], 'stored_bytes': row[2]}
+
+    # History
+
+    def append_history(self, url, record):
+        """Queue a check record; it is written with the next batch"""
+        with self._lock:
+            record = dict(record)
+            snapshot_hash = record.pop('snapshot', None)
+            self._pending.append((url, record['timestamp'], snapshot_hash, json.dumps(record)))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def pending_count(self):
+        """History records waiting in the write buffer"""
+        with self._lock:
+            return len(self._pending)
+
+    def get_history(self, url):
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute('SELECT snapshot_hash, record FROM checks WHERE url = ? ORDER BY id',
+                                      (url,)).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def iter_history(self, url, cursor=None, since=None, until=None, descending=False, chunk_size=200):
+        """Yield (id, record) pairs for a site in id order, starting after cursor
+
+        since/until are ISO timestamps bounding the check time (since
+        inclusive, until exclusive). Rows are read in chunks by keyset
+        pagination, so the store lock is never held while the caller
+        consumes records.
+        """
+        self.flush()
+        conditions = ['url = ?']
+        params = [url]
+        if since:
+            conditions.append('timestamp >= ?')
+            params.append(since)
+        if until:
+            conditions.append('timestamp < ?')
+            params.append(until)
+        where = ' AND '.join(conditions)
+        comparison, order = ('<', 'DESC') if descending else ('>', 'ASC')
+        while True:
+            query = f'SELECT id, snapshot_hash, record FROM checks WHERE {where}'
+            query_params = list(params)
+            if cursor is not None:
+                query += f' AND id {comparison} ?'
+                query_params.append(cursor)
+            query += f' ORDER BY id {order} LIMIT ?'
+            query_params.append(chunk_size)
+            with self._lock:
+                rows = self._conn.execute(query, query_params).fetchall()
+            for row in rows:
+                yield row['id'], self._row_to_record(row)
+            if len(rows) < chunk_size:
+                return
+            cursor = rows[-1]['id']
+
+    def flush(self):
+        """Write all pending history records in one transaction"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            counts = self._pending_counts()
+            pending, self._pending = self._pending, []
+            with self._transaction():
+                self._conn.executemany('INSERT INTO checks (url, timestamp, snapshot_hash, record) '
+                                       'VALUES (?, ?, ?, ?)', pending)
+                self._conn.executemany('UPDATE sites SET history_count = history_count + ? WHERE url = ?',
+                                       [(count, url) for url, count in counts.items()])
+            self._since_prune += len(pending)
+            if self._since_prune >= self.prune_every:
+                self.prune()
+
+    def data_version(self):
+        """SQLite's data_version: changes when another connection commits to the database"""
+        with self._lock:
+            return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def site_changes(self, after=None):
+        """(latest change seq, urls of the sites written after seq `after`)
+
+        The urls are None when after is None or the change log no longer
+        reaches back that far.
+        """
+        with self._lock:
+            first, last = self._conn.execute('SELECT MIN(seq), MAX(seq) FROM site_changes').fetchone()
+            if after is None or (first is not None and first > after + 1):
+                return last or 0, None
+            rows = self._conn.execute('SELECT DISTINCT url FROM site_changes WHERE seq > ?',
+                                      (after,)).fetchall()
+        return max(last or 0, after), [row[0] for row in rows]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    # Helpers
+
+    def _transaction(self):
+        return Transaction(self._conn)
+
+    def _notify(self, url):
+        # Outside the store lock, so listeners may read the store back
+        for listener in self.listeners:
+            listener(url)
+
+    def _split(self, fields):
+        columns = {name: fields[name] for name in SITE_COLUMNS if name in fields}
+        data = {name: value for name, value in fields.items()
+                if name not in SITE_COLUMNS and name != 'history_count'}
+        return columns, data
+
+    def _pending_counts(self):
+        counts = {}
+        for url, _, _, _ in self._pending:
+            counts[url] = counts.get(url, 0) + 1
+        return counts
+
+    def _row_to_record(self, row):
+        record = json.loads(row['record'])
+        record['snapshot'] = row['snapshot_hash']
+        return record
+
+    def _row_to_site(self, row, pending):
+        site = json.loads(row['data'])
+        site.update({
+            'status': row['status'],
+            'use_tor': bool(row['use_tor']),
+            'first_checked': row['first_checked'],
+            'last_checked': row['last_checked'],
+            'check_interval': row['check_interval'],
+        })
+        # Records still waiting in the write buffer count as history too
+        site['history_count'] = row['history_count'] + pending.get(row['url'], 0)
+        return site
+
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block on an autocommit connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
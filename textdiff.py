@@ -0,0 +1,201 @@
+import re
+from bisect import bisect_left
+from difflib import SequenceMatcher
+
+# Lines longer than this are cut into content-defined chunks, so a change in
+# a minified page does not turn the whole line into one changed region
+MAX_BLOCK_CHARS = 2048
+# A word ends a chunk when its hash falls in 1/CHUNK_MASK of the hash space
+CHUNK_MASK = 31
+# Limits on what a diff reports, to keep history records small
+MAX_REGIONS = 50
+MAX_REGION_CHARS = 500
+# For the similarity, replaced regions are also aligned word by word (in
+# linear time, like the blocks); the unmatched runs of words left between
+# them, up to SMALL_GAP_CHARS a side, are compared character by character,
+# for at most MAX_REFINE_CHARS characters per diff
+SMALL_GAP_CHARS = 64
+MAX_REFINE_CHARS = 65536
+
+_WORD_END = re.compile(r'\S+\s*')
+_TOKEN = re.compile(r'\S+\s*|\s+')
+
+
+def split_blocks(text):
+    """Split text into blocks: lines, with long lines cut at content-defined word boundaries"""
+    blocks = []
+    for line in text.splitlines(keepends=True):
+        if len(line) <= MAX_BLOCK_CHARS:
+            blocks.append(line)
+            continue
+        start = 0
+        for match in _WORD_END.finditer(line):
+            end = match.end()
+            # Boundaries depend only on the words themselves, so an insertion
+            # early in the line does not shift every later chunk
+            if (hash(match.group()) & CHUNK_MASK == 0 and end - start >= 64) \
+                    or end - start >= MAX_BLOCK_CHARS:
+                blocks.append(line[start:end])
+                start = end
+        if start < len(line):
+            blocks.append(line[start:])
+    return blocks
+
+
+def _unique_anchors(old, new, old_lo, old_hi, new_lo, new_hi):
+    """Pairs (i, j) of blocks occurring exactly once on both sides, longest increasing run"""
+    counts = {}
+    for i in range(old_lo, old_hi):
+        entry = counts.get(old[i])
+        counts[old[i]] = [1, i, 0, -1] if entry is None else [entry[0] + 1, entry[1], 0, -1]
+    for j in range(new_lo, new_hi):
+        entry = counts.get(new[j])
+        if entry is not None:
+            entry[2] += 1
+            entry[3] = j
+    pairs = sorted((entry[1], entry[3]) for entry in counts.values()
+                   if entry[0] == 1 and entry[2] == 1)
+
+    # Longest increasing subsequence of new-side positions (patience sorting)
+    tails = []
+    tail_index = []
+    previous = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        position = bisect_left(tails, j)
+        if position == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[position] = j
+            tail_index[position] = k
+        previous[k] = tail_index[position - 1] if position else -1
+    anchors = []
+    k = tail_index[-1] if tail_index else -1
+    while k != -1:
+        anchors.append(pairs[k])
+        k = previous[k]
+    anchors.reverse()
+    return anchors
+
+
+def matching_blocks(old, new):
+    """Runs of equal blocks as (old_start, new_start, length), in order"""
+    matches = []
+    old_lo, new_lo = 0, 0
+    old_hi, new_hi = len(old), len(new)
+
+    # Common prefix and suffix are by far the most frequent case
+    while old_lo < old_hi and new_lo < new_hi and old[old_lo] == new[new_lo]:
+        old_lo += 1
+        new_lo += 1
+    if old_lo:
+        matches.append((0, 0, old_lo))
+    suffix = 0
+    while old_hi > old_lo and new_hi > new_lo and old[old_hi - 1] == new[new_hi - 1]:
+        old_hi -= 1
+        new_hi -= 1
+        suffix += 1
+
+    i, j = old_lo, new_lo
+    for anchor_i, anchor_j in _unique_anchors(old, new, old_lo, old_hi, new_lo, new_hi):
+        if anchor_i < i or anchor_j < j:
+            # Already covered by extending the previous anchor
+            continue
+        # Extend the anchor backwards and forwards over equal neighbours
+        start_i, start_j = anchor_i, anchor_j
+        while start_i > i and start_j > j and old[start_i - 1] == new[start_j - 1]:
+            start_i -= 1
+            start_j -= 1
+        end_i, end_j = anchor_i + 1, anchor_j + 1
+        while end_i < old_hi and end_j < new_hi and old[end_i] == new[end_j]:
+            end_i += 1
+            end_j += 1
+        matches.append((start_i, start_j, end_i - start_i))
+        i, j = end_i, end_j
+
+    if suffix:
+        matches.append((old_hi, new_hi, suffix))
+    return matches
+
+
+def diff_text(old_text, new_text, max_regions=MAX_REGIONS, max_region_chars=MAX_REGION_CHARS):
+    """Block-level diff of two texts
+
+    Returns the similarity ratio (2 * matched chars / total chars, as in
+    difflib) and the changed regions with their character offsets. Runs in
+    roughly linear time: blocks are compared by hash and aligned on blocks
+    that are unique on both sides. Matched chars are those of equal blocks
+    and, within replaced regions, of equal words (aligned the same way)
+    plus what difflib matches in small runs of differing words.
+    """
+    if old_text == new_text:
+        return {'similarity': 1.0, 'changed_regions': [], 'regions_truncated': False}
+
+    old = split_blocks(old_text)
+    new = split_blocks(new_text)
+    old_offsets = _offsets(old)
+    new_offsets = _offsets(new)
+
+    regions = []
+    region_count = 0
+    matched_chars = 0
+    refine_budget = [MAX_REFINE_CHARS]
+    i = j = 0
+    for match_i, match_j, length in matching_blocks(old, new) + [(len(old), len(new), 0)]:
+        if match_i > i or match_j > j:
+            region_count += 1
+            old_part = old_text[old_offsets[i]:old_offsets[match_i]]
+            new_part = new_text[new_offsets[j]:new_offsets[match_j]]
+            matched_chars += _refined_matches(old_part, new_part, refine_budget)
+            if len(regions) < max_regions:
+                regions.append({
+                    'type': 'replace' if old_part and new_part else ('insert' if new_part else 'delete'),
+                    'old_offset': old_offsets[i],
+                    'new_offset': new_offsets[j],
+                    'old_text': old_part[:max_region_chars],
+                    'new_text': new_part[:max_region_chars],
+                })
+        matched_chars += old_offsets[match_i + length] - old_offsets[match_i]
+        i, j = match_i + length, match_j + length
+
+    total = len(old_text) + len(new_text)
+    return {
+        'similarity': round(2.0 * matched_chars / total, 4) if total else 1.0,
+        'changed_regions': regions,
+        'regions_truncated': region_count > len(regions),
+    }
+
+
+def _refined_matches(old_part, new_part, budget):
+    """Characters matched between the two sides of a replaced region
+
+    Words are aligned like blocks; differing runs of words small enough
+    are compared character by character while budget[0] (characters left
+    for that in this diff) lasts.
+    """
+    if not old_part or not new_part:
+        return 0
+    old = _TOKEN.findall(old_part)
+    new = _TOKEN.findall(new_part)
+    matched = 0
+    i = j = 0
+    for match_i, match_j, length in matching_blocks(old, new) + [(len(old), len(new), 0)]:
+        if match_i > i and match_j > j:
+            old_gap = ''.join(old[i:match_i])
+            new_gap = ''.join(new[j:match_j])
+            size = len(old_gap) + len(new_gap)
+            if len(old_gap) <= SMALL_GAP_CHARS and len(new_gap) <= SMALL_GAP_CHARS \
+                    and size <= budget[0]:
+                budget[0] -= size
+                matcher = SequenceMatcher(None, old_gap, new_gap, autojunk=False)
+                matched += sum(block.size for block in matcher.get_matching_blocks())
+        matched += sum(map(len, old[match_i:match_i + length]))
+        i, j = match_i + length, match_j + length
+    return matched
+
+
+def _offsets(blocks):
+    offsets = [0]
+    for block in blocks:
+        offsets.append(offsets[-1] + len(block))
+    return offsets
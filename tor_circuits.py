@@ -0,0 +1,216 @@
+import logging
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote, urlsplit
+
+# stem is only needed to ask Tor for new circuits over its control port
+try:
+    from stem import Signal
+    from stem.control import Controller
+except ImportError:
+    Controller = None
+
+logger = logging.getLogger(__name__)
+
+
+class Circuit:
+    """One Tor circuit: a SOCKS endpoint, optionally with isolation credentials
+
+    With IsolateSOCKSAuth (Tor's default) every distinct username/password
+    gets its own circuit, so one SOCKS port can carry several circuits and
+    a circuit is replaced by bumping its credential generation.
+    """
+
+    def __init__(self, name, proxy, isolation=None, max_concurrent=4):
+        self.name = name
+        self.base_proxy = proxy
+        self.isolation = isolation
+        self.generation = 0
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.latency = None  # EWMA of successful request times, seconds
+        self.samples = 0  # successful requests since the last rotation
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.rotations = 0
+        self.retired_until = 0.0
+
+    @property
+    def proxy(self):
+        """Proxy URL for requests/aiohttp, including the current credentials"""
+        if self.isolation is None:
+            return self.base_proxy
+        parts = urlsplit(self.base_proxy)
+        credential = quote(f'{self.isolation}-{self.generation}', safe='')
+        host = parts.netloc.rpartition('@')[2]
+        return parts._replace(netloc=f'{credential}:{credential}@{host}').geturl()
+
+    @property
+    def proxies(self):
+        return {'http': self.proxy, 'https': self.proxy}
+
+
+class TorCircuitPool:
+    """Spread Tor requests over several circuits and retire the bad ones
+
+    Circuits come from a list of SOCKS proxies, each optionally split into
+    `isolation` circuits by SOCKS credentials. Requests go to the circuit
+    with the lowest expected wait (latency EWMA times requests in flight),
+    up to max_concurrent per circuit. A circuit is retired for `cooldown`
+    seconds, and rotated to a fresh one, after max_failures failures in a
+    row or when its latency exceeds slow_factor times the median of the
+    others. Rotation bumps the isolation credentials and, when a control
+    port is configured, sends NEWNYM through stem.
+    """
+
+    def __init__(self, proxies, isolation=0, max_concurrent=4, max_failures=3,
+                 slow_factor=3.0, min_samples=5, cooldown=60.0, alpha=0.3,
+                 control_port=None, control_password=None):
+        self.circuits = []
+        for index, proxy in enumerate(proxies):
+            if isolation:
+                for slot in range(isolation):
+                    self.circuits.append(Circuit(f'{index}.{slot}', proxy,
+                                                 f'monitor-{index}-{slot}', max_concurrent))
+            else:
+                self.circuits.append(Circuit(str(index), proxy, None, max_concurrent))
+        if not self.circuits:
+            raise ValueError('At least one Tor proxy is required')
+        self.max_failures = max_failures
+        self.slow_factor = slow_factor
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.alpha = alpha
+        # 'host:port' of Tor's ControlPort, for NEWNYM on rotation
+        self.control_port = control_port
+        self.control_password = control_password
+        # Called with (circuit, old_proxy) after a circuit is rotated
+        self.on_rotate = []
+        self._cond = threading.Condition()
+        self._newnym_lock = threading.Lock()
+
+    def acquire(self, wait=True):
+        """Take a slot on the best circuit
+
+        With wait=False the least loaded usable circuit is returned even if
+        it is at capacity, for callers that cannot block (the event loop).
+        """
+        with self._cond:
+            while True:
+                circuit = self._choose(ignore_capacity=not wait)
+                if circuit is not None:
+                    circuit.in_flight += 1
+                    return circuit
+                self._cond.wait()
+
+    def release(self, circuit, elapsed, ok):
+        """Return a slot, recording how long the request took and whether the circuit worked"""
+        old_proxy = circuit.proxy
+        with self._cond:
+            circuit.in_flight -= 1
+            circuit.requests += 1
+            if circuit.retired_until > time.monotonic():
+                # A request that was already running when the circuit was
+                # retired says nothing about its replacement
+                self._cond.notify_all()
+                return
+            if ok:
+                circuit.consecutive_failures = 0
+                circuit.samples += 1
+                circuit.latency = elapsed if circuit.latency is None \
+                    else self.alpha * elapsed + (1 - self.alpha) * circuit.latency
+            else:
+                circuit.failures += 1
+                circuit.consecutive_failures += 1
+            retire = self._should_retire(circuit)
+            if retire:
+                circuit.retired_until = time.monotonic() + self.cooldown
+                circuit.generation += 1
+                circuit.rotations += 1
+                circuit.latency = None
+                circuit.samples = 0
+                circuit.consecutive_failures = 0
+            self._cond.notify_all()
+        if retire:
+            logger.info("Retiring Tor circuit %s (%s), rotating", circuit.name,
+                        'failing' if not ok else 'slow', extra={'circuit': circuit.name})
+            self._rotate(circuit, old_proxy)
+
+    @contextmanager
+    def use(self, wait=True):
+        """Context manager around acquire/release; an exception counts as a circuit failure"""
+        circuit = self.acquire(wait)
+        start = time.monotonic()
+        ok = False
+        try:
+            yield circuit
+            ok = True
+        finally:
+            self.release(circuit, time.monotonic() - start, ok)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            return [{
+                'name': circuit.name,
+                'proxy': circuit.base_proxy,
+                'isolation': f'{circuit.isolation}-{circuit.generation}' if circuit.isolation else None,
+                'in_flight': circuit.in_flight,
+                'max_concurrent': circuit.max_concurrent,
+                'latency_ms': round(circuit.latency * 1000, 1) if circuit.latency is not None else None,
+                'requests': circuit.requests,
+                'failures': circuit.failures,
+                'rotations': circuit.rotations,
+                'retired_for': round(max(0.0, circuit.retired_until - now), 1),
+            } for circuit in self.circuits]
+
+    def _choose(self, ignore_capacity=False):
+        now = time.monotonic()
+        # Fall back to retired circuits rather than stalling when all are retired
+        usable = [c for c in self.circuits if c.retired_until <= now] or self.circuits
+        if not ignore_capacity:
+            usable = [c for c in usable if c.in_flight < c.max_concurrent]
+        if not usable:
+            return None
+        # Circuits not measured yet are assumed to be typical
+        known = [c.latency for c in self.circuits if c.latency is not None]
+        typical = statistics.median(known) if known else 1.0
+        return min(usable, key=lambda c: (
+            (typical if c.latency is None else c.latency) * (c.in_flight + 1), c.in_flight))
+
+    def _should_retire(self, circuit):
+        if circuit.consecutive_failures >= self.max_failures:
+            return True
+        if circuit.samples < self.min_samples or circuit.latency is None:
+            return False
+        others = [c.latency for c in self.circuits
+                  if c is not circuit and c.latency is not None and c.retired_until <= time.monotonic()]
+        return bool(others) and circuit.latency > self.slow_factor * statistics.median(others)
+
+    def _rotate(self, circuit, old_proxy):
+        for callback in self.on_rotate:
+            callback(circuit, old_proxy)
+        if self.control_port:
+            self.new_identity()
+
+    def new_identity(self):
+        """Ask Tor for fresh circuits with NEWNYM; returns False if it was not sent"""
+        if Controller is None:
+            logger.warning("stem is not installed; cannot signal NEWNYM")
+            return False
+        host, _, port = self.control_port.rpartition(':')
+        with self._newnym_lock:
+            try:
+                with Controller.from_port(address=host or '127.0.0.1', port=int(port)) as controller:
+                    controller.authenticate(password=self.control_password)
+                    # Tor rate-limits NEWNYM; skip rather than wait
+                    if not controller.is_newnym_available():
+                        return False
+                    controller.signal(Signal.NEWNYM)
+                    return True
+            except Exception as e:
+                logger.warning("Error signalling NEWNYM on %s: %s", self.control_port, e)
+                return False
@@ -0,0 +1,193 @@
+import sqlite3
+import threading
+from functools import lru_cache
+from urllib.parse import urldefrag, urljoin
+
+from storage import Transaction
+
+URLS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+"""
+
+# SQLite's default limit on host parameters in one statement is 999
+_QUERY_CHUNK = 500
+
+# Snapshot fields holding URL lists
+URL_FIELDS = ('links', 'images')
+
+
+def normalize_url(href, base_url=None):
+    """Resolve a link against the page it was found on and strip its fragment"""
+    href = href.strip()
+    if href.startswith(('http://', 'https://')) or not base_url:
+        # Already absolute (urljoin would return it as it is): only the
+        # fragment goes. Most links on link-heavy pages take this path
+        return href.partition('#')[0]
+    return _resolve(base_url, href)
+
+
+def normalize_urls(hrefs, base_url=None):
+    """normalize_url over a list, without a function call per absolute link"""
+    result = []
+    append = result.append
+    for href in hrefs:
+        href = href.strip()
+        if href.startswith(('http://', 'https://')) or not base_url:
+            append(href.partition('#')[0])
+        else:
+            append(_resolve(base_url, href))
+    return result
+
+
+@lru_cache(maxsize=65536)
+def _resolve(base_url, href):
+    # urljoin is slow; a page's relative links repeat from check to check
+    try:
+        return urldefrag(urljoin(base_url, href))[0]
+    except ValueError:
+        # Malformed (e.g. a broken IPv6 host): keep it as written
+        return href
+
+
+class _RecentCache:
+    """A dict bounded to about size entries that keeps the recently used ones
+
+    An approximate LRU without bookkeeping on hits: entries go into a hot
+    generation, which becomes the cold one when full (dropping the previous
+    cold one); a hit in the cold generation moves the entry back to hot.
+    """
+
+    def __init__(self, size):
+        self.generation_size = max(1, size // 2)
+        self._hot = {}
+        self._cold = {}
+
+    def __len__(self):
+        return len(self._hot.keys() | self._cold.keys())
+
+    def get_many(self, keys):
+        """Values of keys, in order, None for the ones not cached"""
+        result = list(map(self._hot.get, keys))
+        if None in result:
+            cold = self._cold
+            for index, key in enumerate(keys):
+                if result[index] is None:
+                    value = cold.get(key)
+                    if value is not None:
+                        self.put(key, value)
+                        result[index] = value
+        return result
+
+    def put(self, key, value):
+        self._hot[key] = value
+        if len(self._hot) >= self.generation_size:
+            self._cold = self._hot
+            self._hot = {}
+
+
+class UrlTable:
+    """Intern URLs as integer ids, shared by every snapshot
+
+    Snapshots keep their links and images as lists of ids, so a URL that
+    appears on many pages and in many checks is stored once, here. The
+    table lives in SQLite (in memory without a path), and ids are the same
+    in every process sharing the file (snapshots stored by a worker are
+    read by the control plane). About cache_size of the recently used URLs
+    are also kept in memory. Ids are never reused or removed.
+    """
+
+    def __init__(self, path=None, cache_size=200000):
+        self._lock = threading.Lock()
+        self._ids = _RecentCache(cache_size)  # url -> id
+        self._urls = _RecentCache(cache_size)  # id -> url, the same string objects
+        path = path or ':memory:'
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(URLS_SCHEMA)
+
+    def __len__(self):
+        """Number of URLs cached in memory"""
+        return len(self._ids)
+
+    def intern_many(self, urls):
+        """Ids of urls, in order, adding the ones not seen before"""
+        with self._lock:
+            result = self._ids.get_many(urls)
+            if None in result:
+                missing = list(dict.fromkeys(url for url, url_id in zip(urls, result) if url_id is None))
+                ids = self._load_urls(missing)
+                result = [url_id if url_id is not None else ids[url] for url, url_id in zip(urls, result)]
+            return result
+
+    def lookup_many(self, ids):
+        """URLs of ids, in order"""
+        with self._lock:
+            result = self._urls.get_many(ids)
+            if None in result:
+                # Evicted from the cache, or added by another process
+                missing = list(dict.fromkeys(url_id for url_id, url in zip(ids, result) if url is None))
+                urls = self._load_ids(missing)
+                result = [url if url is not None else urls[url_id] for url_id, url in zip(ids, result)]
+            return result
+
+    def intern_snapshot(self, snapshot, base_url=None):
+        """Replace a snapshot's link and image lists by id lists, in place
+
+        URLs are normalized against base_url first. A snapshot that is
+        already interned is returned unchanged, so this also upgrades
+        snapshots stored before interning.
+        """
+        if snapshot is None:
+            return None
+        for field in URL_FIELDS:
+            values = snapshot.get(field)
+            if values and isinstance(values[0], str):
+                snapshot[field] = self.intern_many(normalize_urls(values, base_url))
+        return snapshot
+
+    def diff(self, old_ids, new_ids):
+        """(added, removed) URLs between two id lists, each in id order"""
+        old_set = set(old_ids)
+        new_set = set(new_ids)
+        return (self.lookup_many(sorted(new_set.difference(old_set))),
+                self.lookup_many(sorted(old_set.difference(new_set))))
+
+    def _cache(self, rows):
+        for url_id, url in rows:
+            self._ids.put(url, url_id)
+            self._urls.put(url_id, url)
+
+    def _load_urls(self, urls):
+        """{url: id} for urls, adding the ones the database does not have"""
+        ids = dict(self._select('SELECT url, id FROM urls WHERE url IN', urls))
+        new = [url for url in urls if url not in ids]
+        if new:
+            with Transaction(self._conn):
+                self._conn.executemany('INSERT OR IGNORE INTO urls (url) VALUES (?)',
+                                       ((url,) for url in new))
+                # Another process may have added some of them first
+                ids.update(self._select('SELECT url, id FROM urls WHERE url IN', new))
+        self._cache((url_id, url) for url, url_id in ids.items())
+        return ids
+
+    def _load_ids(self, ids):
+        """{id: url} for ids, which must exist"""
+        urls = dict(self._select('SELECT id, url FROM urls WHERE id IN', ids))
+        self._cache(urls.items())
+        missing = [url_id for url_id in ids if url_id not in urls]
+        if missing:
+            raise KeyError(missing[0])
+        return urls
+
+    def _select(self, query, values):
+        rows = []
+        for start in range(0, len(values), _QUERY_CHUNK):
+            chunk = values[start:start + _QUERY_CHUNK]
+            rows += self._conn.execute(f'{query} ({",".join("?" * len(chunk))})', chunk).fetchall()
+        return rows
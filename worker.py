@@ -0,0 +1,157 @@
+"""Headless check worker: runs due site checks taken from the shared job queue.
+
+Start the control plane with the queue set, then any number of workers
+against the same database (and queue):
+
+    MONITOR_QUEUE=sqlite:///monitor-jobs.db python app.py
+    MONITOR_QUEUE=sqlite:///monitor-jobs.db python worker.py --concurrency 8
+
+Keep the queue out of the site database: every lease would otherwise
+look like a site write to the control plane's summary index.
+
+Each worker leases due jobs, runs the usual fetch/parse/compare pipeline
+(app.perform_check) and writes the result to the store. Leases are
+extended while a check runs; if a worker dies its leases expire and
+other workers take the jobs over. SIGTERM/SIGINT stop leasing, let
+running checks finish and exit.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from storage import side_path
+
+logger = logging.getLogger('monitor.worker')
+
+
+class Worker:
+    """Lease jobs up to `concurrency` at a time and run check(url) for each
+
+    check returns (result, HTTP status) like app.perform_check: 200
+    completes the job, at the interval interval_for(url) returns, a
+    deferred result (the host asked for a pause) completes it with the
+    next check after the pause, 404 (site removed) drops it, anything
+    else or an exception is a failure to be retried.
+    """
+
+    def __init__(self, queue, check, interval_for, name=None, concurrency=4,
+                 visibility=300.0, poll_interval=1.0):
+        self.queue = queue
+        self.check = check
+        self.interval_for = interval_for
+        self.name = name or f'{socket.gethostname()}-{os.getpid()}'
+        self.concurrency = concurrency
+        self.visibility = visibility
+        self.poll_interval = poll_interval
+        self.completed = 0
+        self.deferred = 0
+        self.failed = 0
+        self.lost = 0
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self, once=False):
+        """Work until stop(); with once, return when no job is due"""
+        active = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='check-worker') as executor:
+            while True:
+                if not self._stopped.is_set() and len(active) < self.concurrency:
+                    for job in self.queue.lease(self.name, self.concurrency - len(active),
+                                                self.visibility):
+                        active[executor.submit(self.check, job.url)] = job
+                if not active:
+                    if once or self._stopped.is_set():
+                        return
+                    self._stopped.wait(self.poll_interval)
+                    continue
+                done, _ = wait(active, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(active.pop(future), future)
+                self._heartbeat(active.values())
+
+    def _finish(self, job, future):
+        try:
+            result, status = future.result()
+        except Exception as e:
+            logger.exception("Check of %s failed: %s", job.url, e, extra={'url': job.url})
+            result, status = {'error': repr(e)}, 500
+        if status == 404:
+            self.queue.remove(job.url)
+            return
+        if result.get('deferred'):
+            # Not a failure: no retry backoff, just wait out the host's pause
+            ok = self.queue.complete(job, self.interval_for(job.url), delay=result['retry_in'])
+            self.deferred += 1
+        elif status == 200:
+            ok = self.queue.complete(job, self.interval_for(job.url))
+            self.completed += 1
+        else:
+            ok = self.queue.fail(job, result.get('error'))
+            self.failed += 1
+            logger.info("Check of %s failed (attempt %d): %s", job.url, job.attempts,
+                        result.get('error'), extra={'url': job.url, 'attempt': job.attempts})
+        if not ok:
+            # The lease ran out and another worker has the job now
+            self.lost += 1
+            logger.warning("Lease on %s was lost before the check finished", job.url,
+                           extra={'url': job.url})
+
+    def _heartbeat(self, jobs):
+        deadline = time.time() + self.visibility / 2
+        for job in jobs:
+            if job.expires < deadline and not self.queue.extend(job, self.visibility):
+                logger.warning("Could not extend the lease on %s", job.url, extra={'url': job.url})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queue', default=os.environ.get('MONITOR_QUEUE'),
+                        help='job queue, e.g. sqlite:///monitor-jobs.db (default MONITOR_QUEUE, '
+                             'else a -jobs database next to MONITOR_DB)')
+    parser.add_argument('--concurrency', type=int,
+                        default=int(os.environ.get('MONITOR_WORKER_CONCURRENCY', 4)))
+    parser.add_argument('--visibility', type=float,
+                        default=float(os.environ.get('MONITOR_QUEUE_VISIBILITY', 300)),
+                        help='lease length in seconds; extended while a check runs')
+    parser.add_argument('--poll', type=float, default=1.0, help='seconds between polls when idle')
+    parser.add_argument('--name', help='worker name in leases (default host-pid)')
+    parser.add_argument('--once', action='store_true', help='exit when no job is due')
+    args = parser.parse_args()
+
+    # The app module reads its configuration from the environment on import
+    os.environ['MONITOR_QUEUE'] = args.queue or 'sqlite:///' + side_path(
+        os.environ.get('MONITOR_DB', 'monitor.db'), 'jobs')
+    import app as monitor
+
+    def interval_for(url):
+        site = monitor.store.get_site(url)
+        return (site or {}).get('check_interval') or monitor.DEFAULT_CHECK_INTERVAL
+
+    worker = Worker(monitor.job_queue, monitor.perform_check, interval_for, name=args.name,
+                    concurrency=args.concurrency, visibility=args.visibility,
+                    poll_interval=args.poll)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: worker.stop())
+
+    # Sites added before the queue was in use have no job yet
+    monitor.schedule_stored_sites()
+    logger.info("Worker %s polling %s with %d slots", worker.name, os.environ['MONITOR_QUEUE'],
+                args.concurrency)
+    try:
+        worker.run(once=args.once)
+    finally:
+        monitor.store.flush()
+        logger.info("Worker %s stopped: %d completed, %d deferred, %d failed, %d leases lost",
+                    worker.name, worker.completed, worker.deferred, worker.failed, worker.lost)
+
+
+if __name__ == '__main__':
+    main()